@@ -1,31 +1,55 @@
-import edge_tts
 import asyncio
+import base64
+import hashlib
 import re
 import os
+import json
+from typing import NamedTuple
+from content_cache import ContentCache, content_key
+from audio_track import mp3_duration
+import tts_client
+from tts_client import TTSThrottled
+from models import parse_duration
 
 OUTPUT_DIR = "output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Shared across jobs: key = sha256(cleaned text, voice, rate string)
+TTS_CACHE = ContentCache(
+    "tts",
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    suffix=".mp3",
+)
+# Duration + word boundaries for each TTS_CACHE entry
+TTS_META = ContentCache("tts_meta", max_bytes=64 * 1024 * 1024, suffix=".json")
+
+# Offline backend: seconds of audio per word, or a fixed length per clip
+OFFLINE_SECONDS_PER_WORD = float(os.getenv("OFFLINE_TTS_SECONDS_PER_WORD", "0.4"))
+OFFLINE_SECONDS = float(os.getenv("OFFLINE_TTS_SECONDS", "0")) or None
+# Offline backend: simulated service round trip per call (benchmarks)
+OFFLINE_LATENCY = float(os.getenv("OFFLINE_TTS_LATENCY", "0"))
+
+# "fit" picks a continuous rate from the per-voice duration model,
+# "buckets" keeps the old -30% / +0% / +20% choice
+TTS_RATE_MODE = os.getenv("TTS_RATE_MODE", "fit")
+# Relative duration error that triggers one resynthesis at a corrected rate
+TTS_RATE_TOLERANCE = float(os.getenv("TTS_RATE_TOLERANCE", "0.05"))
+# Rates are rounded to this many percent so near-identical fits share cached audio
+TTS_RATE_STEP = int(os.getenv("TTS_RATE_STEP", "2"))
+# Slower than -30% sounds unnatural; short narration is padded with
+# silence up to the slide's duration instead (render_plan.SlideTask.slot)
+TTS_RATE_MIN = int(os.getenv("TTS_RATE_MIN", "-30"))
+TTS_RATE_MAX = int(os.getenv("TTS_RATE_MAX", "100"))
+# Calibration of the duration model, per backend and voice
+VOICE_MODELS = ContentCache("tts_model", max_bytes=1024 * 1024, suffix=".json")
+
+# HTTP backend: endpoint of a self-hosted TTS service (or a local fake in tests)
+TTS_HTTP_URL = os.getenv("TTS_HTTP_URL", "http://127.0.0.1:5002/synthesize")
+
 # ---------------------------
 # UTILITY FUNCTIONS
 # ---------------------------
 
-def parse_duration(duration_str):
-    """
-    Converts '4 min' to 240 or '30 sec' to 30
-    """
-    if isinstance(duration_str, (int, float)):
-        return int(duration_str)
-    
-    numbers = re.findall(r'\d+', str(duration_str))
-    if not numbers:
-        return 30  # fallback
-
-    val = int(numbers[0])
-    if "min" in str(duration_str).lower():
-        return val * 60
-    return val
-
 def clean_text(text: str) -> str:
     """
     Removes markdown and symbols for clean narration
@@ -55,19 +79,318 @@ def estimate_speech_rate(text: str, target_duration: int):
     else:
         return "+0%"
 
+# ---------------------------
+# BACKENDS
+# ---------------------------
+
+def _rate_factor(rate: str) -> float:
+    """'+20%' -> 1.2"""
+    match = re.fullmatch(r"([+-]\d+)%", rate.strip())
+    return 1 + int(match.group(1)) / 100 if match else 1.0
+
+class EdgeBackend:
+    """Microsoft Edge online TTS; word boundaries come with the audio stream."""
+
+    name = "edge"
+
+    def __init__(self):
+        import edge_tts
+        self._edge_tts = edge_tts
+
+    def _communicate(self, text: str, voice: str, rate: str):
+        # edge-tts opens one websocket per synthesis and closes its session
+        # afterwards, so there is no connection to keep; TTSClient adds the
+        # overall timeout and retries on top of these socket timeouts.
+        timeouts = dict(connect_timeout=10, receive_timeout=int(tts_client.TTS_TIMEOUT))
+        try:
+            return self._edge_tts.Communicate(text=text, voice=voice, rate=rate, boundary="WordBoundary", **timeouts)
+        except TypeError:
+            # edge-tts < 7 has no boundary/timeout arguments and always sends word boundaries
+            return self._edge_tts.Communicate(text=text, voice=voice, rate=rate)
+
+    async def stream(self, text: str, voice: str, rate: str):
+        """Collect audio bytes and word boundaries from one edge-tts stream."""
+        audio = bytearray()
+        words = []
+        async for chunk in self._communicate(text, voice, rate).stream():
+            if chunk["type"] == "audio":
+                audio += chunk["data"]
+            elif chunk["type"] == "WordBoundary":
+                # offsets/durations are in 100ns ticks
+                start = chunk["offset"] / 1e7
+                words.append((round(start, 3), round(start + chunk["duration"] / 1e7, 3), chunk["text"]))
+        return bytes(audio), words
+
+class OfflineBackend:
+    """
+    Deterministic local stand-in for benchmarks and offline runs: a real
+    24 kHz mono MP3 tone (same format as edge-tts) whose length follows
+    the word count and rate, with evenly spaced word boundaries.
+    """
+
+    name = "offline"
+
+    def __init__(
+        self,
+        seconds_per_word: float = OFFLINE_SECONDS_PER_WORD,
+        seconds: float | None = OFFLINE_SECONDS,
+        latency: float = OFFLINE_LATENCY,
+    ):
+        self.seconds_per_word = seconds_per_word
+        self.seconds = seconds
+        self.latency = latency
+
+    async def _encode(self, text: str, duration: float) -> bytes:
+        from moviepy.config import get_setting
+        # Pitch varies with the text so different slides sound different
+        freq = 200 + int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:4], 16) % 400
+        proc = await asyncio.create_subprocess_exec(
+            get_setting("FFMPEG_BINARY"), "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency={freq}:sample_rate=24000:duration={duration:.3f}",
+            "-ac", "1", "-b:a", "48k", "-id3v2_version", "0", "-f", "mp3", "pipe:1",
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        data, err = await proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {err.decode(errors='replace').strip()}")
+        return data
+
+    async def stream(self, text: str, voice: str, rate: str):
+        tokens = text.split()
+        duration = self.seconds or max(1.0, len(tokens) * self.seconds_per_word / _rate_factor(rate))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        data = await self._encode(text, duration)
+
+        step = duration / max(1, len(tokens))
+        words = [(round(i * step, 3), round((i + 1) * step, 3), token) for i, token in enumerate(tokens)]
+        return data, words
+
+class HttpBackend:
+    """
+    Any TTS service speaking a small JSON protocol, e.g. a self-hosted
+    engine or a local fake server in tests. POST {"text", "voice", "rate"}
+    to TTS_HTTP_URL; the reply is {"audio": base64 MP3, "words":
+    [[start_sec, end_sec, word], ...]}. 429/503 replies are throttling
+    (Retry-After is honoured). One keep-alive session per event loop is
+    reused for every call.
+    """
+
+    name = "http"
+
+    def __init__(self, url: str = TTS_HTTP_URL):
+        import aiohttp
+        self._aiohttp = aiohttp
+        self.url = url
+        self._session = None
+        self._loop = None
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = self._aiohttp.ClientSession(
+                connector=self._aiohttp.TCPConnector(limit=tts_client.TTS_MAX_CONCURRENCY, keepalive_timeout=30),
+            )
+            self._loop = loop
+        return self._session
+
+    async def stream(self, text: str, voice: str, rate: str):
+        payload = {"text": text, "voice": voice, "rate": rate}
+        async with self._get_session().post(self.url, json=payload) as response:
+            if response.status in (429, 503):
+                retry_after = response.headers.get("Retry-After")
+                raise TTSThrottled(
+                    f"HTTP {response.status}",
+                    retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+                )
+            response.raise_for_status()
+            body = await response.json()
+        return base64.b64decode(body["audio"]), [tuple(w) for w in body.get("words", [])]
+
+    async def aclose(self):
+        if self._session is not None and self._loop is asyncio.get_running_loop():
+            await self._session.close()
+        self._session = self._loop = None
+
+TTS_BACKENDS = {
+    "edge": EdgeBackend,
+    "offline": OfflineBackend,
+    "http": HttpBackend,
+}
+
+_backends = {}
+_clients = {}
+
+def get_tts_backend(name=None):
+    """Shared backend instance; the default comes from TTS_BACKEND (edge)."""
+    name = name or os.getenv("TTS_BACKEND", "edge")
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}', expected one of {sorted(TTS_BACKENDS)}")
+    if name not in _backends:
+        _backends[name] = TTS_BACKENDS[name]()
+    return _backends[name]
+
+def get_tts_client(backend=None) -> tts_client.TTSClient:
+    """
+    Shared TTSClient for a backend, so every job in this process goes
+    through the same retry policy and adaptive concurrency limit.
+    """
+    backend = backend or get_tts_backend()
+    client = _clients.get(backend.name)
+    if client is None or client.backend is not backend:
+        client = _clients[backend.name] = tts_client.TTSClient(backend)
+    return client
+
+async def close_tts_clients():
+    """Release connections held for the running event loop."""
+    for client in list(_clients.values()):
+        await client.aclose()
+
+# ---------------------------
+# RATE FITTING
+# ---------------------------
+
+class VoiceModel:
+    """
+    Predicts clip length for one (backend, voice):
+        duration = lead + seconds_per_char * chars / rate_factor
+    Least squares over every clip synthesized so far (older clips slowly
+    decay), persisted in VOICE_MODELS so all jobs share the calibration.
+    Until enough varied clips are seen, lead stays at its prior and only
+    the speaking speed is fitted.
+    """
+
+    PRIOR_LEAD = 0.5              # seconds of leading/trailing silence
+    PRIOR_SECONDS_PER_CHAR = 0.065  # ~150 words per minute
+    DECAY = 0.98
+    MIN_SAMPLES = 5
+
+    def __init__(self, backend_name: str, voice: str):
+        self.key = content_key("voice-model", backend_name, voice)
+        stored = VOICE_MODELS.read_bytes(self.key)
+        self.sums = json.loads(stored) if stored else {"n": 0.0, "x": 0.0, "y": 0.0, "xx": 0.0, "xy": 0.0}
+
+    def params(self):
+        """(lead, seconds_per_char)"""
+        s = self.sums
+        if s["n"] >= self.MIN_SAMPLES:
+            var = s["n"] * s["xx"] - s["x"] ** 2
+            if var > 1e-9 * max(1.0, s["n"] * s["xx"]):
+                slope = (s["n"] * s["xy"] - s["x"] * s["y"]) / var
+                lead = (s["y"] - slope * s["x"]) / s["n"]
+                if slope > 0 and 0 <= lead <= 2:
+                    return lead, slope
+        if s["xx"] > 0:
+            # Speed only, with the prior lead
+            return self.PRIOR_LEAD, max(1e-3, (s["xy"] - self.PRIOR_LEAD * s["x"]) / s["xx"])
+        return self.PRIOR_LEAD, self.PRIOR_SECONDS_PER_CHAR
+
+    def predict(self, text: str, rate: str) -> float:
+        lead, per_char = self.params()
+        return lead + per_char * len(text) / _rate_factor(rate)
+
+    def observe(self, text: str, rate: str, duration: float):
+        x = len(text) / _rate_factor(rate)
+        s = {k: v * self.DECAY for k, v in self.sums.items()}
+        s["n"] += 1
+        s["x"] += x
+        s["y"] += duration
+        s["xx"] += x * x
+        s["xy"] += x * duration
+        self.sums = s
+        VOICE_MODELS.store_bytes(self.key, json.dumps(s).encode("utf-8"))
+
+_voice_models = {}
+
+def get_voice_model(backend_name: str, voice: str) -> VoiceModel:
+    if (backend_name, voice) not in _voice_models:
+        _voice_models[backend_name, voice] = VoiceModel(backend_name, voice)
+    return _voice_models[backend_name, voice]
+
+def _rate_string(factor: float) -> str:
+    percent = round((factor - 1) * 100 / TTS_RATE_STEP) * TTS_RATE_STEP
+    return f"{min(TTS_RATE_MAX, max(TTS_RATE_MIN, percent)):+d}%"
+
+def fit_speech_rate(text: str, target_duration, model: VoiceModel, measured=None):
+    """
+    Rate string that should make `text` last target_duration seconds.
+    With measured=(rate, duration) of an earlier take of the same text,
+    that take's speech length is scaled instead of using the model.
+    """
+    if not target_duration or target_duration <= 0 or not text:
+        return "+0%"
+    lead, per_char = model.params()
+    # Never squeeze speech into less than a quarter of the slide
+    speech = max(target_duration - lead, 0.25 * target_duration)
+    if measured is not None:
+        rate, duration = measured
+        factor = _rate_factor(rate) * max(duration - lead, 0.1) / speech
+    else:
+        factor = per_char * len(text) / speech
+    return _rate_string(factor)
+
 # ---------------------------
 # MAIN AUDIO FUNCTION
 # ---------------------------
 
-async def generate_audio(
+class TTSResult(NamedTuple):
+    path: str
+    duration: float  # seconds, counted from the MP3 frames
+    words: list      # [(start_sec, end_sec, word)] from the backend's word boundaries
+    text: str        # cleaned text that was spoken
+    cached: bool = False  # served from TTS_CACHE
+
+def _write_atomic(path: str, data: bytes):
+    # os.replace also avoids writing through a hard link into the cache
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+async def _synthesize_at(text, filepath, voice, rate_str, backend, use_cache, span) -> TTSResult:
+    """One take at a fixed rate, served from TTS_CACHE when possible."""
+    key_parts = [text, voice, rate_str]
+    if backend.name != "edge":
+        # edge keeps its original key so existing cache entries stay valid
+        key_parts.append(backend.name)
+    cache_key = content_key(*key_parts)
+    if use_cache and TTS_CACHE.fetch(cache_key, filepath):
+        meta = TTS_META.read_bytes(cache_key)
+        if meta is not None:
+            meta = json.loads(meta)
+            return TTSResult(filepath, meta["duration"], [tuple(w) for w in meta["words"]], text, cached=True)
+        with open(filepath, "rb") as f:
+            return TTSResult(filepath, mp3_duration(f.read()), [], text, cached=True)
+
+    data, words = await get_tts_client(backend).synthesize(text, voice, rate_str, span=span)
+    _write_atomic(filepath, data)
+    duration = mp3_duration(data)
+
+    if use_cache:
+        TTS_CACHE.store(cache_key, filepath)
+        TTS_META.store_bytes(cache_key, json.dumps({"duration": duration, "words": words}).encode("utf-8"))
+
+    return TTSResult(filepath, duration, words, text)
+
+async def synthesize(
     text: str,
     filename: str,
     target_duration: int | None = None,
-    voice: str = "en-US-ChristopherNeural"
-):
+    voice: str = "en-US-ChristopherNeural",
+    use_cache: bool = True,
+    backend=None,
+    span=None,
+) -> TTSResult:
     """
-    Generates audio from text using edge-tts.
-    Returns full path to saved file.
+    Generates audio from text using edge-tts (or another TTS_BACKENDS entry)
+    through the shared TTSClient (timeouts, retries, chunking).
+    In "fit" rate mode the rate comes from the voice's duration model;
+    a take more than TTS_RATE_TOLERANCE off target_duration is
+    resynthesized once at a rate corrected from its measured length.
+    Identical (text, voice, rate, backend) requests are served from TTS_CACHE.
+    Returns the saved path together with its duration and word timings,
+    so callers never have to re-open the MP3.
+    Raises TTSError when the backend keeps failing.
     """
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     text = clean_text(text)
@@ -75,32 +398,75 @@ async def generate_audio(
     if isinstance(target_duration, str):
         target_duration = parse_duration(target_duration)
 
-    rate_str = estimate_speech_rate(text, target_duration)
-
+    backend = backend or get_tts_backend()
     filepath = os.path.join(OUTPUT_DIR, filename)
 
-    try:
-        communicate = edge_tts.Communicate(
-            text=text,
-            voice=voice,
-            rate=rate_str
-        )
-        await communicate.save(filepath)
-    except Exception as e:
-        print(f"[Warning] edge-tts failed: {e}")
-        # fallback silent audio if needed
-        from pydub import AudioSegment
-        silent = AudioSegment.silent(duration=1000)
-        silent.export(filepath, format="mp3")
+    if TTS_RATE_MODE != "fit":
+        return await _synthesize_at(text, filepath, voice, estimate_speech_rate(text, target_duration), backend, use_cache, span)
+
+    model = get_voice_model(backend.name, voice)
+    rate_str = fit_speech_rate(text, target_duration, model)
+    result = await _synthesize_at(text, filepath, voice, rate_str, backend, use_cache, span)
+    if not result.cached:
+        model.observe(text, rate_str, result.duration)
+
+    resynthesized = False
+    if target_duration and abs(result.duration - target_duration) > TTS_RATE_TOLERANCE * target_duration:
+        retry_rate = fit_speech_rate(text, target_duration, model, measured=(rate_str, result.duration))
+        if retry_rate != rate_str:
+            rate_str = retry_rate
+            result = await _synthesize_at(text, filepath, voice, rate_str, backend, use_cache, span)
+            resynthesized = True
+            if not result.cached:
+                model.observe(text, rate_str, result.duration)
 
-    # Verify file
-    if not os.path.exists(filepath) or os.path.getsize(filepath) < 1000:
-        raise RuntimeError(f"Audio generation failed or file too small: {filepath}")
+    if span is not None:
+        span.set(rate=rate_str, resynthesized=resynthesized)
+        if target_duration:
+            span.set(target_sec=target_duration, fit_error_sec=round(result.duration - target_duration, 3))
+    return result
+
+def synthesis_key(text: str, target_duration=None, voice: str = "en-US-ChristopherNeural", backend=None) -> str:
+    """
+    Content key of one synthesize() call: the TTS_CACHE inputs (cleaned
+    text, voice, backend), with the rate mode and target in place of the
+    rate, which "fit" mode only picks at synthesis time.
+    """
+    text = clean_text(text)
+    if isinstance(target_duration, str):
+        target_duration = parse_duration(target_duration)
+    backend = backend or get_tts_backend()
+    if TTS_RATE_MODE == "fit":
+        rate = f"fit:{target_duration}:{TTS_RATE_MIN}:{TTS_RATE_MAX}:{TTS_RATE_STEP}"
+    else:
+        rate = estimate_speech_rate(text, target_duration)
+    return content_key(text, voice, backend.name, TTS_RATE_MODE, rate)
+
+async def generate_audio(
+    text: str,
+    filename: str,
+    target_duration: int | None = None,
+    voice: str = "en-US-ChristopherNeural",
+    use_cache: bool = True
+):
+    """
+    Generates audio from text using edge-tts.
+    Returns full path to saved file.
+    """
+    result = await synthesize(text, filename, target_duration, voice, use_cache)
+    return result.path
 
-    return filepath
+def cache_stats() -> dict:
+    """Hit/miss counters of the TTS cache for this process."""
+    return TTS_CACHE.stats()
 
 # ---------------------------
 # SYNC HELPER (for testing)
 # ---------------------------
 def generate_audio_sync(text, filename, target_duration=None, voice="en-US-ChristopherNeural"):
-    return asyncio.run(generate_audio(text, filename, target_duration, voice))
+    async def run():
+        try:
+            return await generate_audio(text, filename, target_duration, voice)
+        finally:
+            await close_tts_clients()
+    return asyncio.run(run())
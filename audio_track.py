@@ -0,0 +1,175 @@
+from typing import NamedTuple
+import math
+import os
+import subprocess
+
+# ---------------------------
+# MP3 FRAME PARSING
+# ---------------------------
+
+# kbps by [version is MPEG1][layer][index]
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+class MP3Info(NamedTuple):
+    sample_rate: int
+    channels: int
+    frames: int
+    samples: int
+    audio_start: int  # byte offset of the first audio frame
+    audio_end: int    # byte offset after the last audio frame
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.sample_rate if self.sample_rate else 0.0
+
+def _frame_header(data, pos):
+    """(frame_length, samples, sample_rate, channels) or None if no frame at pos."""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 3
+    layer_bits = (data[pos + 1] >> 1) & 3
+    bitrate_idx = data[pos + 2] >> 4
+    rate_idx = (data[pos + 2] >> 2) & 3
+    if version == 1 or layer_bits == 0 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+
+    mpeg1 = version == 3
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_idx]
+    padding = (data[pos + 2] >> 1) & 1
+    channels = 1 if (data[pos + 3] >> 6) == 3 else 2
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate, channels
+    if layer == 3 and not mpeg1:
+        return 72 * bitrate // sample_rate + padding, 576, sample_rate, channels
+    return 144 * bitrate // sample_rate + padding, 1152, sample_rate, channels
+
+def _id3_size(data) -> int:
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+def mp3_info(data) -> MP3Info:
+    """
+    Walk the MPEG audio frames of an in-memory MP3.
+    Exact sample count without decoding; the ID3 tag and a leading
+    Xing/Info header frame are skipped.
+    """
+    pos = _id3_size(data)
+    # Resync past any junk before the first frame
+    while pos < len(data) and _frame_header(data, pos) is None:
+        pos += 1
+
+    start = pos
+    frames = samples = sample_rate = channels = 0
+    first = True
+    while True:
+        header = _frame_header(data, pos)
+        if header is None:
+            break
+        length, frame_samples, sample_rate, channels = header
+        if pos + length > len(data):
+            break
+        if first and (b"Xing" in data[pos:pos + 64] or b"Info" in data[pos:pos + 64]):
+            start = pos + length
+        else:
+            frames += 1
+            samples += frame_samples
+        first = False
+        pos += length
+
+    return MP3Info(sample_rate, channels, frames, samples, start, pos)
+
+def mp3_duration(data) -> float:
+    return mp3_info(data).duration
+
+# ---------------------------
+# TRACK ASSEMBLY
+# ---------------------------
+
+class SlideTiming(NamedTuple):
+    start: float   # where the slide's audio starts on the assembled track
+    end: float     # where the next slide starts
+    speech: float  # length of the slide's own audio, without padding
+
+def slot_duration(duration: float, fps: int = 24) -> float:
+    """Slide duration rounded up to whole video frames."""
+    return math.ceil(round(duration * fps, 6)) / fps
+
+def silent_frame(header: bytes) -> bytes:
+    """
+    A Layer III frame that decodes to silence, in the same format as the
+    frame whose 4 header bytes are given: unpadded, all-zero side info
+    and main data.
+    """
+    header = bytes([header[0], header[1], header[2] & ~0x02, header[3]])
+    length = _frame_header(header, 0)[0]
+    return header + bytes(length - 4)
+
+def _transcode_like(path: str, sample_rate: int, channels: int) -> bytes:
+    """Re-encode an MP3 whose format differs from the rest of the track."""
+    from moviepy.config import get_setting
+    cmd = [
+        get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", path,
+        "-ar", str(sample_rate), "-ac", str(channels), "-b:a", "48k",
+        "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3", "pipe:1",
+    ]
+    return subprocess.run(cmd, check=True, capture_output=True).stdout
+
+def assemble_track(paths, out_path, slots=None):
+    """
+    Join per-slide MP3s into one MP3 by copying their frames: no decode,
+    no resample, one input file in memory at a time.
+
+    slots: optional per-slide durations (e.g. video-frame aligned). Each
+    slide is followed by silent frames so the next one starts as close
+    as the MP3 frame size allows to the sum of the slots before it, so
+    rounding never accumulates over long decks.
+
+    Returns one SlideTiming per input path, computed from sample counts.
+    """
+    timings = []
+    fmt = None       # (sample_rate, channels) of the track
+    samples = 0
+    target = 0.0
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "wb") as out:
+        for i, path in enumerate(paths):
+            with open(path, "rb") as f:
+                data = f.read()
+            info = mp3_info(data)
+            if fmt is None:
+                fmt = (info.sample_rate, info.channels)
+                silence = silent_frame(data[info.audio_start:info.audio_start + 4])
+                silence_samples = _frame_header(silence, 0)[1]
+            elif (info.sample_rate, info.channels) != fmt:
+                data = _transcode_like(path, *fmt)
+                info = mp3_info(data)
+
+            start = samples
+            out.write(data[info.audio_start:info.audio_end])
+            samples += info.samples
+
+            if slots is not None:
+                target += slots[i]
+                target_samples = target * fmt[0]
+                while samples + silence_samples / 2 < target_samples:
+                    out.write(silence)
+                    samples += silence_samples
+
+            timings.append(SlideTiming(start / fmt[0], samples / fmt[0], info.duration))
+
+    os.replace(tmp_path, out_path)
+    return timings
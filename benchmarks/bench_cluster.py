@@ -0,0 +1,156 @@
+"""
+Scaling of cluster mode: the same generated deck built by one
+coordinator with 1, 2, 4... cluster workers on a fresh SQLite broker,
+next to the all-in-one local pipeline.
+
+Every run happens in an empty working directory (cold caches, fresh
+broker and shared storage). Workers are separate processes started
+before the coordinator, standing in for hosts:
+
+    python benchmarks/bench_cluster.py --slides 24 --workers 1 2 4 --out cluster.json
+    python benchmarks/bench_cluster.py --tts-latency 2 --workers 1 2 4 8
+
+--tts-latency adds a simulated service round trip to every TTS call
+(the offline backend otherwise answers instantly). CPU-bound stages
+(rendering, segment encodes) only scale while there is a core per
+worker (see "cpus" in the report); on fewer cores workers take turns.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import make_deck  # noqa: E402
+
+BROKER_DB = "broker.sqlite3"
+
+# ---------------------------
+# ONE BUILD (child process)
+# ---------------------------
+
+def run_deck(count):
+    """Build one generated deck in the current directory; returns timings."""
+    sys.path.insert(0, ROOT)
+    import main
+
+    request = main.VideoRequest(**make_deck(count))
+    start = time.perf_counter()
+    result = asyncio.run(main.run_video_pipeline(request, f"cluster{count}"))
+    return {"wall_sec": round(time.perf_counter() - start, 3), "stages": result["timings"]}
+
+def task_stats(path):
+    """Tasks run per kind and per worker, from the broker table."""
+    db = sqlite3.connect(path)
+    try:
+        kinds = dict(db.execute("SELECT kind, COUNT(*) FROM tasks WHERE status = 'done' GROUP BY kind"))
+        workers = dict(db.execute("SELECT worker, COUNT(*) FROM tasks WHERE status = 'done' GROUP BY worker"))
+        retried = db.execute("SELECT COUNT(*) FROM tasks WHERE attempts > 1").fetchone()[0]
+    finally:
+        db.close()
+    return {"kinds": kinds, "per_worker": sorted(workers.values(), reverse=True), "retried": retried}
+
+# ---------------------------
+# DRIVER
+# ---------------------------
+
+def build(count, workers, env, warmup):
+    """One build with `workers` cluster workers (0: local pipeline)."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(env)
+        procs = []
+        if workers:
+            env.update(BROKER_URL=f"sqlite:///{BROKER_DB}", SHARED_DIR="shared")
+            procs = [
+                subprocess.Popen(
+                    [sys.executable, os.path.join(ROOT, "cluster.py"), "worker"],
+                    cwd=work_dir, env=env, stdout=subprocess.DEVNULL,
+                )
+                for _ in range(workers)
+            ]
+            # Let imports finish so the run measures work, not start-up
+            time.sleep(warmup)
+        try:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", str(count)],
+                cwd=work_dir, env=env, capture_output=True, text=True,
+            )
+        finally:
+            for worker in procs:
+                worker.terminate()
+                worker.wait()
+        if proc.returncode != 0:
+            print(proc.stdout[-2000:], proc.stderr[-4000:], file=sys.stderr)
+            raise SystemExit(f"Build with {workers} workers failed")
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        run["workers"] = workers
+        if workers:
+            run["tasks"] = task_stats(os.path.join(work_dir, BROKER_DB))
+        return run
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=24)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--tts-seconds", type=float, default=8.0, help="audio length per slide")
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="simulated TTS round trip (seconds)")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds workers get to start")
+    parser.add_argument("--no-local", action="store_true", help="skip the local pipeline baseline")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_deck(args.child)))
+        return
+
+    env = dict(
+        os.environ, TTS_BACKEND=os.getenv("TTS_BACKEND", "offline"),
+        OFFLINE_TTS_SECONDS=str(args.tts_seconds), OFFLINE_TTS_LATENCY=str(args.tts_latency),
+        INCREMENTAL_BUILDS="0", BROKER_URL="",
+    )
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "slides": args.slides,
+        "tts_latency_sec": args.tts_latency,
+        "runs": [],
+    }
+
+    counts = ([] if args.no_local else [0]) + args.workers
+    for workers in counts:
+        run = build(args.slides, workers, env, args.warmup)
+        report["runs"].append(run)
+        label = f"{workers} workers" if workers else "local"
+        print(f"{label}: {run['wall_sec']}s", file=sys.stderr)
+
+    cluster_runs = [run for run in report["runs"] if run["workers"]]
+    if cluster_runs:
+        base = cluster_runs[0]
+        for run in cluster_runs:
+            speedup = base["wall_sec"] * base["workers"] / run["wall_sec"]
+            run["speedup"] = round(speedup, 2)
+            run["efficiency"] = round(speedup / run["workers"], 2)
+            print(f"{run['workers']} workers: speedup {run['speedup']}x, efficiency {run['efficiency']:.0%}",
+                  file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    run()
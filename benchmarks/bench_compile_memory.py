@@ -0,0 +1,83 @@
+"""
+Peak memory of video_compiler.build_video against deck length.
+
+Each (mode, slides) run happens in a fresh process and reports its own
+peak RSS, so the numbers do not include earlier runs. Slides are
+synthetic 1280x720 PNGs with short silent MP3s, no TTS or network.
+
+    python benchmarks/bench_compile_memory.py --slides 10 40 160 --modes stream single
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def make_assets(work_dir, count, seconds):
+    import numpy as np
+    from PIL import Image
+    from moviepy.config import get_setting
+
+    audio = os.path.join(work_dir, "silence.mp3")
+    subprocess.run([
+        get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono", "-t", str(seconds),
+        "-b:a", "48k", audio,
+    ], check=True)
+
+    rng = np.random.default_rng(0)
+    slides = []
+    for n in range(count):
+        path = os.path.join(work_dir, f"slide_{n:04d}.png")
+        if not os.path.exists(path):
+            pixels = rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(path, compress_level=1)
+        slides.append({"audio": audio, "image": path})
+    return slides
+
+def run_one(mode, count, seconds, work_dir):
+    """Child process body: build one video and print a JSON result line."""
+    import main  # noqa: F401  (Pillow compatibility patch for MoviePy)
+    import video_compiler
+
+    slides = make_assets(work_dir, count, seconds)
+    video_compiler.OUTPUT_DIR = work_dir
+    start = time.perf_counter()
+    video_compiler.build_video(slides, None, f"bench_{mode}_{count}.mp4", mode=mode, subtitle_mode="none")
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"mode": mode, "slides": count, "seconds": round(elapsed, 2), "peak_mb": round(peak_kb / 1024, 1)}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, nargs="*", default=[10, 40, 160])
+    parser.add_argument("--modes", nargs="*", default=["stream", "single"])
+    parser.add_argument("--seconds", type=float, default=1.0, help="audio length per slide")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "SLIDES"), help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_one(args.child[0], int(args.child[1]), args.seconds, args.work_dir)
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"{'mode':<10}{'slides':>8}{'seconds':>10}{'peak MB':>10}")
+        for mode in args.modes:
+            for count in args.slides:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", mode, str(count),
+                     "--seconds", str(args.seconds), "--work-dir", work_dir],
+                    cwd=ROOT, check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                print(f"{mode:<10}{count:>8}{result['seconds']:>10}{result['peak_mb']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+End-to-end pipeline benchmark: render, TTS, SRT, compile and translate
+on generated decks, with offline stand-ins for edge-tts and Google
+Translate so results are deterministic and need no network.
+
+Every deck runs in a fresh process inside an empty working directory
+(cold caches, no narration.json). Results are printed and written as
+JSON so runs can be diffed across changes:
+
+    python benchmarks/bench_pipeline.py --slides 10 100 500 --out bench.json
+    TTS_CONCURRENCY=8 COMPILE_MODE=slideshow python benchmarks/bench_pipeline.py --slides 10
+
+Per deck the report holds the pipeline's own stage timings (wall/busy
+per stage), wall and CPU time of the three sequential phases (assets,
+video, translate), peak RSS of the main process and of its children,
+and the size of every output.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings that change what is measured; recorded with every result
+TRACKED_ENV = [
+    "TTS_BACKEND", "OFFLINE_TTS_SECONDS", "OFFLINE_TTS_SECONDS_PER_WORD",
+    "TTS_CONCURRENCY", "RENDER_WORKERS", "INCREMENTAL_BUILDS",
+    "COMPILE_MODE", "SUBTITLE_MODE", "SEGMENT_WORKERS",
+]
+
+TOPICS = ["Scanning", "Grouping", "Moving", "Logging", "Testing", "Packaging", "Scheduling", "Reporting"]
+
+def make_deck(count):
+    """VideoRequest payload with `count` varied slides."""
+    slides = []
+    for n in range(count):
+        topic = TOPICS[n % len(TOPICS)]
+        slide = {
+            "slide_id": n + 1,
+            "title": f"{topic} step {n + 1}",
+            "duration": "20 sec",
+            "bullets": [
+                f"Why {topic.lower()} matters for slide {n + 1}",
+                "Walk through the folder and collect every file",
+                "Keep a log so every change can be undone",
+            ],
+        }
+        if n % 3 == 1:
+            slide["code_block"] = "for path in folder.iterdir():\n    target = rules[path.suffix]\n    shutil.move(path, target)"
+        if n % 5 == 4:
+            slide["math"] = ["t = n_{files} \\times c"]
+        slides.append(slide)
+    return {
+        "project_metadata": {
+            "title": f"Benchmark deck {count}",
+            "author": "Benchmark",
+            "date": "2024-01-01",
+            "total_duration": f"{count * 20} sec",
+        },
+        "slides": slides,
+    }
+
+# ---------------------------
+# MEASUREMENT
+# ---------------------------
+
+def _live_children_cpu():
+    """CPU seconds of still-running child processes (e.g. the warm render pool)."""
+    total = 0.0
+    ticks = os.sysconf("SC_CLK_TCK")
+    for child in multiprocessing.active_children():
+        try:
+            with open(f"/proc/{child.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / ticks
+        except (OSError, IndexError, ValueError):
+            pass
+    return total
+
+def cpu_seconds():
+    """CPU used so far by this process, its finished children and live pool workers."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime + _live_children_cpu()
+
+class PhaseClock:
+    """Wall and CPU time of named, non-overlapping phases."""
+
+    def __init__(self):
+        self.phases = {}
+
+    def wrap(self, name, fn):
+        is_async = asyncio.iscoroutinefunction(fn)
+
+        def record(wall, cpu):
+            entry = self.phases.setdefault(name, {"wall_sec": 0.0, "cpu_sec": 0.0})
+            entry["wall_sec"] = round(entry["wall_sec"] + wall, 3)
+            entry["cpu_sec"] = round(entry["cpu_sec"] + cpu, 3)
+
+        if is_async:
+            async def wrapped(*args, **kwargs):
+                wall, cpu = time.perf_counter(), cpu_seconds()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    record(time.perf_counter() - wall, cpu_seconds() - cpu)
+        else:
+            def wrapped(*args, **kwargs):
+                wall, cpu = time.perf_counter(), cpu_seconds()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    record(time.perf_counter() - wall, cpu_seconds() - cpu)
+        return wrapped
+
+def _size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+# ---------------------------
+# ONE DECK (child process)
+# ---------------------------
+
+def run_deck(count, languages):
+    """Run the whole pipeline for one generated deck in the current directory."""
+    sys.path.insert(0, ROOT)
+    import main
+    import video_compiler
+    import translate_Subtitles
+
+    clock = PhaseClock()
+    main.produce_slide_assets = clock.wrap("assets", main.produce_slide_assets)
+    video_compiler.build_video = clock.wrap("video", video_compiler.build_video)
+    video_compiler.build_video_from_segments = clock.wrap("video", video_compiler.build_video_from_segments)
+
+    request = main.VideoRequest(**make_deck(count))
+    start = time.perf_counter()
+    result = asyncio.run(main.run_video_pipeline(request, f"bench{count}"))
+
+    translate = clock.wrap("translate", translate_Subtitles.translate_all)
+    translated = translate(
+        result["subtitles"], languages, backend=translate_Subtitles.StubBackend(tag=True)
+    )
+    total = time.perf_counter() - start
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "slides": count,
+        "total_wall_sec": round(total, 3),
+        "stages": result["timings"],
+        "phases": clock.phases,
+        "peak_rss_mb": {
+            "main": round(self_usage.ru_maxrss / 1024, 1),
+            "children": round(children_usage.ru_maxrss / 1024, 1),
+        },
+        "output_bytes": {
+            "video": _size(result["video"]),
+            "subtitles": _size(result["subtitles"]),
+            "translations": sum(_size(path) for path in translated.values()),
+        },
+    }
+
+# ---------------------------
+# DRIVER
+# ---------------------------
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, nargs="*", default=[10, 100, 500])
+    parser.add_argument("--languages", nargs="*", default=["hi", "fr", "ja"])
+    parser.add_argument("--tts-seconds", type=float, default=None,
+                        help="fixed audio length per slide (default: follows word count)")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_deck(args.child, args.languages)))
+        return
+
+    env = dict(os.environ, TTS_BACKEND=os.getenv("TTS_BACKEND", "offline"))
+    if args.tts_seconds is not None:
+        env["OFFLINE_TTS_SECONDS"] = str(args.tts_seconds)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "env": {name: env[name] for name in TRACKED_ENV if name in env},
+        "runs": [],
+    }
+
+    for count in args.slides:
+        with tempfile.TemporaryDirectory() as work_dir:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", str(count), "--languages", *args.languages],
+                cwd=work_dir, env=env, capture_output=True, text=True,
+            )
+        if proc.returncode != 0:
+            print(proc.stdout[-2000:], proc.stderr[-4000:], file=sys.stderr)
+            raise SystemExit(f"Deck of {count} slides failed")
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        report["runs"].append(run)
+        phases = ", ".join(f"{name}={p['wall_sec']}s/{p['cpu_sec']}s cpu" for name, p in run["phases"].items())
+        print(f"{count} slides: {run['total_wall_sec']}s total ({phases}), "
+              f"peak RSS {run['peak_rss_mb']['main']} MB", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    run()
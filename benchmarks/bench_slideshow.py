@@ -0,0 +1,82 @@
+"""
+Encode time and file size of the slideshow (VFR) profile against the
+frame-per-tick paths, on a synthetic deck rendered with the real slide
+renderer and burned subtitles. No TTS or network is needed.
+
+    python benchmarks/bench_slideshow.py --slides 12 --seconds 20 --modes slideshow stream
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: F401,E402  (Pillow compatibility patch for MoviePy)
+import image_generator  # noqa: E402
+import subtitle_engine  # noqa: E402
+import video_compiler  # noqa: E402
+from moviepy.config import get_setting  # noqa: E402
+
+NARRATION = (
+    "In this part we walk through the folder layout, explain how files are "
+    "grouped by extension and show what happens when a name already exists "
+    "in the destination folder, so nothing is ever overwritten by accident."
+)
+
+def make_deck(work_dir, count, seconds):
+    audio = os.path.join(work_dir, "silence.mp3")
+    subprocess.run([
+        get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono", "-t", str(seconds),
+        "-b:a", "48k", audio,
+    ], check=True)
+
+    renderer = image_generator.get_renderer()
+    srt_path = os.path.join(work_dir, "deck.srt")
+    slides = []
+    with subtitle_engine.SrtWriter(srt_path) as srt:
+        for n in range(count):
+            path = os.path.join(work_dir, f"slide_{n:03d}.png")
+            renderer.render(
+                title_text=f"Section {n + 1}",
+                body_text="- Scan the source folder\n- Group files by type\n- Move and log every change",
+                code_block="for f in files:\n    shutil.move(f, target)" if n % 2 else None,
+            ).save(path)
+            slot = video_compiler.slide_slots([{"audio": audio}])[0]
+            srt.add(n, NARRATION, slot)
+            slides.append({"audio": audio, "image": path})
+    return slides, srt_path
+
+def video_kb(path):
+    """Size of the video stream alone (the audio track is identical across modes)."""
+    log = subprocess.run(
+        [get_setting("FFMPEG_BINARY"), "-i", path, "-map", "0:v", "-c", "copy", "-f", "null", "-"],
+        capture_output=True, text=True,
+    ).stderr
+    return float(re.findall(r"video:\s*([\d.]+)\s*Ki?B", log)[-1])
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=12)
+    parser.add_argument("--seconds", type=float, default=20.0, help="audio length per slide")
+    parser.add_argument("--modes", nargs="*", default=["slideshow", "stream"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        slides, srt_path = make_deck(work_dir, args.slides, args.seconds)
+        video_compiler.OUTPUT_DIR = work_dir
+        print(f"{args.slides} slides x {args.seconds:g}s, burned subtitles")
+        print(f"{'mode':<12}{'seconds':>10}{'file KB':>10}{'video KB':>10}")
+        for mode in args.modes:
+            start = time.perf_counter()
+            out = video_compiler.build_video(slides, srt_path, f"bench_{mode}.mp4", mode=mode, subtitle_mode="burn")
+            elapsed = time.perf_counter() - start
+            print(f"{mode:<12}{elapsed:>10.2f}{os.path.getsize(out) / 1024:>10.0f}{video_kb(out):>10.0f}")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,97 @@
+import json
+import os
+import re
+from content_cache import file_digest
+
+PROJECTS_DIR = os.path.join("output", "projects")
+
+# ---------------------------
+# PROJECT PATHS
+# ---------------------------
+
+def project_key(title: str, project_id: str | None = None) -> str:
+    """Directory-safe key for a project, e.g. 'python-automation-project'."""
+    raw = project_id or title or "untitled"
+    slug = re.sub(r"[^a-z0-9]+", "-", raw.lower()).strip("-")
+    return slug[:80] or "untitled"
+
+def project_dir(key: str) -> str:
+    path = os.path.join(PROJECTS_DIR, key)
+    os.makedirs(os.path.join(path, "segments"), exist_ok=True)
+    return path
+
+# ---------------------------
+# MANIFEST
+# ---------------------------
+
+class BuildManifest:
+    """
+    Per-project record of the last successful build.
+
+    slides: slide key -> {"fingerprint", "audio", "image", "segment", "tts"}
+            (tts = duration, word timings and spoken text of the audio)
+    files:  asset path -> {"size", "mtime_ns", "sha256"} so unchanged
+            images are not re-hashed on every build.
+    """
+
+    def __init__(self, path: str, data: dict | None = None):
+        self.path = path
+        data = data or {}
+        self.slides = data.get("slides", {})
+        self.files = data.get("files", {})
+
+    @classmethod
+    def load(cls, key: str):
+        path = os.path.join(project_dir(key), "manifest.json")
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"[Warning] Ignoring unreadable manifest {path}: {e}")
+            return cls(path)
+
+    def save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"slides": self.slides, "files": self.files}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    # ---------------------------
+    # FILE DIGESTS
+    # ---------------------------
+
+    def file_digest(self, path: str | None) -> str:
+        """sha256 of a file, reusing the stored digest while size/mtime match."""
+        if not path or not os.path.exists(path):
+            return "missing"
+        st = os.stat(path)
+        known = self.files.get(path)
+        if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return known["sha256"]
+
+        digest = file_digest(path)
+        self.files[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+        return digest
+
+    # ---------------------------
+    # REUSE
+    # ---------------------------
+
+    def reusable(self, slide_key: str, fingerprint: str) -> dict:
+        """Artifacts from the previous build that are still valid for this slide."""
+        entry = self.slides.get(slide_key)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return {}
+        reuse = {
+            kind: entry[kind]
+            for kind in ("audio", "image", "segment")
+            if entry.get(kind) and os.path.exists(entry[kind])
+        }
+        if entry.get("tts"):
+            reuse["tts"] = entry["tts"]
+        return reuse
+
+    def record(self, slide_key: str, fingerprint: str, **artifacts):
+        self.slides[slide_key] = {"fingerprint": fingerprint, **artifacts}
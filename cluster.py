@@ -0,0 +1,701 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+from content_cache import content_key, file_digest, link_or_copy
+import audio_generator
+import image_generator
+import video_compiler
+
+# Broker slide tasks are published to: "sqlite:///relative/path.db",
+# "sqlite:////absolute/path.db" or "redis://host:6379/0".
+# Empty: the whole pipeline runs in the coordinating process.
+BROKER_URL = os.getenv("BROKER_URL", "")
+# Artifacts (audio, frames, segments) are written here; every worker and
+# the coordinator must see the same files (a shared volume across hosts)
+SHARED_DIR = os.getenv("SHARED_DIR", os.path.join("output", "shared"))
+# Seconds a claimed task stays with its worker; heartbeats renew it, so
+# only a dead worker's tasks are handed to someone else
+TASK_LEASE = float(os.getenv("TASK_LEASE", "60"))
+# Runs of one task before it is failed for good
+TASK_ATTEMPTS = int(os.getenv("TASK_ATTEMPTS", "3"))
+# Idle workers and waiting coordinators ask the broker this often
+BROKER_POLL_INTERVAL = float(os.getenv("BROKER_POLL_INTERVAL", "0.2"))
+# Warn when published tasks sit unclaimed this long (no workers running?)
+BROKER_STALL_WARNING = float(os.getenv("BROKER_STALL_WARNING", "30"))
+# Finished (done/failed) tasks queued longer ago than this many seconds
+# are purged by idle workers (hourly) and `cluster.py purge`; 0 keeps them
+TASK_RETENTION = float(os.getenv("TASK_RETENTION", str(7 * 24 * 3600)))
+PURGE_INTERVAL = 3600
+# Narration voice, as in the local pipeline (audio_generator.synthesize)
+VOICE = "en-US-ChristopherNeural"
+
+class TaskFailed(RuntimeError):
+    """A task failed on every attempt (or its worker kept dying)."""
+
+class Task(NamedTuple):
+    id: str
+    kind: str
+    payload: dict
+    attempt: int
+
+class TaskState(NamedTuple):
+    status: str  # queued -> running -> done | failed
+    result: Optional[dict]
+    error: Optional[str]
+
+# ---------------------------
+# BROKERS
+# ---------------------------
+# A task id is the content key of its work, so publishing the same task
+# twice (a retried job, two jobs sharing a slide) queues it once, and a
+# finished task is answered from its stored result.
+
+class SQLiteBroker:
+    """
+    Task table in one SQLite file (WAL mode). Workers on this host, or
+    on hosts whose shared filesystem supports SQLite locking.
+    """
+
+    def __init__(self, path: str, attempts: int = TASK_ATTEMPTS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.attempts = attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._setup()
+
+    def _setup(self, timeout: float = 30):
+        # Switching a fresh file to WAL takes an exclusive lock that SQLite
+        # does not wait for with the busy timeout, so workers starting
+        # together retry until one of them has done it
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._db.execute("PRAGMA journal_mode=WAL")
+                with self._transaction() as db:
+                    db.execute(
+                        "CREATE TABLE IF NOT EXISTS tasks ("
+                        " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,"
+                        " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                        " worker TEXT, lease_until REAL, result TEXT, error TEXT, created_at REAL NOT NULL)"
+                    )
+                    db.execute("CREATE INDEX IF NOT EXISTS tasks_queue ON tasks (status, created_at)")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    @classmethod
+    def from_url(cls, url: str):
+        # sqlite:///relative.db, sqlite:////absolute.db
+        return cls(url.split("://", 1)[1][1:])
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def put(self, task_id: str, kind: str, payload: dict, force: bool = False) -> bool:
+        """
+        Queue a task unless it is already known. Failed tasks are queued
+        again, finished ones too when force is set. Returns True when queued.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT status FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                db.execute(
+                    "INSERT INTO tasks (id, kind, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                    (task_id, kind, json.dumps(payload), time.time()),
+                )
+                return True
+            if row[0] == "failed" or (force and row[0] == "done"):
+                db.execute(
+                    "UPDATE tasks SET status = 'queued', attempts = 0, payload = ?, result = NULL,"
+                    " error = NULL, worker = NULL, lease_until = NULL, created_at = ? WHERE id = ?",
+                    (json.dumps(payload), time.time(), task_id),
+                )
+                return True
+        return False
+
+    def claim(self, worker: str, kinds=None, lease: float = TASK_LEASE) -> Optional[Task]:
+        """Oldest queued task (or one whose worker's lease ran out), or None."""
+        now = time.time()
+        kinds = list(kinds or TASKS)
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE tasks SET status = 'failed', error = 'worker lost (lease expired)'"
+                " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, self.attempts),
+            )
+            row = db.execute(
+                "SELECT id, kind, payload, attempts FROM tasks"
+                " WHERE (status = 'queued' OR (status = 'running' AND lease_until < ?))"
+                f" AND kind IN ({','.join('?' * len(kinds))}) ORDER BY created_at LIMIT 1",
+                [now, *kinds],
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE tasks SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ? WHERE id = ?",
+                (worker, now + lease, row[0]),
+            )
+        return Task(row[0], row[1], json.loads(row[2]), row[3] + 1)
+
+    def extend(self, task_id: str, worker: str, lease: float = TASK_LEASE) -> bool:
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease, task_id, worker),
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, task_id: str, worker: str, result: dict):
+        # Any run's result is as good as another's (same inputs, same artifact)
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE tasks SET status = 'done', result = ?, error = NULL, worker = ?, lease_until = NULL"
+                " WHERE id = ? AND status != 'done'",
+                (json.dumps(result), worker, task_id),
+            )
+
+    def fail(self, task_id: str, worker: str, error: str):
+        """Queue the task again, or fail it for good after its last attempt."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,"
+                " error = ?, lease_until = NULL WHERE id = ? AND worker = ? AND status = 'running'",
+                (self.attempts, error, task_id, worker),
+            )
+
+    def states(self, task_ids) -> dict:
+        """{task_id: TaskState} of the known ones."""
+        task_ids = list(task_ids)
+        states = {}
+        with self._lock:
+            for i in range(0, len(task_ids), 500):
+                chunk = task_ids[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT id, status, result, error FROM tasks WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for task_id, status, result, error in rows:
+                    states[task_id] = TaskState(status, json.loads(result) if result else None, error)
+        return states
+
+    def purge(self, older_than: float = TASK_RETENTION) -> int:
+        """Delete done/failed tasks queued more than older_than seconds ago; returns how many."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "DELETE FROM tasks WHERE status IN ('done', 'failed') AND created_at < ?",
+                (time.time() - older_than,),
+            )
+        return cursor.rowcount
+
+    def close(self):
+        self._db.close()
+
+class RedisBroker:
+    """
+    Tasks as hashes, one FIFO list of queued ids per kind and a sorted
+    set of running ids by lease expiry. Workers on any number of hosts.
+    Needs the redis package.
+    """
+
+    def __init__(self, url: str, attempts: int = TASK_ATTEMPTS, prefix: str = "slides"):
+        import redis
+        self.attempts = attempts
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    @classmethod
+    def from_url(cls, url: str):
+        return cls(url)
+
+    def _key(self, task_id):
+        return f"{self.prefix}:task:{task_id}"
+
+    def _queue(self, kind):
+        return f"{self.prefix}:queue:{kind}"
+
+    @property
+    def _running(self):
+        return f"{self.prefix}:running"
+
+    def put(self, task_id: str, kind: str, payload: dict, force: bool = False) -> bool:
+        key = self._key(task_id)
+        fresh = {"kind": kind, "payload": json.dumps(payload), "status": "queued", "attempts": 0,
+                 "created_at": time.time()}
+        if not self._redis.hsetnx(key, "kind", kind):
+            status = self._redis.hget(key, "status")
+            if not (status == "failed" or (force and status == "done")):
+                return False
+        pipe = self._redis.pipeline()
+        pipe.hdel(key, "result", "error", "worker")
+        pipe.hset(key, mapping=fresh)
+        pipe.rpush(self._queue(kind), task_id)
+        pipe.execute()
+        return True
+
+    def _requeue_expired(self, now):
+        for task_id in self._redis.zrangebyscore(self._running, "-inf", now):
+            # zrem decides which worker requeues an expired task
+            if not self._redis.zrem(self._running, task_id):
+                continue
+            key = self._key(task_id)
+            kind, attempts = self._redis.hmget(key, "kind", "attempts")
+            if int(attempts or 0) >= self.attempts:
+                self._redis.hset(key, mapping={"status": "failed", "error": "worker lost (lease expired)"})
+            else:
+                self._redis.hset(key, "status", "queued")
+                self._redis.rpush(self._queue(kind), task_id)
+
+    def claim(self, worker: str, kinds=None, lease: float = TASK_LEASE) -> Optional[Task]:
+        now = time.time()
+        self._requeue_expired(now)
+        for kind in kinds or TASKS:
+            while True:
+                task_id = self._redis.lpop(self._queue(kind))
+                if task_id is None:
+                    break
+                key = self._key(task_id)
+                if self._redis.hget(key, "status") != "queued":
+                    continue  # finished or queued twice
+                pipe = self._redis.pipeline()
+                pipe.hset(key, mapping={"status": "running", "worker": worker})
+                pipe.hincrby(key, "attempts", 1)
+                pipe.zadd(self._running, {task_id: now + lease})
+                pipe.hget(key, "payload")
+                _, attempt, _, payload = pipe.execute()
+                return Task(task_id, kind, json.loads(payload), attempt)
+        return None
+
+    def extend(self, task_id: str, worker: str, lease: float = TASK_LEASE) -> bool:
+        if self._redis.hmget(self._key(task_id), "worker", "status") != [worker, "running"]:
+            return False
+        self._redis.zadd(self._running, {task_id: time.time() + lease}, xx=True)
+        return True
+
+    def complete(self, task_id: str, worker: str, result: dict):
+        key = self._key(task_id)
+        if self._redis.hget(key, "status") == "done":
+            return
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={"status": "done", "result": json.dumps(result), "worker": worker})
+        pipe.hdel(key, "error")
+        pipe.zrem(self._running, task_id)
+        pipe.execute()
+
+    def fail(self, task_id: str, worker: str, error: str):
+        key = self._key(task_id)
+        kind, attempts, owner, status = self._redis.hmget(key, "kind", "attempts", "worker", "status")
+        if owner != worker or status != "running" or not self._redis.zrem(self._running, task_id):
+            return
+        if int(attempts or 0) >= self.attempts:
+            self._redis.hset(key, mapping={"status": "failed", "error": error})
+        else:
+            self._redis.hset(key, mapping={"status": "queued", "error": error})
+            self._redis.rpush(self._queue(kind), task_id)
+
+    def states(self, task_ids) -> dict:
+        task_ids = list(task_ids)
+        pipe = self._redis.pipeline()
+        for task_id in task_ids:
+            pipe.hmget(self._key(task_id), "status", "result", "error")
+        states = {}
+        for task_id, (status, result, error) in zip(task_ids, pipe.execute()):
+            if status is not None:
+                states[task_id] = TaskState(status, json.loads(result) if result else None, error)
+        return states
+
+    def purge(self, older_than: float = TASK_RETENTION) -> int:
+        """Delete done/failed tasks queued more than older_than seconds ago; returns how many."""
+        cutoff = time.time() - older_than
+        purged = 0
+        for key in self._redis.scan_iter(f"{self.prefix}:task:*", count=500):
+            status, created_at = self._redis.hmget(key, "status", "created_at")
+            if status in ("done", "failed") and float(created_at or 0) < cutoff:
+                purged += self._redis.delete(key)
+        return purged
+
+    def close(self):
+        self._redis.close()
+
+BROKERS = {
+    "sqlite": SQLiteBroker,
+    "redis": RedisBroker,
+}
+
+_brokers = {}
+
+def get_broker(url=None):
+    """Broker for url (default BROKER_URL), shared per process; None when unset."""
+    url = BROKER_URL if url is None else url
+    if not url:
+        return None
+    scheme = url.split("://", 1)[0]
+    if scheme not in BROKERS:
+        raise ValueError(f"Unknown broker '{url}', expected one of {sorted(BROKERS)} URLs")
+    if url not in _brokers:
+        _brokers[url] = BROKERS[scheme].from_url(url)
+    return _brokers[url]
+
+# ---------------------------
+# SHARED STORAGE
+# ---------------------------
+# Payloads and results name artifacts relative to SHARED_DIR, so hosts
+# may mount it at different paths. Names are content keys: an existing
+# file is always the right one, and every write is tmp + os.replace, so
+# a retried or duplicated task never exposes a half-written file.
+
+def shared_path(name: str) -> str:
+    return os.path.join(SHARED_DIR, name)
+
+def _write_shared(name: str, write):
+    """Call write(tmp_path) and move the file into place as name."""
+    path = shared_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.{os.getpid()}.{uuid.uuid4().hex[:8]}{ext}"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+def share_file(path: str, folder: str) -> str:
+    """Name of a local file inside SHARED_DIR, copied there by content hash when outside."""
+    shared = os.path.abspath(SHARED_DIR)
+    if os.path.abspath(path).startswith(shared + os.sep):
+        return os.path.relpath(os.path.abspath(path), shared)
+    name = os.path.join(folder, file_digest(path) + os.path.splitext(path)[1])
+    if not os.path.exists(shared_path(name)):
+        link_or_copy(path, shared_path(name))
+    return name
+
+def _share_visual(slide) -> str:
+    """Name of a slide's image (path or in-memory frame) inside SHARED_DIR."""
+    if slide.get("image") and os.path.exists(slide["image"]):
+        return share_file(slide["image"], "frames")
+    array = video_compiler.slide_frame(slide)
+    name = os.path.join("frames", content_key(array.shape, array.tobytes()) + ".png")
+    if not os.path.exists(shared_path(name)):
+        from PIL import Image
+        _write_shared(name, lambda tmp: Image.fromarray(array).save(tmp))
+    return name
+
+# ---------------------------
+# TASKS (run by workers)
+# ---------------------------
+
+_loop = None
+
+def _run_async(coro):
+    # One loop per worker process: TTS clients keep state between tasks
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+def run_tts(payload: dict) -> dict:
+    """{"text", "target_duration", "voice", "backend", "audio"} -> TTS result with the audio in SHARED_DIR."""
+    result = None
+
+    def synthesize(tmp):
+        nonlocal result
+        result = _run_async(audio_generator.synthesize(
+            payload["text"], os.path.abspath(tmp), target_duration=payload["target_duration"],
+            voice=payload.get("voice", VOICE), backend=audio_generator.get_tts_backend(payload.get("backend")),
+        ))
+
+    _write_shared(payload["audio"], synthesize)
+    return {"audio": payload["audio"], "duration": result.duration, "words": result.words, "text": result.text}
+
+def run_render(payload: dict) -> dict:
+    """{"spec", "image"} -> slide PNG in SHARED_DIR."""
+    if not os.path.exists(shared_path(payload["image"])):
+        spec = dict(payload["spec"])
+        spec["images"] = [shared_path(name) for name in spec.get("images") or []]
+        img = image_generator.get_renderer(spec.pop("height", image_generator.HEIGHT)).render(**spec)
+        _write_shared(payload["image"], lambda tmp: img.save(tmp))
+    return {"image": payload["image"]}
+
+def run_segment(payload: dict) -> dict:
+    """{"image", "duration", "cues", "segment"} -> video-only segment in SHARED_DIR."""
+    if not os.path.exists(shared_path(payload["segment"])):
+        slide = {"image": shared_path(payload["image"]), "duration": payload["duration"]}
+        cues = [(tuple(span), text) for span, text in payload["cues"]]
+        _write_shared(payload["segment"], lambda tmp: video_compiler.encode_segment(slide, tmp, cues))
+    return {"segment": payload["segment"], "frames": round(payload["duration"] * video_compiler.FPS)}
+
+TASKS = {
+    "tts": run_tts,
+    "render": run_render,
+    "segment": run_segment,
+}
+
+# ---------------------------
+# WORKER
+# ---------------------------
+
+@contextmanager
+def _heartbeat(broker, task_id, worker, lease=TASK_LEASE):
+    """Renew the task's lease in the background while it runs."""
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(lease / 3):
+            broker.extend(task_id, worker, lease)
+
+    thread = threading.Thread(target=renew, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def run_worker(url=None, kinds=None, max_tasks=None, idle_exit=None, worker=None) -> int:
+    """
+    Claim and run tasks until max_tasks ran or the broker stayed empty
+    for idle_exit seconds (default: forever). Returns the tasks run.
+    """
+    broker = get_broker(url)
+    if broker is None:
+        raise ValueError("No broker configured: set BROKER_URL or pass --broker")
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    ran = 0
+    idle_since = time.monotonic()
+    next_purge = idle_since
+    while max_tasks is None or ran < max_tasks:
+        task = broker.claim(worker, kinds)
+        if task is None:
+            if TASK_RETENTION and time.monotonic() >= next_purge:
+                purged = broker.purge(TASK_RETENTION)
+                if purged:
+                    print(f"[{worker}] Purged {purged} finished tasks older than {TASK_RETENTION:g}s")
+                next_purge = time.monotonic() + PURGE_INTERVAL
+            if idle_exit is not None and time.monotonic() - idle_since > idle_exit:
+                break
+            time.sleep(BROKER_POLL_INTERVAL)
+            continue
+
+        with _heartbeat(broker, task.id, worker):
+            try:
+                result = TASKS[task.kind](task.payload)
+            except Exception as e:
+                traceback.print_exc()
+                print(f"[Warning] [{worker}] {task.kind} task {task.id} failed (attempt {task.attempt}): {e!r}")
+                broker.fail(task.id, worker, f"{type(e).__name__}: {e}")
+            else:
+                broker.complete(task.id, worker, result)
+        ran += 1
+        idle_since = time.monotonic()
+    return ran
+
+# ---------------------------
+# COORDINATOR
+# ---------------------------
+
+class _Waiter:
+    """Published tasks of one job that the coordinator is waiting for."""
+
+    def __init__(self, broker, label):
+        self.broker = broker
+        self.label = label
+        self.pending = {}  # task_id -> (kind, payload, [callbacks])
+        self.published = 0
+        self.since = time.monotonic()
+        self.warned = False
+
+    def add(self, kind: str, key: str, payload: dict, callback):
+        task_id = f"{kind}:{key}"
+        if task_id in self.pending:
+            self.pending[task_id][2].append(callback)
+            return
+        self.published += self.broker.put(task_id, kind, payload)
+        self.pending[task_id] = (kind, payload, [callback])
+
+    def poll(self):
+        """Run callbacks of finished tasks; raises TaskFailed."""
+        states = self.broker.states(self.pending)
+        for task_id, state in states.items():
+            kind, payload, callbacks = self.pending[task_id]
+            if state.status == "failed":
+                raise TaskFailed(f"{kind} task {task_id} failed: {state.error}")
+            if state.status != "done":
+                continue
+            name = state.result.get({"tts": "audio", "render": "image", "segment": "segment"}.get(kind))
+            if name and not os.path.exists(shared_path(name)):
+                # Result from an earlier job whose artifact was removed since
+                self.broker.put(task_id, kind, payload, force=True)
+                continue
+            del self.pending[task_id]
+            for callback in callbacks:
+                callback(state.result)
+            self.since = time.monotonic()
+
+        if (self.pending and not self.warned and time.monotonic() - self.since > BROKER_STALL_WARNING
+                and all(states.get(task_id, TaskState("queued", None, None)).status == "queued" for task_id in self.pending)):
+            print(f"[Warning] [{self.label}] {len(self.pending)} tasks unclaimed for {BROKER_STALL_WARNING:g}s, "
+                  f"are workers running? (python cluster.py worker)")
+            self.warned = True
+
+    def wait(self):
+        while self.pending:
+            self.poll()
+            if self.pending:
+                time.sleep(BROKER_POLL_INTERVAL)
+
+    async def wait_async(self):
+        while self.pending:
+            self.poll()
+            if self.pending:
+                await asyncio.sleep(BROKER_POLL_INTERVAL)
+
+async def produce_slide_assets(jobs, broker, timer, label="cluster", progress=None, on_audio=None, on_visual=None):
+    """
+    main.produce_slide_assets with TTS and rendering done by cluster
+    workers: every SlideTask becomes a "tts" and a "render" task (slides
+    with kept audio, a kept segment or a cached frame skip theirs).
+    Visuals come back as PNGs in SHARED_DIR: (image_path, None).
+    Returns ([TTSResult], [(image_path, frame)]) in the same order as jobs.
+    """
+    progress = progress or (lambda stage, done, total: None)
+    waiter = _Waiter(broker, label)
+    tts_results, visuals = [], []
+    done = {"tts": 0, "render": 0}
+
+    def finished(stage, index, results, value, callback):
+        results[index] = value
+        done[stage] += 1
+        progress(stage, done[stage], len(results))
+        if callback:
+            callback(index, value)
+
+    def audio_ready(index):
+        return lambda result: finished("tts", index, tts_results, audio_generator.TTSResult(
+            shared_path(result["audio"]), result["duration"], [tuple(w) for w in result["words"]], result["text"]
+        ), on_audio)
+
+    def image_ready(index):
+        return lambda result: finished("render", index, visuals, (shared_path(result["image"]), None), on_visual)
+
+    backend = audio_generator.get_tts_backend()
+    with timer.track("broker") as span:
+        for job in jobs:
+            tts_results.append(None)
+            visuals.append(None)
+            if job.tts:
+                finished("tts", job.index, tts_results, job.tts, on_audio)
+            else:
+                key = audio_generator.synthesis_key(job.narration, job.target_duration, backend=backend)
+                waiter.add("tts", key, {
+                    "text": job.narration, "target_duration": job.target_duration,
+                    "voice": VOICE, "backend": backend.name, "audio": f"audio/{key}.mp3",
+                }, audio_ready(job.index))
+
+            frame = None
+            if not (job.image_path or job.reuse_segment):
+                frame = image_generator.cached_frame(job.render_key, job.height)
+            if job.image_path or job.reuse_segment or frame is not None:
+                finished("render", job.index, visuals, (job.image_path, frame), on_visual)
+            else:
+                spec = {name: value for name, value in job.render if name != "output_name"}
+                spec["images"] = [share_file(path, "images") for path in spec.get("images") or []]
+                waiter.add("render", job.render_key, {
+                    "spec": spec, "image": f"frames/{job.render_key}.png",
+                }, image_ready(job.index))
+        span.set(slides=len(tts_results), tasks=len(waiter.pending), published=waiter.published)
+
+    await waiter.wait_async()
+    return tts_results, visuals
+
+def segment_encoder(broker, label="cluster"):
+    """
+    encode(tasks) for video_compiler.build_video_from_segments: every
+    segment is a "segment" task for the cluster workers, then linked
+    from SHARED_DIR to where the build expects it.
+    """
+    def encode(tasks):
+        waiter = _Waiter(broker, label)
+        frames = []
+        for index, (slide, out_path, cues) in enumerate(tasks):
+            frames.append(None)
+            image = _share_visual(slide)
+            cues = [[list(span), text] for span, text in cues or []]
+            key = content_key(video_compiler.SEGMENT_PROFILE, round(slide["duration"] * video_compiler.FPS), image, json.dumps(cues))
+
+            def placed(result, index=index, out_path=out_path):
+                link_or_copy(shared_path(result["segment"]), out_path)
+                frames[index] = result["frames"]
+
+            waiter.add("segment", key, {
+                "image": image, "duration": slide["duration"], "cues": cues, "segment": f"segments/{key}.mp4",
+            }, placed)
+        waiter.wait()
+        return frames
+
+    return encode
+
+# ---------------------------
+# CLI
+# ---------------------------
+
+def run():
+    parser = argparse.ArgumentParser(description="Run cluster workers for slide TTS, rendering and segment encoding.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="claim and run tasks from the broker")
+    worker.add_argument("--broker", default=None, help="default: BROKER_URL")
+    worker.add_argument("--processes", type=int, default=1, help="worker processes on this host")
+    worker.add_argument("--kinds", nargs="*", default=None, choices=sorted(TASKS), help="default: every kind")
+    worker.add_argument("--max-tasks", type=int, default=None)
+    worker.add_argument("--idle-exit", type=float, default=None, help="stop after this many idle seconds")
+    purge = sub.add_parser("purge", help="delete old finished tasks from the broker")
+    purge.add_argument("--broker", default=None, help="default: BROKER_URL")
+    purge.add_argument("--older-than", type=float, default=TASK_RETENTION, help="seconds (default: TASK_RETENTION)")
+    args = parser.parse_args()
+
+    if args.command == "purge":
+        broker = get_broker(args.broker)
+        if broker is None:
+            raise SystemExit("No broker configured: set BROKER_URL or pass --broker")
+        print(f"[cluster] Purged {broker.purge(args.older_than)} finished tasks")
+        return
+
+    options = dict(url=args.broker, kinds=args.kinds, max_tasks=args.max_tasks, idle_exit=args.idle_exit)
+    if args.processes <= 1:
+        run_worker(**options)
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=run_worker, kwargs=options) for _ in range(args.processes)]
+    for proc in processes:
+        proc.start()
+    print(f"[cluster] Started {len(processes)} workers")
+    try:
+        for proc in processes:
+            proc.join()
+    except KeyboardInterrupt:
+        for proc in processes:
+            proc.terminate()
+
+if __name__ == "__main__":
+    run()
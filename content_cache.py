@@ -0,0 +1,233 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+CACHE_ROOT = os.getenv("CACHE_DIR", os.path.join("output", "cache"))
+# Stores only add to a running size total; the directory is walked when
+# that total passes max_bytes, or after this many seconds (other
+# processes sharing the directory add entries this one does not count)
+CACHE_SCAN_INTERVAL = float(os.getenv("CACHE_SCAN_INTERVAL", "60"))
+
+# ---------------------------
+# KEYS
+# ---------------------------
+
+def content_key(*parts) -> str:
+    """
+    Stable sha256 over the given parts.
+    Parts are separated so ("ab", "c") and ("a", "bc") never collide.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(part)
+        else:
+            digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+# ---------------------------
+# FILE HELPERS
+# ---------------------------
+
+def file_digest(path) -> str:
+    """sha256 of a file's bytes, or "missing" when it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except (OSError, TypeError):
+        return "missing"
+    return digest.hexdigest()
+
+def _tmp_name(path: str) -> str:
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+
+def link_or_copy(src: str, dest: str):
+    """
+    Place src at dest without ever exposing a half-written file.
+    Hard links are used when possible, otherwise the bytes are copied.
+    The final os.replace swaps the directory entry, so an old dest that
+    happens to be a hard link into the cache is never truncated.
+    """
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    tmp = _tmp_name(dest)
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+# ---------------------------
+# CACHE
+# ---------------------------
+
+class ContentCache:
+    """
+    Size-bounded, content-addressed file cache on disk.
+
+    Entries are written atomically (temp file + os.replace) so several
+    jobs or worker processes can share one directory. Entry mtime is
+    bumped on every hit and the oldest entries are evicted first (LRU).
+    The size is tracked as entries are stored, so a store only walks the
+    directory when the cache may have outgrown max_bytes.
+    """
+
+    def __init__(self, name: str, max_bytes: int, suffix: str = "", root: str = CACHE_ROOT):
+        self.name = name
+        self.dir = os.path.join(root, name)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None  # bytes, as of the last scan plus our own stores
+        self._scanned_at = 0.0
+        os.makedirs(self.dir, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.dir, key[:2], key + self.suffix)
+
+    def lookup(self, key: str):
+        """Return the cached path for key (and count a hit) or None."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        return path
+
+    def fetch(self, key: str, dest: str) -> bool:
+        """Copy/link the entry for key into dest. Returns False on a miss."""
+        path = self.lookup(key)
+        if path is None:
+            return False
+        try:
+            link_or_copy(path, dest)
+        except FileNotFoundError:
+            # Evicted by another process between lookup and link
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return False
+        return True
+
+    def store(self, key: str, src: str) -> str:
+        """Copy src into the cache under key and return the cached path."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = _tmp_name(path)
+        try:
+            shutil.copyfile(src, tmp)
+            self._replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def store_bytes(self, key: str, data: bytes) -> str:
+        """Write data into the cache under key and return the cached path."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = _tmp_name(path)
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            self._replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def _replace(self, tmp: str, path: str):
+        """Move a written entry into place and evict if the cache may be over budget."""
+        size = os.path.getsize(tmp)
+        try:
+            size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            due = (self._size is None or self._size > self.max_bytes
+                   or time.monotonic() - self._scanned_at > CACHE_SCAN_INTERVAL)
+        if due:
+            self.evict()
+
+    def read_bytes(self, key: str):
+        """Contents of the entry for key, or None on a miss."""
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def evict(self):
+        """Walk the cache and drop least recently used entries until it fits max_bytes."""
+        if self.max_bytes <= 0:
+            return
+        scanned_at = time.monotonic()
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+                total += st.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, full in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(full)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+
+        with self._lock:
+            self._size = total
+            self._scanned_at = scanned_at
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,329 @@
+import asyncio
+import math
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from moviepy.config import get_setting
+import audio_track
+import subtitle_engine
+import translate_Subtitles
+import video_compiler
+
+# Served by the API under /hls/<job_id>/master.m3u8
+HLS_DIR = os.path.join("output", "hls")
+# Progressive playlist of a running job: /hls/<job_id>/live/index.m3u8
+LIVE_NAME = "live"
+
+# MPEG-TS packets; the first video PTS is read from the start of a segment
+TS_PACKET = 188
+TS_PROBE_BYTES = 1 << 20
+_EXTINF_RE = re.compile(r"#EXTINF:([\d.]+)")
+
+# ---------------------------
+# VIDEO PLAYLISTS
+# ---------------------------
+
+def _start_time(ts_path: str) -> float:
+    """
+    Presentation time of the first video frame of an MPEG-TS segment
+    (the muxer shifts the timeline by ~1.4s), read from the first video
+    PES header: 33-bit PTS on a 90 kHz clock.
+    """
+    with open(ts_path, "rb") as f:
+        data = f.read(TS_PROBE_BYTES)
+    for pos in range(0, len(data) - TS_PACKET + 1, TS_PACKET):
+        packet = data[pos:pos + TS_PACKET]
+        # Sync byte and payload_unit_start_indicator
+        if packet[0] != 0x47 or not packet[1] & 0x40:
+            continue
+        start = 4
+        if packet[3] & 0x20:  # adaptation field
+            start += 1 + packet[4]
+        pes = packet[start:]
+        if len(pes) < 14 or pes[:3] != b"\x00\x00\x01" or not 0xE0 <= pes[3] <= 0xEF or not pes[7] & 0x80:
+            continue
+        p = pes[9:14]
+        pts = ((p[0] >> 1) & 0x07) << 30 | p[1] << 22 | (p[2] >> 1) << 15 | p[3] << 7 | p[4] >> 1
+        return pts / 90000
+    return 0.0
+
+def segment_rendition(video_path: str, out_dir: str, cut_times):
+    """
+    Split an MP4 into MPEG-TS segments with a media playlist, by stream
+    copy. Cuts fall on the keyframes the encoders force at cut_times
+    (video_compiler.keyframe_times), so segments start at slide starts.
+    Returns [(segment file, duration)].
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    cuts = [t for t in cut_times if t > 0]
+    cmd = [
+        get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+        "-i", os.path.abspath(video_path),
+        "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+        "-f", "segment", "-segment_format", "mpegts",
+        # Keyframe times were rounded down to the millisecond
+        "-segment_time_delta", f"{0.5 / video_compiler.FPS:.4f}",
+        "-segment_list", "index.m3u8", "-segment_list_type", "m3u8",
+    ]
+    if cuts:
+        cmd += ["-segment_times", ",".join(f"{t:.3f}" for t in cuts)]
+    else:
+        cmd += ["-segment_time", "86400"]
+    # Relative names in the playlist: run inside out_dir
+    subprocess.run(cmd + ["seg_%05d.ts"], check=True, cwd=out_dir)
+    return read_playlist(os.path.join(out_dir, "index.m3u8"))[0]
+
+def stream_info(out_dir: str, segments) -> dict:
+    """BANDWIDTH (peak segment bitrate) and AVERAGE-BANDWIDTH in bits/s."""
+    sizes = [os.path.getsize(os.path.join(out_dir, name)) for name, _ in segments]
+    total = sum(duration for _, duration in segments) or 1.0
+    peak = max((size * 8 / max(duration, 0.001) for size, (_, duration) in zip(sizes, segments)), default=0)
+    return {"BANDWIDTH": math.ceil(peak), "AVERAGE-BANDWIDTH": math.ceil(sum(sizes) * 8 / total)}
+
+# ---------------------------
+# SUBTITLE PLAYLISTS
+# ---------------------------
+
+def _vtt_timestamp(seconds: float) -> str:
+    return subtitle_engine.srt_timestamp(seconds).replace(",", ".")
+
+def write_vtt(srt_path: str, vtt_path: str, mpegts_start: float = 0.0):
+    """
+    WebVTT copy of an SRT. X-TIMESTAMP-MAP ties cue time 0 to the first
+    video timestamp so players keep the cues in sync with the segments.
+    """
+    with open(vtt_path, "w", encoding="utf-8") as f:
+        f.write(f"WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:{round(mpegts_start * 90000)},LOCAL:00:00:00.000\n\n")
+        for (start, end), text in subtitle_engine.parse_srt(srt_path):
+            f.write(f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}\n{text}\n\n")
+
+def write_media_playlist(path: str, segments, playlist_type="VOD", target=None, ended=True):
+    """
+    Media playlist for [(file, duration)], replaced atomically so players
+    polling an EVENT playlist never read half of it.
+    """
+    target = target or max((math.ceil(duration) for _, duration in segments), default=1)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{target}",
+             "#EXT-X-MEDIA-SEQUENCE:0", f"#EXT-X-PLAYLIST-TYPE:{playlist_type}"]
+    for name, duration in segments:
+        lines += [f"#EXTINF:{duration:.6f},", name]
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+def read_playlist(path: str):
+    """[(file, duration)] of a media playlist and whether it has ended."""
+    segments = []
+    duration = None
+    ended = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            match = _EXTINF_RE.match(line)
+            if match:
+                duration = float(match.group(1))
+            elif line == "#EXT-X-ENDLIST":
+                ended = True
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((line, duration))
+                duration = None
+    return segments, ended
+
+# ---------------------------
+# MASTER PLAYLIST
+# ---------------------------
+
+def package(job_id: str, variants, slots, subtitles=None, out_root: str = HLS_DIR) -> str:
+    """
+    Package finished MP4s as one HLS presentation in out_root/job_id:
+        master.m3u8             one EXT-X-STREAM-INF per variant
+        <name>/index.m3u8       MPEG-TS segments split at slide starts
+        subs/<lang>.m3u8, .vtt  one WebVTT playlist per subtitle language
+    variants: [{"name", "path", "size": (w, h)}], first is the default.
+    slots: slide durations (seconds) the videos were encoded with.
+    subtitles: {language code: srt path}.
+    The folder is written next to the old one and swapped in at the end.
+    Returns the master playlist path.
+    """
+    final_dir = os.path.join(out_root, job_id)
+    work_dir = final_dir + ".tmp"
+    shutil.rmtree(work_dir, ignore_errors=True)
+    cut_times = video_compiler.keyframe_times(slots)
+
+    streams = []
+    start = 0.0
+    for variant in variants:
+        out_dir = os.path.join(work_dir, variant["name"])
+        segments = segment_rendition(variant["path"], out_dir, cut_times)
+        if not streams and segments:
+            start = _start_time(os.path.join(out_dir, segments[0][0]))
+        streams.append((variant, stream_info(out_dir, segments)))
+
+    media = []
+    if subtitles:
+        subs_dir = os.path.join(work_dir, "subs")
+        os.makedirs(subs_dir, exist_ok=True)
+        total = sum(slots)
+        for lang, srt_path in subtitles.items():
+            write_vtt(srt_path, os.path.join(subs_dir, f"{lang}.vtt"), start)
+            write_media_playlist(os.path.join(subs_dir, f"{lang}.m3u8"), [(f"{lang}.vtt", total)])
+            name = "English" if lang == "en" else translate_Subtitles.languages.get(lang, lang)
+            # Off by default: burned-in renditions already show them
+            media.append(
+                f'#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="{name}",LANGUAGE="{lang}",'
+                f'DEFAULT=NO,AUTOSELECT=YES,URI="subs/{lang}.m3u8"'
+            )
+
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS", *media]
+    for variant, info in streams:
+        width, height = variant["size"]
+        attrs = [f"BANDWIDTH={info['BANDWIDTH']}", f"AVERAGE-BANDWIDTH={info['AVERAGE-BANDWIDTH']}",
+                 f"RESOLUTION={width}x{height}", f"FRAME-RATE={video_compiler.FPS:.3f}"]
+        if media:
+            attrs.append('SUBTITLES="subs"')
+        lines += ["#EXT-X-STREAM-INF:" + ",".join(attrs), f"{variant['name']}/index.m3u8"]
+    with open(os.path.join(work_dir, "master.m3u8"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    # The progressive playlist of this job stays published
+    live_dir = os.path.join(final_dir, LIVE_NAME)
+    if os.path.isdir(live_dir):
+        os.replace(live_dir, os.path.join(work_dir, LIVE_NAME))
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(work_dir, final_dir)
+    return os.path.join(final_dir, "master.m3u8")
+
+# ---------------------------
+# PROGRESSIVE PUBLISHING
+# ---------------------------
+
+def cut_live_segment(segment_path: str, audio_path: str, slot: float, offset: float, out_dir: str, index: int):
+    """
+    Mux one slide's video-only segment with its audio (padded to the
+    slot) into MPEG-TS pieces split on the keyframes inside the slide,
+    timestamps shifted to the slide's place in the deck.
+    Returns [(file, duration)].
+    """
+    prefix = f"s{index:05d}"
+    track = os.path.join(out_dir, f"{prefix}.mp3")
+    audio_track.assemble_track([audio_path], track, [slot])
+    cuts = [t for t in video_compiler.slide_keyframes(0.0, slot) if t > 0]
+    cmd = [
+        get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+        "-i", os.path.abspath(segment_path), "-i", os.path.abspath(track),
+        "-map", "0:v:0", "-map", "1:a:0", "-c", "copy", "-t", f"{slot:.6f}",
+        "-output_ts_offset", f"{offset:.6f}",
+        "-f", "segment", "-segment_format", "mpegts",
+        "-segment_time_delta", f"{0.5 / video_compiler.FPS:.4f}",
+    ]
+    if cuts:
+        cmd += ["-segment_times", ",".join(f"{t:.3f}" for t in cuts)]
+    else:
+        cmd += ["-segment_time", "86400"]
+    try:
+        subprocess.run(cmd + [f"{prefix}_%03d.ts"], check=True, cwd=out_dir)
+    finally:
+        os.remove(track)
+
+    # The segment muxer's own list reports shifted times; piece lengths
+    # come from the first video timestamp of each piece instead
+    names = sorted(name for name in os.listdir(out_dir) if name.startswith(prefix + "_") and name.endswith(".ts"))
+    starts = [_start_time(os.path.join(out_dir, name)) for name in names]
+    ends = starts[1:] + [starts[0] + slot]
+    return [(name, end - start) for name, start, end in zip(names, starts, ends)]
+
+class LivePublisher:
+    """
+    Publishes a running job as an HLS EVENT playlist (live/index.m3u8).
+    Each slide's segment is encoded in a process pool as soon as both
+    its audio and its frame exist, while TTS and rendering carry on with
+    later slides; segments are appended strictly in slide order.
+    Encoded segments go to video_compiler.SEGMENT_CACHE, so the final
+    per-slide segment build reuses them instead of encoding again.
+    on_publish(slides_published, [(file, duration)]) follows every append.
+    """
+
+    def __init__(self, job_id: str, work_dir: str, workers=None, burn_subtitles=None, on_publish=None, out_root: str = HLS_DIR):
+        self.out_dir = os.path.join(out_root, job_id, LIVE_NAME)
+        self.playlist = os.path.join(self.out_dir, "index.m3u8")
+        self.work_dir = work_dir
+        self.burn_subtitles = video_compiler.SUBTITLE_MODE == "burn" if burn_subtitles is None else burn_subtitles
+        self.on_publish = on_publish or (lambda published, pieces: None)
+        # Pieces never run past the keyframe interval inside a slide
+        self.target = math.ceil(video_compiler.KEYFRAME_INTERVAL)
+        self.segments = []  # published (file, duration), in order
+        self.slides_published = 0
+        self._pool = ProcessPoolExecutor(max_workers=max(1, workers or video_compiler.SEGMENT_WORKERS))
+        self._ready = {}  # index -> (segment path, audio path, slot)
+        self._offset = 0.0
+        self._tasks = []
+        self._lock = asyncio.Lock()
+
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+        os.makedirs(self.out_dir)
+        os.makedirs(work_dir, exist_ok=True)
+        write_media_playlist(self.playlist, [], "EVENT", self.target, ended=False)
+
+    def add(self, index: int, slide: dict, text: str = "", words=None):
+        """
+        Slide index has its audio and visual: slide needs "audio",
+        "duration" (seconds the slide lasts), "image" or "frame",
+        optionally "speech" (seconds of speech the cues are timed over,
+        default duration), "background", "segment" and "reuse_segment".
+        """
+        slot = audio_track.slot_duration(slide["duration"], video_compiler.FPS)
+        cues = []
+        if self.burn_subtitles:
+            speech = min(slide.get("speech") or slot, slot)
+            cues = [((start, end), subtitle_engine.two_lines(cue))
+                    for start, end, cue in subtitle_engine.split_cues(text, speech, words)]
+        self._tasks.append(asyncio.ensure_future(self._encode(index, dict(slide, duration=slot), cues)))
+
+    async def _encode(self, index, slide, cues):
+        loop = asyncio.get_running_loop()
+        path = slide.get("segment") or os.path.join(self.work_dir, f"{index:04d}.mp4")
+        if not (slide.get("reuse_segment") and os.path.exists(path)):
+            key = video_compiler.segment_key(slide, slide["duration"], cues)
+            if not video_compiler.SEGMENT_CACHE.fetch(key, path):
+                await loop.run_in_executor(self._pool, video_compiler.encode_segment, slide, path, cues)
+                video_compiler.SEGMENT_CACHE.store(key, path)
+        self._ready[index] = (path, slide["audio"], slide["duration"])
+        await self._flush()
+
+    async def _flush(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while self.slides_published in self._ready:
+                index = self.slides_published
+                path, audio, slot = self._ready.pop(index)
+                # Stream copy only: not queued behind the encodes in the pool
+                pieces = await loop.run_in_executor(
+                    None, cut_live_segment, path, audio, slot, self._offset, self.out_dir, index
+                )
+                self._offset += slot
+                self.segments += pieces
+                self.slides_published += 1
+                write_media_playlist(self.playlist, self.segments, "EVENT", self.target, ended=False)
+                self.on_publish(self.slides_published, pieces)
+
+    async def finish(self) -> str:
+        """Wait for the last segments, end the playlist; returns its path."""
+        try:
+            await asyncio.gather(*self._tasks)
+            write_media_playlist(self.playlist, self.segments, "EVENT", self.target, ended=True)
+        finally:
+            self._pool.shutdown()
+            # Segments outside a project folder live on in SEGMENT_CACHE
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        return self.playlist
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
@@ -1,5 +1,13 @@
 from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+from content_cache import ContentCache, content_key, file_digest
+import numpy as np
+import json
+import threading
 import os
+import sys
 import textwrap
 
 OUTPUT_DIR = "output"
@@ -7,23 +15,87 @@ ASSETS_DIR = "images"
 
 WIDTH, HEIGHT = 1280, 720
 
+# Rendered frames shared across jobs: key = render_key(spec)
+FRAME_CACHE = ContentCache(
+    "frames",
+    max_bytes=int(os.getenv("FRAME_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    suffix=".rgb",
+)
+# Bump when SlideRenderer output changes so old cached frames are not reused
+RENDER_VERSION = 1
+
+# ---------------------------
+# FONT DISCOVERY
+# ---------------------------
+
+# Tried in order in every font directory; FONT_REGULAR / FONT_MONO
+# (a file path) override the search, FONT_DIRS adds directories.
+# The script kinds are used for subtitles in languages the regular font
+# does not cover (subtitle_engine.SCRIPT_FONTS), e.g. FONT_DEVANAGARI.
+FONT_NAMES = {
+    "regular": ["arial.ttf", "Arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Helvetica.ttc"],
+    "mono": ["consola.ttf", "Menlo.ttc", "DejaVuSansMono.ttf", "LiberationMono-Regular.ttf", "Courier New.ttf"],
+    "devanagari": ["NotoSansDevanagari-Regular.ttf", "Lohit-Devanagari.ttf", "Nirmala.ttf", "Mangal.ttf",
+                   "Kohinoor.ttc"],
+    "bengali": ["NotoSansBengali-Regular.ttf", "Lohit-Bengali.ttf", "Nirmala.ttf", "Vrinda.ttf"],
+    "gurmukhi": ["NotoSansGurmukhi-Regular.ttf", "Lohit-Gurmukhi.ttf", "Nirmala.ttf", "Raavi.ttf"],
+    "gujarati": ["NotoSansGujarati-Regular.ttf", "Lohit-Gujarati.ttf", "Nirmala.ttf", "Shruti.ttf"],
+    "tamil": ["NotoSansTamil-Regular.ttf", "Lohit-Tamil.ttf", "Nirmala.ttf", "Latha.ttf"],
+    "telugu": ["NotoSansTelugu-Regular.ttf", "Lohit-Telugu.ttf", "Nirmala.ttf", "Gautami.ttf"],
+    "kannada": ["NotoSansKannada-Regular.ttf", "Lohit-Kannada.ttf", "Nirmala.ttf", "Tunga.ttf"],
+    "malayalam": ["NotoSansMalayalam-Regular.ttf", "Lohit-Malayalam.ttf", "Nirmala.ttf", "Kartika.ttf"],
+    "arabic": ["NotoSansArabic-Regular.ttf", "NotoNaskhArabic-Regular.ttf", "arial.ttf", "GeezaPro.ttc"],
+    "hebrew": ["NotoSansHebrew-Regular.ttf", "arial.ttf", "ArialHB.ttc", "DejaVuSans.ttf"],
+    "thai": ["NotoSansThai-Regular.ttf", "tahoma.ttf", "Thonburi.ttc"],
+    "cjk": ["NotoSansCJK-Regular.ttc", "NotoSansCJKsc-Regular.otf", "msyh.ttc", "PingFang.ttc",
+            "wqy-microhei.ttc"],
+}
+
+def font_dirs():
+    dirs = [d for d in os.getenv("FONT_DIRS", "").split(os.pathsep) if d]
+    if sys.platform.startswith("win"):
+        dirs.append(os.path.join(os.getenv("WINDIR", "C:\\Windows"), "Fonts"))
+    elif sys.platform == "darwin":
+        dirs += ["/Library/Fonts", "/System/Library/Fonts", os.path.expanduser("~/Library/Fonts")]
+    else:
+        dirs += ["/usr/share/fonts", "/usr/local/share/fonts",
+                 os.path.expanduser("~/.fonts"), os.path.expanduser("~/.local/share/fonts")]
+    return [d for d in dirs if os.path.isdir(d)]
+
+@lru_cache(maxsize=None)
+def find_font(kind="regular"):
+    """Path of the first installed font for kind (a FONT_NAMES key), or None."""
+    override = os.getenv(f"FONT_{kind.upper()}")
+    if override and os.path.exists(override):
+        return override
+
+    wanted = {name.lower(): rank for rank, name in enumerate(FONT_NAMES[kind])}
+    best = None
+    for directory in font_dirs():
+        for root, _, files in os.walk(directory):
+            for name in files:
+                rank = wanted.get(name.lower())
+                if rank is not None and (best is None or rank < best[0]):
+                    best = (rank, os.path.join(root, name))
+        if best is not None:
+            return best[1]
+    return None
+
+def load_font(kind, size):
+    path = find_font(kind)
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    return ImageFont.load_default()
+
 # ---------------------------
 # FONT LOADER
 # ---------------------------
 def load_fonts():
-    try:
-        font_path = "C:\\Windows\\Fonts\\arial.ttf"
-        mono_path = "C:\\Windows\\Fonts\\consola.ttf"
-        title_font = ImageFont.truetype(font_path, 52)
-        body_font = ImageFont.truetype(font_path, 28)
-        math_font = ImageFont.truetype(font_path, 32)
-        code_font = ImageFont.truetype(mono_path, 17)
-    except:
-        title_font = ImageFont.load_default()
-        body_font = ImageFont.load_default()
-        math_font = ImageFont.load_default()
-        code_font = ImageFont.load_default()
-    return title_font, body_font, math_font, code_font
+    """(title, body, math, code) fonts, loaded once per process."""
+    return get_renderer().fonts
 
 # ---------------------------
 # THEME CONFIG
@@ -49,6 +121,159 @@ THEMES = {
     }
 }
 
+# ---------------------------
+# RENDERER
+# ---------------------------
+class SlideRenderer:
+    """
+    Draws slides with everything that does not depend on the slide text
+    prepared once: fonts, the per-theme background + card, and resized
+    thumbnails of image assets (keyed by path + mtime).
+    """
+
+    THUMB_SIZE = (300, 200)
+    MAX_THUMBS = 64
+
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        self.width = width
+        self.height = height
+        # Layout is designed for 720p and scaled for other heights
+        self.scale = height / HEIGHT
+        self.fonts = (
+            load_font("regular", self.px(52)),
+            load_font("regular", self.px(28)),
+            load_font("regular", self.px(32)),
+            load_font("mono", self.px(17)),
+        )
+        self._canvases = {}
+        self._thumbs = {}
+
+    def px(self, value):
+        """A 720p layout length at this renderer's size."""
+        return round(value * self.scale)
+
+    def base_canvas(self, theme):
+        """Fresh copy of the memoized background + card for theme."""
+        canvas = self._canvases.get(theme)
+        if canvas is None:
+            theme_cfg = THEMES.get(theme, THEMES["content"])
+            canvas = Image.new("RGB", (self.width, self.height), theme_cfg["bg"])
+            draw = ImageDraw.Draw(canvas)
+            px = self.px
+            card_box = [px(40), px(30), self.width - px(40), self.height - px(30)]
+            draw.rounded_rectangle(card_box, radius=px(22), fill=theme_cfg["card"], outline=(90, 120, 200), width=px(2))
+            self._canvases[theme] = canvas
+        return canvas.copy()
+
+    def thumbnail(self, img_path):
+        key = (img_path, os.stat(img_path).st_mtime_ns)
+        thumb = self._thumbs.get(key)
+        if thumb is None:
+            with Image.open(img_path) as src:
+                thumb = src.convert("RGBA")
+            thumb.thumbnail((self.px(self.THUMB_SIZE[0]), self.px(self.THUMB_SIZE[1])))
+            if len(self._thumbs) >= self.MAX_THUMBS:
+                self._thumbs.pop(next(iter(self._thumbs)))
+            self._thumbs[key] = thumb
+        return thumb
+
+    def render(
+        self,
+        body_text=None,
+        title_text="",
+        math=None,
+        images=None,
+        code_block=None,
+        theme="content"
+    ):
+        """Draw one slide and return it as an RGB PIL image."""
+        WIDTH, HEIGHT = self.width, self.height
+        px = self.px
+        theme_cfg = THEMES.get(theme, THEMES["content"])
+        title_font, body_font, math_font, code_font = self.fonts
+
+        base = self.base_canvas(theme)
+        draw = ImageDraw.Draw(base)
+
+        # Title
+        draw.text((px(80), px(60)), title_text, fill=theme_cfg["title"], font=title_font)
+        y_cursor = px(160)
+
+        # ---------------------------
+        # CODE BLOCK (takes priority)
+        # ---------------------------
+        if code_block:
+            code_lines = code_block.strip().split("\n")
+            line_height = px(22)
+            max_lines = 25
+            if len(code_lines) > max_lines:
+                line_height = px(18)  # shrink if too many lines
+
+            # Inner box for code
+            box_x1, box_y1 = px(80), px(130)
+            box_x2 = WIDTH - px(80)
+            box_y2 = min(box_y1 + len(code_lines) * line_height + px(30), HEIGHT - px(50))
+            draw.rounded_rectangle([box_x1, box_y1, box_x2, box_y2], radius=px(12), fill=(10, 15, 25), outline=(60, 80, 150), width=max(1, px(1)))
+
+            # Draw code lines
+            curr_y = box_y1 + px(15)
+            for line in code_lines:
+                if curr_y + line_height > HEIGHT - px(60):
+                    break
+                draw.text((box_x1 + px(20), curr_y), line, fill=(210, 230, 255), font=code_font)
+                curr_y += line_height
+
+        # ---------------------------
+        # BODY TEXT (if no code block)
+        # ---------------------------
+        elif body_text:
+            text_to_draw = body_text if isinstance(body_text, str) else " ".join(body_text)
+            wrapped = textwrap.wrap(text_to_draw, width=70)
+            for w in wrapped:
+                draw.text((px(100), y_cursor), w, fill=theme_cfg["text"], font=body_font)
+                y_cursor += px(40)
+
+        # ---------------------------
+        # MATH (text placeholders)
+        # ---------------------------
+        if math and not code_block:
+            y_val = max(px(400), y_cursor + px(20))
+            for expr in math:
+                draw.text((px(140), y_val), f"[Math] {expr}", fill=(200, 220, 255), font=math_font)
+                y_val += px(42)
+
+        # ---------------------------
+        # IMAGES (stacked right side)
+        # ---------------------------
+        if images:
+            img_x = WIDTH - px(400)
+            img_y = px(150) if not code_block else px(400)
+            for img_name in images:
+                img_path = img_name if os.path.exists(img_name) else os.path.join(ASSETS_DIR, os.path.basename(img_name))
+                if os.path.exists(img_path):
+                    img = self.thumbnail(img_path)
+                    base.paste(img, (img_x, img_y), img)
+                    img_y += img.height + px(20)
+
+        return base
+
+_renderers = {}
+_renderer_lock = threading.Lock()
+
+def frame_size(height=HEIGHT):
+    """(width, height) of a 16:9 frame, width rounded to an even number."""
+    return round(height * WIDTH / HEIGHT / 2) * 2, height
+
+def get_renderer(height=HEIGHT):
+    """The process-wide SlideRenderer for a frame height, created on first use."""
+    renderer = _renderers.get(height)
+    if renderer is None:
+        with _renderer_lock:
+            renderer = _renderers.get(height)
+            if renderer is None:
+                renderer = _renderers[height] = SlideRenderer(*frame_size(height))
+    return renderer
+
 # ---------------------------
 # MAIN SLIDE CREATOR
 # ---------------------------
@@ -59,80 +284,18 @@ def create_styled_slide(
     images=None,
     code_block=None, 
     output_name="slide.png",
-    theme="content"
+    theme="content",
+    height=HEIGHT,
 ):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    theme_cfg = THEMES.get(theme, THEMES["content"])
-    title_font, body_font, math_font, code_font = load_fonts()
-
-    # Base image
-    base = Image.new("RGB", (WIDTH, HEIGHT), theme_cfg["bg"])
-    draw = ImageDraw.Draw(base)
-
-    # Card
-    card_box = [40, 30, WIDTH - 40, HEIGHT - 30]
-    draw.rounded_rectangle(card_box, radius=22, fill=theme_cfg["card"], outline=(90, 120, 200), width=2)
-
-    # Title
-    draw.text((80, 60), title_text, fill=theme_cfg["title"], font=title_font)
-
-    # ---------------------------
-    # CODE BLOCK (takes priority)
-    # ---------------------------
-    if code_block:
-        code_lines = code_block.strip().split("\n")
-        line_height = 22
-        max_lines = 25
-        if len(code_lines) > max_lines:
-            line_height = 18  # shrink if too many lines
-
-        # Inner box for code
-        box_x1, box_y1 = 80, 130
-        box_x2 = WIDTH - 80
-        box_y2 = min(box_y1 + len(code_lines) * line_height + 30, HEIGHT - 50)
-        draw.rounded_rectangle([box_x1, box_y1, box_x2, box_y2], radius=12, fill=(10, 15, 25), outline=(60, 80, 150), width=1)
-
-        # Draw code lines
-        curr_y = box_y1 + 15
-        for line in code_lines:
-            if curr_y + line_height > HEIGHT - 60:
-                break
-            draw.text((box_x1 + 20, curr_y), line, fill=(210, 230, 255), font=code_font)
-            curr_y += line_height
-
-    # ---------------------------
-    # BODY TEXT (if no code block)
-    # ---------------------------
-    elif body_text:
-        y_cursor = 160
-        text_to_draw = body_text if isinstance(body_text, str) else " ".join(body_text)
-        wrapped = textwrap.wrap(text_to_draw, width=70)
-        for w in wrapped:
-            draw.text((100, y_cursor), w, fill=theme_cfg["text"], font=body_font)
-            y_cursor += 40
-
-    # ---------------------------
-    # MATH (text placeholders)
-    # ---------------------------
-    if math and not code_block:
-        y_val = max(400, y_cursor + 20)
-        for expr in math:
-            draw.text((140, y_val), f"[Math] {expr}", fill=(200, 220, 255), font=math_font)
-            y_val += 42
-
-    # ---------------------------
-    # IMAGES (stacked right side)
-    # ---------------------------
-    if images:
-        img_x = WIDTH - 400
-        img_y = 150 if not code_block else 400
-        for img_name in images:
-            img_path = img_name if os.path.exists(img_name) else os.path.join(ASSETS_DIR, os.path.basename(img_name))
-            if os.path.exists(img_path):
-                img = Image.open(img_path).convert("RGBA")
-                img.thumbnail((300, 200))
-                base.paste(img, (img_x, img_y), img)
-                img_y += img.height + 20
+    base = get_renderer(height).render(
+        body_text=body_text,
+        title_text=title_text,
+        math=math,
+        images=images,
+        code_block=code_block,
+        theme=theme,
+    )
 
     # Save final slide
     out_path = os.path.join(OUTPUT_DIR, output_name)
@@ -140,3 +303,96 @@ def create_styled_slide(
     return out_path
 
 generate_slide_image = create_styled_slide
+
+# ---------------------------
+# BATCH RENDERING
+# ---------------------------
+class RawFrame(NamedTuple):
+    """A rendered slide as packed 8-bit RGB rows (no PNG encode)."""
+    size: tuple
+    data: bytes
+
+    def to_array(self):
+        """Read-only (height, width, 3) uint8 view over data, no copy."""
+        width, height = self.size
+        return np.frombuffer(self.data, dtype=np.uint8).reshape(height, width, 3)
+
+# Worker count -> pool; pools live as long as the process, since other
+# jobs may still be rendering on them
+_pools = {}
+_pool_lock = threading.Lock()
+
+def _warm_worker():
+    get_renderer()
+
+def render_pool(workers):
+    """
+    Process pool whose workers keep their SlideRenderer (fonts, theme
+    canvases, thumbnails) warm between batches and jobs. Callers asking
+    for the same worker count share one pool.
+    """
+    with _pool_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+        return _pools[workers]
+
+def render_spec(spec, as_buffer=False, save_png=False):
+    """
+    Render one slide spec (create_styled_slide keyword arguments;
+    "height" picks the frame size, default 720).
+    Returns the PNG path, or a RawFrame when as_buffer is set; save_png
+    additionally writes the PNG for a RawFrame (debug artifacts).
+    """
+    spec = dict(spec)
+    if as_buffer:
+        output_name = spec.pop("output_name", None)
+        img = get_renderer(spec.pop("height", HEIGHT)).render(**spec)
+        if save_png and output_name:
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            img.save(os.path.join(OUTPUT_DIR, output_name))
+        return RawFrame(img.size, img.tobytes())
+    return create_styled_slide(**spec)
+
+# ---------------------------
+# FRAME DEDUPLICATION
+# ---------------------------
+
+def render_key(spec) -> str:
+    """
+    Content hash of everything that affects a rendered slide: the spec
+    (minus output_name, including "height"), embedded image bytes,
+    fonts and the default frame size.
+    Identical slides get the same key within a deck and across jobs.
+    """
+    spec = {k: v for k, v in spec.items() if k != "output_name"}
+    images = [file_digest(path) for path in spec.get("images") or []]
+    return content_key(
+        RENDER_VERSION, WIDTH, HEIGHT, find_font("regular"), find_font("mono"),
+        json.dumps(spec, sort_keys=True, default=str), *images,
+    )
+
+def cached_frame(key, height=HEIGHT):
+    """RawFrame stored under key by an earlier render, or None."""
+    size = frame_size(height)
+    data = FRAME_CACHE.read_bytes(key)
+    if data is None or len(data) != size[0] * size[1] * 3:
+        return None
+    return RawFrame(size, data)
+
+def store_frame(key, frame):
+    FRAME_CACHE.store_bytes(key, frame.data)
+
+def render_slides(specs, workers=None, as_buffers=False, save_png=False):
+    """
+    Render many slide specs across a process pool.
+    Results come back in the same order as specs.
+    """
+    specs = list(specs)
+    workers = max(1, workers or os.cpu_count() or 1)
+    render = partial(render_spec, as_buffer=as_buffers, save_png=save_png)
+    if workers == 1 or len(specs) <= 1:
+        return [render(spec) for spec in specs]
+
+    # The pool keeps its configured size; a short batch just uses fewer of its processes
+    chunksize = max(1, len(specs) // (min(workers, len(specs)) * 4))
+    return list(render_pool(workers).map(render, specs, chunksize=chunksize))
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+import metrics
+
+JOBS_DIR = os.path.join("output", "jobs")
+
+# Worker processes running pipelines at the same time
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Jobs allowed to wait for a worker before new submissions are refused
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "20"))
+# Seconds between checks for crashed worker processes
+WORKER_WATCH_INTERVAL = float(os.getenv("WORKER_WATCH_INTERVAL", "1.0"))
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+class NoWorkers(Exception):
+    """Raised when a job is submitted while no worker process is alive."""
+
+# ---------------------------
+# JOB STATE
+# ---------------------------
+
+class JobStore:
+    """
+    One JSON file per job under JOBS_DIR, written atomically.
+
+    status: queued -> running -> done | failed
+    stages: {stage: {"done": n, "total": m}} updated while running
+    """
+
+    def __init__(self, root: str = JOBS_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _write(self, job_id: str, state: dict):
+        path = self._path(job_id)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, path)
+
+    def get(self, job_id: str):
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def create(self, job_id: str):
+        state = {
+            "job_id": job_id,
+            "status": "queued",
+            "stages": {},
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self._lock:
+            self._write(job_id, state)
+        return state
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            state = self.get(job_id) or {"job_id": job_id, "stages": {}}
+            state.update(fields)
+            self._write(job_id, state)
+        return state
+
+    def set_stage(self, job_id: str, stage: str, done: int, total: int):
+        with self._lock:
+            state = self.get(job_id)
+            if state is None:
+                return
+            state["stages"][stage] = {"done": done, "total": total}
+            self._write(job_id, state)
+
+    def delete(self, job_id: str):
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _states(self):
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-len(".json")]
+            state = self.get(job_id)
+            if state:
+                yield job_id, state
+
+    def recover(self):
+        """Mark jobs left queued/running by a previous server process as failed."""
+        for job_id, state in self._states():
+            if state.get("status") in ("queued", "running"):
+                self.update(job_id, status="failed", error="Interrupted by server restart", finished_at=time.time())
+
+    def fail_worker_jobs(self, pid: int, error: str) -> list:
+        """Mark the jobs a dead worker process was running as failed; returns their ids."""
+        failed = []
+        for job_id, state in self._states():
+            if state.get("status") == "running" and state.get("worker_pid") == pid:
+                self.update(job_id, status="failed", error=error, finished_at=time.time())
+                failed.append(job_id)
+        return failed
+
+# ---------------------------
+# WORKERS
+# ---------------------------
+
+def _worker_loop(jobs, store_root: str):
+    """Body of one worker process: pull (job_id, payload) until a None sentinel."""
+    # Imported here so the API process can import this module from main
+    from main import VideoRequest, run_video_pipeline
+
+    store = JobStore(store_root)
+    while True:
+        item = jobs.get()
+        if item is None:
+            break
+
+        job_id, payload = item
+        store.update(job_id, status="running", started_at=time.time(), worker_pid=os.getpid())
+
+        def progress(stage, done, total):
+            store.set_stage(job_id, stage, done, total)
+
+        start = time.perf_counter()
+        try:
+            result = asyncio.run(run_video_pipeline(VideoRequest(**payload), job_id, progress=progress))
+            store.update(job_id, status="done", result=result, finished_at=time.time())
+            status = "done"
+        except Exception as e:
+            traceback.print_exc()
+            store.update(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished_at=time.time())
+            status = "failed"
+
+        metrics.REGISTRY.inc("video_jobs_total", status=status)
+        metrics.REGISTRY.observe("video_job_duration_seconds", time.perf_counter() - start)
+        metrics.save_process_snapshot()
+
+class JobQueue:
+    """
+    Bounded queue in front of a fixed pool of worker processes.
+
+    At most `workers` pipelines run at once and at most `max_queued`
+    jobs wait; anything beyond that is refused with QueueFull so clients
+    can retry later instead of timing out. A watcher thread replaces
+    worker processes that die (crash, OOM kill) and fails the job they
+    were running.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = MAX_QUEUED_JOBS, store: JobStore | None = None):
+        self.workers = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self.store = store or JobStore()
+        self._ctx = multiprocessing.get_context("spawn")
+        self._jobs = None
+        self._processes = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._watcher = None
+
+    def _spawn(self):
+        # Not daemonic: pipelines start their own process pools
+        proc = self._ctx.Process(target=_worker_loop, args=(self._jobs, self.store.root))
+        proc.start()
+        return proc
+
+    def start(self):
+        if self._processes:
+            return
+        self.store.recover()
+        metrics.reset_snapshots()
+        self._jobs = self._ctx.Queue(maxsize=self.max_queued)
+        self._stopping.clear()
+        with self._lock:
+            self._processes = [self._spawn() for _ in range(self.workers)]
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+        print(f"[jobs] Started {self.workers} workers (max {self.max_queued} queued)")
+
+    def _watch(self):
+        while not self._stopping.wait(WORKER_WATCH_INTERVAL):
+            self.check_workers()
+
+    def check_workers(self) -> int:
+        """Replace dead worker processes and fail their jobs. Returns how many died."""
+        with self._lock:
+            if self._stopping.is_set():
+                return 0
+            dead = [proc for proc in self._processes if not proc.is_alive()]
+            for proc in dead:
+                proc.join()
+                error = f"Worker process {proc.pid} died (exit code {proc.exitcode})"
+                failed = self.store.fail_worker_jobs(proc.pid, error)
+                print(f"[jobs] {error}; failed jobs: {failed or 'none'}; starting a replacement")
+                if failed:
+                    metrics.REGISTRY.inc("video_jobs_total", len(failed), status="failed")
+                self._processes[self._processes.index(proc)] = self._spawn()
+        return len(dead)
+
+    def alive_workers(self) -> int:
+        with self._lock:
+            return sum(1 for proc in self._processes if proc.is_alive())
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        for _ in self._processes:
+            try:
+                self._jobs.put_nowait(None)
+            except queue.Full:
+                break
+        for proc in self._processes:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        self._processes = []
+
+    def submit(self, job_id: str, payload: dict):
+        if not self._processes:
+            raise RuntimeError("JobQueue.start() has not been called")
+        if not self.alive_workers():
+            raise NoWorkers("no worker process is alive")
+        state = self.store.create(job_id)
+        try:
+            self._jobs.put_nowait((job_id, payload))
+        except queue.Full:
+            self.store.delete(job_id)
+            raise QueueFull(f"{self.max_queued} jobs already waiting")
+        return state
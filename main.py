@@ -1,230 +1,641 @@
-from fastapi import FastAPI, BackgroundTasks
-from pydantic import BaseModel
-from typing import List, Optional, Union
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from typing import Iterable, Optional
 import PIL.Image
 if not hasattr(PIL.Image, 'ANTIALIAS'):
     PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
+from models import Slide, VideoRequest
 import audio_generator
 import image_generator
 import video_compiler
+import hls
+import build_manifest
+import render_plan
+import cluster
+import subtitle_engine
+import audio_track
+import job_queue
+import translate_Subtitles
+import metrics
 import os
+import mimetypes
 import uuid   
-import re
 import json
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from functools import partial
 from pathlib import Path
 
-app = FastAPI()
+JOBS = job_queue.JobQueue()
+
+@asynccontextmanager
+async def lifespan(app):
+    JOBS.start()
+    yield
+    JOBS.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # Create directories if not exist
 os.makedirs("output/temp", exist_ok=True)
 
 os.makedirs("subtitles", exist_ok=True)
 
+# HLS playlists, segments and WebVTT are plain files; StaticFiles answers
+# Range requests. .ts would otherwise be guessed as Qt Linguist text.
+os.makedirs(hls.HLS_DIR, exist_ok=True)
+mimetypes.add_type("video/mp2t", ".ts")
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("text/vtt", ".vtt")
+app.mount("/hls", StaticFiles(directory=hls.HLS_DIR), name="hls")
+
 # ---------------------------
-# DATA MODELS
+# SCHEDULER SETTINGS
 # ---------------------------
 
-class ProjectMetadata(BaseModel):
-    title: str
-    author: str
-    date: str
-    total_duration: str
-
-class Slide(BaseModel):
-    slide_id: int
-    title: str
-    duration: str  # e.g., "1 min"
-    subtitle: Optional[str] = None
-    image: Optional[str] = None
-    description: Optional[Union[str, List[str]]] = None
-    code_block: Optional[str] = None
-    math: Optional[List[str]] = None
-    bullets: Optional[List[str]] = None
-    steps: Optional[List[str]] = None
-    concepts: Optional[List[str]] = None
-
-class VideoRequest(BaseModel):
-    project_metadata: ProjectMetadata
-    slides: List[Slide]
+# Max TTS requests in flight per job (the process-wide adaptive limit
+# in tts_client starts here and is bounded by TTS_MAX_CONCURRENCY)
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+# Processes used for Pillow slide rendering (shared, warm pool)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Reuse unchanged slides from the project's previous build
+INCREMENTAL_BUILDS = os.getenv("INCREMENTAL_BUILDS", "1") == "1"
+# Also write slide PNGs to output/temp (frames otherwise stay in memory)
+DEBUG_ARTIFACTS = os.getenv("DEBUG_ARTIFACTS", "0") == "1"
+# How often /jobs/{id}/events looks at the job state and live playlist
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "0.5"))
+# Comment line sent when nothing happened for this long (keeps proxies open)
+EVENTS_KEEPALIVE = 15.0
 
 # ---------------------------
 # UTILITY FUNCTIONS
 # ---------------------------
 
-def parse_duration_to_seconds(duration_str: str) -> int:
-    """Convert '4 min' to 240 or '30 sec' to 30 seconds."""
-    try:
-        numbers = re.findall(r'\d+', str(duration_str))
-        if not numbers:
-            return 30
-        val = int(numbers[0])
-        if "min" in str(duration_str).lower():
-            return val * 60
-        return val
-    except:
-        return 30
-
-def get_narration_text(slide: Slide) -> str:
-    """Collect all relevant text from a slide for audio generation."""
-    text_parts = [slide.title]
-    if slide.subtitle:
-        text_parts.append(slide.subtitle)
-
-    source = slide.description or slide.bullets or slide.steps or ""
-    if isinstance(source, list):
-        text_parts.extend(source)
-    else:
-        text_parts.append(source)
-
-    # Clean markdown
-    clean_text = ". ".join(text_parts).replace("**", "")
-    return clean_text
-
-def generate_subtitle_srt(slides_audio: List[dict], srt_file: str):
+class StageTimer:
     """
-    Generate a simple English .srt file from audio durations.
-    slides_audio: [{"audio": audio_path, "text": narration_text}]
+    Collects per-stage timings for one job.
+    busy = summed duration of every call, wall = first start to last end.
+    Every call is also a metrics span, kept for the job report.
     """
-    from mutagen.mp3 import MP3
-
-    counter = 1
-    current_time = 0
-    lines = []
-
-    for slide in slides_audio:
-        audio_path = slide["audio"]
-        text = slide["text"]
-        if not os.path.exists(audio_path):
-            continue
-
-        audio = MP3(audio_path)
-        duration_ms = int(audio.info.length * 1000)
-        start_time = current_time
-        end_time = start_time + duration_ms
-
-        def ms_to_srt(ts_ms):
-            ms = ts_ms % 1000
-            s = (ts_ms // 1000) % 60
-            m = (ts_ms // (1000 * 60)) % 60
-            h = ts_ms // (1000 * 60 * 60)
-            return f"{h:02}:{m:02}:{s:02},{ms:03}"
-
-        lines.append(f"{counter}")
-        lines.append(f"{ms_to_srt(start_time)} --> {ms_to_srt(end_time)}")
-        lines.append(text)
-        lines.append("")  # empty line
-        counter += 1
-        current_time = end_time
-
-    with open(srt_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-
-    return srt_file
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.spans = []
+
+    @contextmanager
+    def track(self, stage: str, **attrs):
+        start = time.perf_counter()
+        span = None
+        try:
+            with metrics.span(stage, **attrs) as span:
+                yield span
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                entry = self.stages.setdefault(
+                    stage, {"calls": 0, "busy": 0.0, "start": start, "end": end}
+                )
+                entry["calls"] += 1
+                entry["busy"] += end - start
+                entry["start"] = min(entry["start"], start)
+                entry["end"] = max(entry["end"], end)
+                if span is not None:
+                    self.spans.append(span)
+
+    def report(self) -> dict:
+        return {
+            stage: {
+                "calls": e["calls"],
+                "busy_sec": round(e["busy"], 3),
+                "wall_sec": round(e["end"] - e["start"], 3),
+            }
+            for stage, e in self.stages.items()
+        }
+
+    def save_report(self, path: str, **extra) -> str:
+        """Write stage totals and every span as JSON next to the job's output."""
+        with self._lock:
+            spans = sorted((span.to_dict() for span in self.spans), key=lambda d: d["started_at"])
+        report = {**extra, "stages": self.report(), "spans": spans}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp, path)
+        return path
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{stage}={e['wall_sec']}s wall/{e['busy_sec']}s busy x{e['calls']}"
+            for stage, e in self.report().items()
+        )
 
 # ---------------------------
 # VIDEO PIPELINE
 # ---------------------------
 
-async def run_video_pipeline(request: VideoRequest, job_id: str):
-    processed = []
-    slides_audio_for_srt = []
+async def produce_slide_assets(
+    jobs: Iterable[render_plan.SlideTask],
+    timer: StageTimer,
+    tts_concurrency: int = TTS_CONCURRENCY,
+    render_workers: int = RENDER_WORKERS,
+    progress=None,
+    on_audio=None,
+    on_visual=None,
+):
+    """
+    Run TTS and slide rendering for every SlideTask at the same time.
+    TTS calls are asyncio tasks behind a semaphore (and the TTS client's
+    adaptive limit and retries), renders go to the
+    image_generator process pool.
+    progress(stage, done, total) is called as each slide finishes,
+    on_audio(index, TTSResult) as soon as a slide's audio exists and
+    on_visual(index, (image_path, frame)) as soon as its visual does.
+    Slides are rendered to in-memory RawFrames (shared through
+    image_generator.FRAME_CACHE); PNGs are only written when
+    DEBUG_ARTIFACTS is set. Slides with identical narration or visuals
+    share one TTS call / render and its artifact.
+    jobs may be a lazy iterable (e.g. slides still being parsed): each
+    job's work starts as soon as it is produced.
+    Returns ([TTSResult], [(image_path, frame)]) in the same order as jobs.
+    """
+    semaphore = asyncio.Semaphore(max(1, tts_concurrency))
+    loop = asyncio.get_running_loop()
+    progress = progress or (lambda stage, done, total: None)
+    counts = {"tts": 0, "render": 0}
+    counts_lock = threading.Lock()
+    seen = []  # jobs taken from the iterable so far
+    # Identical narration or visuals are produced once per job; every
+    # later slide awaits the same task and reuses its artifact.
+    shared = {}
+
+    def finished(stage):
+        with counts_lock:
+            counts[stage] += 1
+            done = counts[stage]
+        progress(stage, done, len(seen))
+
+    def once(key, stage, factory):
+        if key in shared:
+            metrics.REGISTRY.inc("video_stage_cache_total", stage=stage, result="shared")
+            return shared[key]
+        shared[key] = asyncio.ensure_future(factory())
+        return shared[key]
+
+    async def tts_call(job):
+        async with semaphore:
+            with timer.track("tts", slide=job.key) as span:
+                result = await audio_generator.synthesize(
+                    job.narration, job.audio_file, target_duration=job.target_duration, span=span,
+                )
+                span.set(
+                    bytes=os.path.getsize(result.path), audio_sec=round(result.duration, 3),
+                    cache_hits=int(result.cached), cache_misses=int(not result.cached),
+                )
+        return result
+
+    async def synthesize(index, job):
+        if job.tts:
+            result = job.tts
+        else:
+            key = ("tts", job.narration, job.target_duration)
+            result = await once(key, "tts", lambda: tts_call(job))
+        finished("tts")
+        if on_audio is not None:
+            on_audio(index, result)
+        return result
+
+    pool = image_generator.render_pool(max(1, render_workers))
+
+    render_frame = partial(image_generator.render_spec, as_buffer=True)
+
+    async def render_call(job):
+        key = job.render_key
+        with timer.track("render", slide=job.key) as span:
+            frame = image_generator.cached_frame(key, job.height)
+            hit = frame is not None
+            if not hit:
+                frame = await loop.run_in_executor(pool, render_frame, job.render_spec)
+                image_generator.store_frame(key, frame)
+            span.set(bytes=len(frame.data), cache_hits=int(hit), cache_misses=int(not hit))
+        return frame
+
+    async def render(index, job):
+        if job.image_path or job.reuse_segment:
+            result = (job.image_path, None)
+        else:
+            frame = await once(("render", job.render_key), "render", lambda: render_call(job))
+            path = None
+            if DEBUG_ARTIFACTS:
+                path = os.path.join(image_generator.OUTPUT_DIR, job.render_spec["output_name"])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                PIL.Image.frombytes("RGB", frame.size, frame.data).save(path)
+            result = (path, frame)
+        finished("render")
+        if on_visual is not None:
+            on_visual(index, result)
+        return result
+
+    tts_tasks = []
+    render_tasks = []
+    try:
+        for job in jobs:
+            tts_tasks.append(asyncio.create_task(synthesize(job.index, job)))
+            render_tasks.append(asyncio.create_task(render(job.index, job)))
+            seen.append(job)
+            if not isinstance(jobs, list):
+                # Let the new tasks start before producing the next job
+                await asyncio.sleep(0)
+        results = await asyncio.gather(*tts_tasks, *render_tasks)
+    except Exception:
+        for task in [*tts_tasks, *render_tasks, *shared.values()]:
+            task.cancel()
+        raise
+    finally:
+        await audio_generator.close_tts_clients()
+
+    return list(results[:len(seen)]), list(results[len(seen):])
+
+async def run_video_pipeline(
+    request: VideoRequest,
+    job_id: str,
+    tts_concurrency: int = TTS_CONCURRENCY,
+    render_workers: int = RENDER_WORKERS,
+    incremental: bool = INCREMENTAL_BUILDS,
+    progress=None,
+    slides: Optional[Iterable[Slide]] = None,
+    narration: Optional[dict] = None,
+):
+    """
+    Build the full presentation for one job.
+    slides (e.g. markdown.iter_slides(path)) replaces request.slides and
+    is consumed lazily: the first slides are rendered and synthesized
+    while later ones are still being parsed. narration: {slide_id: voice
+    text} (default: narration.json).
+    progress(stage, done, total) receives per-stage progress updates.
+    request.renditions: slides are rendered once at the largest
+    rendition height and every rendition (size, bitrate cap, subtitle
+    language and mode) is encoded from the same audio and frames.
+    request.hls: the finished video(s) are also packaged as HLS
+    (segments split at slide starts, one variant per rendition).
+    Returns {"video", "subtitles", "report", "timings"} plus
+    "renditions" ({name: path}, "video" is the first one) and "hls"
+    (master playlist path).
+    request.progressive: every slide's segment is encoded as soon as
+    its audio and visual exist and appended to an HLS EVENT playlist
+    (result "live"), overlapping encoding with TTS and rendering; the
+    final video reuses those segments.
+    With cluster.BROKER_URL set, TTS, rendering and per-slide segment
+    encodes are published as tasks for cluster workers (any number of
+    processes or hosts sharing cluster.SHARED_DIR); this process joins
+    the segments and muxes the result. The report
+    (every stage span) is also saved as <video>.timings.json.
+    """
+    timer = StageTimer()
+    started = time.perf_counter()
+    progress = progress or (lambda stage, done, total: None)
     project_title = request.project_metadata.title
+    renditions = request.renditions or []
+    render_height = max((r.height for r in renditions), default=image_generator.HEIGHT)
+    broker = cluster.get_broker()
     
-    # ---------------------------
-    # LOAD NARRATION ONCE
-    # ---------------------------
-    narration_map = {}
-
-    if os.path.exists("narration.json"):
-        with open("narration.json", "r", encoding="utf-8") as f:
-            narration_data = json.load(f)
-
-        for key, value in narration_data.items():
-            try:
-                slide_index = int(key.replace("slide_", ""))
-                narration_map[slide_index] = value.get("voice_text", "").strip()
-            except:
-                continue
-
-    print(f"[{job_id}] Starting Intro Slide...")
-
-    # 1. INTRO SLIDE
-    intro_text = f"Welcome to this presentation on {project_title}. Presented by {request.project_metadata.author}."
-    intro_audio_path = f"temp/{job_id}_intro.mp3"
-    await audio_generator.generate_audio(intro_text, intro_audio_path)
-    
-    intro_image_path = image_generator.create_styled_slide(
-        body_text=f"By {request.project_metadata.author}",
-        title_text=project_title,
-        output_name=f"temp/{job_id}_intro.png",
-        theme="intro"
-    )
-
-    processed.append({"audio": intro_audio_path, "image": intro_image_path})
-    slides_audio_for_srt.append({"audio": intro_audio_path, "text": intro_text})
-
-    # 2. CONTENT SLIDES
-    for slide in request.slides:
-        print(f"[{job_id}] Processing Slide {slide.slide_id}...")
-        sec_duration = parse_duration_to_seconds(slide.duration)
-        
-
-        #  Priority: narration.json → fallback to slide text
-        narration = narration_map.get(slide.slide_id)
-
-        if not narration:
-            narration = get_narration_text(slide)
-
-        narration = narration.strip()
-
-        #  Final safety check
-        if not narration:
-            narration = " "
-
-        audio_file = f"temp/{job_id}_slide_{slide.slide_id}.mp3"
-        audio_path = await audio_generator.generate_audio(
-            narration, audio_file, target_duration=sec_duration
+    # 1. NARRATION (narration.json, loaded once per job)
+    with timer.track("narration") as span:
+        narration_map = render_plan.load_narration() if narration is None else narration
+        span.set(entries=len(narration_map))
+
+    # 2. REUSE UNCHANGED SLIDES FROM THE LAST BUILD
+    manifest = None
+    if incremental:
+        project = build_manifest.project_key(project_title, request.project_id)
+        manifest = build_manifest.BuildManifest.load(project)
+        segments_dir = os.path.join(build_manifest.project_dir(project), "segments")
+
+    def check_reuse(task):
+        reuse = manifest.reusable(task.key, task.fingerprint)
+        tts = None
+        if reuse.get("audio") and reuse.get("tts"):
+            tts = audio_generator.TTSResult(
+                reuse["audio"], reuse["tts"]["duration"],
+                [tuple(w) for w in reuse["tts"]["words"]], reuse["tts"]["text"]
+            )
+        segment = os.path.join(segments_dir, video_compiler.segment_name(task.fingerprint))
+        return task._replace(
+            tts=tts,
+            # Kept PNGs are 720p debug artifacts
+            image_path=reuse.get("image") if render_height == image_generator.HEIGHT else None,
+            segment=segment,
+            # Renditions are encoded from frames, never from kept segments;
+            # builds that did not record the padded slot re-encode theirs once
+            reuse_segment=(tts is not None and not renditions and os.path.exists(segment)
+                           and reuse["tts"].get("slot") == task.slot(tts.duration)),
         )
 
-        display_body = slide.bullets or slide.steps or slide.concepts or slide.description or ""
-        image_file = f"temp/{job_id}_slide_{slide.slide_id}.png"
-        image_path = image_generator.create_styled_slide(
-            body_text=display_body,
-            title_text=slide.title,
-            code_block=slide.code_block,
-            math=slide.math or [],
-            images=[slide.image] if slide.image and os.path.exists(slide.image) else [],
-            output_name=image_file,
-            theme="content"
-        )
+    # 3. RENDER PLAN: the intro, then every slide, resolved once
+    jobs = []
 
-        processed.append({
-            "audio": audio_path,
-            "image": image_path,
-            "background": "assets/backgrounds/blue_gradient.mp4" if os.path.exists("assets/backgrounds/blue_gradient.mp4") else None
-        })
-        slides_audio_for_srt.append({"audio": audio_path, "text": narration})
-
-    # 3. CREATE SUBTITLES
+    def iter_jobs():
+        plan = render_plan.iter_plan(
+            request, job_id, narration_map, slides=slides, height=render_height,
+            digest=manifest.file_digest if manifest is not None else None,
+        )
+        for task in plan:
+            if manifest is not None:
+                task = check_reuse(task)
+            jobs.append(task)
+            yield task
+
+    # 4. AUDIO, IMAGES AND SUBTITLES
+    # Cues are written as soon as each slide's audio (and every slide
+    # before it) is done, using the durations/word timings from TTS.
+    # Slides occupy whole video frames, the same timing map the audio
+    # track and video use.
     srt_file = f"subtitles/{job_id}.srt"
-    generate_subtitle_srt(slides_audio_for_srt, srt_file)
-    print(f"[{job_id}] Subtitles generated: {srt_file}")
+    srt_writer = subtitle_engine.SrtWriter(srt_file)
+
+    # Progressive jobs encode and publish each slide once both its audio
+    # and visual exist, while later slides are still in TTS/rendering.
+    publisher = None
+    if request.progressive:
+        def on_publish(published, pieces):
+            if published == 1:
+                print(f"[{job_id}] First segment live after {time.perf_counter() - started:.1f}s: "
+                      f"/hls/{job_id}/{hls.LIVE_NAME}/index.m3u8")
+            progress("publish", published, len(jobs))
+
+        publisher = hls.LivePublisher(
+            job_id, os.path.join("output", "temp", f"{job_id}_live"), on_publish=on_publish
+        )
+    ready = {}  # index -> parts that exist so far
+
+    def publish_when_ready(index, **parts):
+        if publisher is None:
+            return
+        entry = ready.setdefault(index, {})
+        entry.update(parts)
+        if "tts" not in entry or "visual" not in entry:
+            return
+        del ready[index]
+        job, tts, (image_path, frame) = jobs[index], entry["tts"], entry["visual"]
+        publisher.add(index, {
+            "audio": tts.path, "duration": job.slot(tts.duration), "speech": tts.duration,
+            "image": image_path, "frame": frame,
+            "background": job.background, "segment": job.segment, "reuse_segment": job.reuse_segment,
+        }, tts.text, tts.words)
+
+    def on_audio(index, result):
+        with timer.track("subtitles") as span:
+            before = srt_writer.bytes_written
+            slot = audio_track.slot_duration(jobs[index].slot(result.duration), video_compiler.FPS)
+            srt_writer.add(index, result.text, result.duration, result.words, slot=slot)
+            span.set(bytes=srt_writer.bytes_written - before)
+        progress("subtitles", srt_writer.slides_written, len(jobs))
+        publish_when_ready(index, tts=result)
+
+    if broker is not None:
+        print(f"[{job_id}] Publishing audio and image tasks to {cluster.BROKER_URL}...")
+        assets = cluster.produce_slide_assets(
+            iter_jobs(), broker, timer, label=job_id, progress=progress, on_audio=on_audio,
+            on_visual=lambda index, visual: publish_when_ready(index, visual=visual),
+        )
+    else:
+        print(f"[{job_id}] Generating audio and images "
+              f"(tts_concurrency={tts_concurrency}, render_workers={render_workers})...")
+        assets = produce_slide_assets(
+            iter_jobs(), timer, tts_concurrency=tts_concurrency, render_workers=render_workers,
+            progress=progress, on_audio=on_audio,
+            on_visual=lambda index, visual: publish_when_ready(index, visual=visual),
+        )
+    live_playlist = None
+    try:
+        with srt_writer, timer.track("assets"):
+            tts_results, visuals = await assets
+        if publisher is not None:
+            # Only the last slides' segments are still encoding here
+            with timer.track("publish", slides=len(jobs)):
+                live_playlist = await publisher.finish()
+    except BaseException:
+        if publisher is not None:
+            publisher.cancel()
+        raise
+    print(f"[{job_id}] Subtitles generated for {len(jobs)} slides: {srt_file}")
+    if manifest is not None:
+        dirty = sum(1 for job in jobs if not job.reuse_segment)
+        print(f"[{job_id}] Incremental build for '{project}': {dirty}/{len(jobs)} slides changed")
 
-    # 4. BUILD FINAL VIDEO
+    processed = []
+    for job, tts, (image_path, frame) in zip(jobs, tts_results, visuals):
+        entry = {
+            "audio": tts.path, "duration": job.slot(tts.duration),
+            "image": image_path, "frame": frame, "background": job.background,
+        }
+        if manifest is not None:
+            entry["segment"] = job.segment
+            entry["reuse_segment"] = job.reuse_segment
+        processed.append(entry)
+
+    # 5. BUILD FINAL VIDEO
     final_video_name = f"presentation_{job_id}.mp4"
-    video_compiler.build_video(processed, subtitles_path=srt_file, final_name=final_video_name)
+    encode = cluster.segment_encoder(broker, label=job_id) if broker is not None else None
+    progress("video", 0, 1)
+
+    def compile_video():
+        """Encodes (or waits for cluster workers); runs off the event loop."""
+        if renditions:
+            languages = sorted({r.language for r in renditions if r.language and r.language != "en"})
+            translated = translate_Subtitles.translate_all(srt_file, languages) if languages else {}
+            outputs = video_compiler.build_renditions(processed, [
+                {
+                    "name": r.name,
+                    "size": image_generator.frame_size(r.height),
+                    "max_bitrate": r.max_bitrate,
+                    "subtitles_path": translated.get(r.language, srt_file),
+                    "subtitle_mode": r.subtitles,
+                    "subtitle_language": translate_Subtitles.TRACK_LANGUAGES.get(r.language or "en", "und"),
+                }
+                for r in renditions
+            ], final_name=final_video_name)
+            return outputs[renditions[0].name], outputs, translated
+        if manifest is not None:
+            return video_compiler.build_video_from_segments(
+                processed, subtitles_path=srt_file, final_name=final_video_name, encode=encode
+            ), None, {}
+        # Progressive jobs already encoded every per-slide segment;
+        # cluster jobs encode them on the workers
+        return video_compiler.build_video(
+            processed, subtitles_path=srt_file, final_name=final_video_name,
+            mode="segments" if publisher is not None or encode is not None else None, encode=encode,
+        ), None, {}
+
+    with timer.track("video", slides=len(processed), renditions=len(renditions) or 1) as span:
+        if manifest is not None and not renditions:
+            reused = sum(1 for entry in processed if entry["reuse_segment"])
+            span.set(cache_hits=reused, cache_misses=len(processed) - reused)
+        video_path, outputs, translated = await asyncio.to_thread(compile_video)
+        span.set(bytes=sum(os.path.getsize(path) for path in (outputs.values() if outputs else [video_path])))
+    progress("video", 1, 1)
+
+    # 6. HLS PACKAGING (stream copy, no re-encode)
+    master_playlist = None
+    if request.hls:
+        with timer.track("hls", variants=len(renditions) or 1) as span:
+            if renditions:
+                variants = [
+                    {"name": r.name, "path": outputs[r.name], "size": image_generator.frame_size(r.height)}
+                    for r in renditions
+                ]
+            else:
+                variants = [{"name": f"{image_generator.HEIGHT}p", "path": video_path,
+                             "size": image_generator.frame_size(image_generator.HEIGHT)}]
+            slots = video_compiler.slide_slots(video_compiler.usable_slides(processed))
+            master_playlist = hls.package(job_id, variants, slots, subtitles={"en": srt_file, **translated})
+            span.set(bytes=sum(
+                entry.stat().st_size for entry in Path(master_playlist).parent.rglob("*") if entry.is_file()
+            ))
+        print(f"[{job_id}] HLS published: /hls/{job_id}/master.m3u8")
+
+    if manifest is not None:
+        manifest.slides = {}
+        for job, entry, tts in zip(jobs, processed, tts_results):
+            manifest.record(
+                job.key, job.fingerprint,
+                audio=entry["audio"], image=entry["image"], segment=entry["segment"],
+                tts={"duration": tts.duration, "words": tts.words, "text": tts.text, "slot": entry["duration"]},
+            )
+        manifest.save()
+
+    report_path = timer.save_report(
+        os.path.splitext(video_path)[0] + ".timings.json", job_id=job_id, slides=len(jobs)
+    )
+
     print(f"[{job_id}] Video Complete: {final_video_name}")
+    print(f"[{job_id}] Stage timings: {timer.summary()}")
+    print(f"[{job_id}] TTS cache: {audio_generator.cache_stats()}")
+    result = {"video": video_path, "subtitles": srt_file, "report": report_path, "timings": timer.report()}
+    if outputs is not None:
+        result["renditions"] = outputs
+    if master_playlist is not None:
+        result["hls"] = master_playlist
+    if live_playlist is not None:
+        result["live"] = live_playlist
+    return result
 
 # ---------------------------
 # API ENDPOINT
 # ---------------------------
 
-@app.post("/generate-video")
-async def start_pipeline(request: VideoRequest, background_tasks: BackgroundTasks):
+@app.post("/generate-video", status_code=202)
+async def start_pipeline(request: VideoRequest):
     job_id = str(uuid.uuid4())[:8]
-    background_tasks.add_task(run_video_pipeline, request, job_id)
+    payload = request.model_dump() if hasattr(request, "model_dump") else request.dict()
+    try:
+        JOBS.submit(job_id, payload)
+    except job_queue.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many jobs queued, retry later.")
+    except job_queue.NoWorkers:
+        raise HTTPException(status_code=503, detail="No job worker is running, retry later.")
     return {
-        "status": "Processing",
+        "status": "queued",
         "job_id": job_id,
-        "message": "Video generation has started. Check logs for progress."
+        "message": f"Video generation has been queued. Poll /jobs/{job_id} for progress."
     }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus scrape endpoint, including work done by the job workers."""
+    return PlainTextResponse(metrics.collect(), media_type="text/plain; version=0.0.4")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    state = JOBS.store.get(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return state
+
+def _job_result_file(job_id: str, kind: str) -> str:
+    state = JOBS.store.get(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if state["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {state['status']}")
+    path = (state.get("result") or {}).get(kind)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"No {kind} for this job")
+    return path
+
+def _sse(event: str, data, event_id=None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-sent events for one job: "status" and "progress" whenever
+    they change, one "segment" per piece appended to the live playlist
+    of a progressive job (id = its position, so a reconnect with
+    Last-Event-ID resumes after it), then "done" or "failed".
+    """
+    if JOBS.store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    try:
+        sent = int(request.headers.get("last-event-id", "-1")) + 1
+    except ValueError:
+        sent = 0
+    live_dir = os.path.join(hls.HLS_DIR, job_id, hls.LIVE_NAME)
+
+    async def events():
+        nonlocal sent
+        status = stages = None
+        quiet = 0.0
+        while True:
+            # State first: once it says done, the playlist read next is final
+            state = JOBS.store.get(job_id) or {}
+            out = []
+            try:
+                segments, _ = hls.read_playlist(os.path.join(live_dir, "index.m3u8"))
+            except FileNotFoundError:
+                segments = []
+            start = sum(duration for _, duration in segments[:sent])
+            for name, duration in segments[sent:]:
+                out.append(_sse("segment", {
+                    "uri": f"/hls/{job_id}/{hls.LIVE_NAME}/{name}",
+                    "start": round(start, 3), "duration": round(duration, 3),
+                }, sent))
+                start += duration
+                sent += 1
+            if state.get("status") != status:
+                status = state.get("status")
+                out.append(_sse("status", {"status": status}))
+            if state.get("stages") != stages:
+                stages = state.get("stages")
+                out.append(_sse("progress", stages))
+            if status in ("done", "failed"):
+                out.append(_sse(status, {"result": state.get("result"), "error": state.get("error")}))
+            for chunk in out:
+                yield chunk
+            if status in ("done", "failed"):
+                return
+
+            quiet = 0.0 if out else quiet + EVENTS_POLL_INTERVAL
+            if quiet >= EVENTS_KEEPALIVE:
+                quiet = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/video")
+async def download_video(job_id: str, rendition: Optional[str] = None):
+    path = _job_result_file(job_id, "video")
+    if rendition is not None:
+        path = (JOBS.store.get(job_id)["result"].get("renditions") or {}).get(rendition)
+        if not path or not os.path.exists(path):
+            raise HTTPException(status_code=404, detail=f"No rendition '{rendition}' for this job")
+    return FileResponse(path, media_type="video/mp4", filename=os.path.basename(path))
+
+@app.get("/jobs/{job_id}/subtitles")
+async def download_subtitles(job_id: str):
+    path = _job_result_file(job_id, "subtitles")
+    return FileResponse(path, media_type="application/x-subrip", filename=os.path.basename(path))
@@ -1,66 +1,271 @@
-import re
+import argparse
+import datetime
 import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import ValidationError
+from models import Slide, parse_duration
 
 INPUT_MD = "content/vector_spaces.md"
 OUTPUT_JSON = "scripts/slides.json"
 
-slides = []
-current_slide = None
+# Files parsed at once by iter_directory
+MARKDOWN_WORKERS = int(os.getenv("MARKDOWN_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+SLIDE_RE = re.compile(r"#\s+Slide\s+(\d+)\s*[:.-]?\s*(.*)", re.IGNORECASE)
+CHAPTER_RE = re.compile(r"#\s+(.+)")
+HEADING_RE = re.compile(r"#{2,}\s+(.+)")
+DURATION_RE = re.compile(r"\*\*Duration:\*\*\s*([\d.]+)\s*(min|m|sec|s)?", re.IGNORECASE)
+IMAGE_RE = re.compile(r"!\[.*?\]\((.*?)\)")
+BULLET_RE = re.compile(r"(?:[-*+]|\d+[.)])\s+(.*)")
+
+class MarkdownError(ValueError):
+    """A slide that does not validate, with the place it starts at."""
+
+# ---------------------------
+# STREAMING PARSER
+# ---------------------------
+
+def _duration(value: str, unit) -> str:
+    seconds = float(value) if unit and unit.lower().startswith("s") else float(value) * 60
+    return f"{round(seconds)} sec"
+
+def _next_id(declared: int, last: int) -> int:
+    """
+    Keep the declared number while numbering increases; chapters that
+    restart at "Slide 1" continue after the last id instead.
+    """
+    return declared if declared > last else last + 1
+
+def iter_slides(source, first_id: int = 1, name: str = None):
+    """
+    Yield validated Slide objects from a markdown file path, an open
+    text stream or any iterable of lines, in one pass.
+
+    Format (one slide per "# Slide N" heading):
+        # Chapter title          -> subtitle of the following slides
+        # Slide 3                -> slide_id (kept unique and increasing)
+        ## Title                 -> title (later sub-headings are text)
+        **Duration:** 1.5 min
+        ![alt](images/plot.png)  -> image (first one)
+        - bullet / 1. step       -> bullets
+        $$ ... $$ or a line with a LaTeX backslash -> math
+        ```lang ... ```          -> code_block
+        other text               -> description
+    Raises MarkdownError for a slide that does not validate.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="utf-8") as f:
+            yield from iter_slides(f, first_id, name or str(source))
+        return
+    name = name or getattr(source, "name", "<stream>")
+
+    last_id = first_id - 1
+    chapter = None
+    current = None
+    fence = None  # lines of an open ``` block
+    math_block = None  # lines of an open $$ block
+
+    def build(slide):
+        nonlocal last_id
+        last_id = _next_id(slide["declared"], last_id)
+        fields = dict(
+            slide_id=last_id,
+            title=slide["title"] or f"Slide {last_id}",
+            duration=slide["duration"],
+            subtitle=slide["chapter"],
+            image=slide["images"][0] if slide["images"] else None,
+            description=slide["text"] or None,
+            code_block="\n".join(slide["code"]) if slide["code"] else None,
+            math=slide["math"] or None,
+            bullets=slide["bullets"] or None,
+        )
+        try:
+            return Slide(**fields)
+        except ValidationError as e:
+            raise MarkdownError(f"{name}:{slide['line']}: invalid slide: {e}") from e
+
+    for number, raw in enumerate(source, 1):
+        line = raw.strip()
+
+        if fence is not None:
+            if line.startswith("```"):
+                if current is not None:
+                    current["code"] += fence
+                fence = None
+            else:
+                fence.append(raw.rstrip("\n"))
+            continue
+        if math_block is not None:
+            if line.endswith("$$"):
+                math_block.append(line[:-2].strip())
+                if current is not None:
+                    current["math"].append(" ".join(part for part in math_block if part))
+                math_block = None
+            else:
+                math_block.append(line)
+            continue
+
+        slide_match = SLIDE_RE.match(line)
+        if slide_match:
+            if current is not None:
+                yield build(current)
+            current = {
+                "declared": int(slide_match.group(1)), "line": number, "chapter": chapter,
+                "title": slide_match.group(2).strip(), "duration": "60 sec",
+                "text": [], "bullets": [], "math": [], "images": [], "code": [],
+            }
+            continue
+
+        if line.startswith("# "):
+            # Any other top-level heading starts a chapter
+            chapter = CHAPTER_RE.match(line).group(1).strip()
+            continue
+
+        if current is None or not line or line.startswith("---"):
+            continue
 
-with open(INPUT_MD, "r", encoding="utf-8") as f:
-    lines = f.readlines()
+        if line.startswith("```"):
+            fence = []
+            continue
+        if line.startswith("$$"):
+            rest = line[2:].strip()
+            if rest.endswith("$$"):
+                current["math"].append(rest[:-2].strip())
+            else:
+                math_block = [rest]
+            continue
 
-for line in lines:
-    line = line.strip()
+        heading_match = HEADING_RE.match(line)
+        if heading_match:
+            # The first sub-heading is the title, later ones are body text
+            if current["title"]:
+                current["text"].append(heading_match.group(1).strip())
+            else:
+                current["title"] = heading_match.group(1).strip()
+            continue
 
-    # Detect new slide
-    slide_match = re.match(r"# Slide (\d+)", line)
-    if slide_match:
-        if current_slide:
-            slides.append(current_slide)
+        duration_match = DURATION_RE.search(line)
+        if duration_match:
+            current["duration"] = _duration(*duration_match.groups())
+            continue
 
-        current_slide = {
-            "slide_number": int(slide_match.group(1)),
-            "title": "",
-            "content": [],
-            "math": [],
-            "images": [],
-            "duration_min": 1
+        image_match = IMAGE_RE.search(line)
+        if image_match:
+            current["images"].append(image_match.group(1))
+            continue
+
+        # Math (LaTeX line)
+        if "\\" in line:
+            current["math"].append(line)
+            continue
+
+        bullet_match = BULLET_RE.match(line)
+        if bullet_match:
+            current["bullets"].append(bullet_match.group(1))
+        else:
+            current["text"].append(line)
+
+    if current is not None:
+        yield build(current)
+
+def parse_file(path: str):
+    """All slides of one file (picklable, for the process pool)."""
+    return list(iter_slides(path))
+
+# ---------------------------
+# DIRECTORIES
+# ---------------------------
+
+def markdown_files(directory: str):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.lower().endswith((".md", ".markdown"))
+    )
+
+def iter_directory(directory: str, workers: int = None, first_id: int = 1):
+    """
+    Yield the slides of every markdown file under directory in file-name
+    order. Files are parsed in parallel worker processes; ids stay unique
+    and increasing across files.
+    """
+    files = markdown_files(directory)
+    workers = max(1, min(workers or MARKDOWN_WORKERS, len(files)))
+    last_id = first_id - 1
+
+    def renumber(slides):
+        nonlocal last_id
+        for slide in slides:
+            slide_id = _next_id(slide.slide_id, last_id)
+            if slide_id != slide.slide_id:
+                slide = slide.model_copy(update={"slide_id": slide_id})
+            last_id = slide_id
+            yield slide
+
+    if workers == 1:
+        for path in files:
+            yield from renumber(iter_slides(path))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() keeps file order while later files are parsed ahead
+        for slides in pool.map(parse_file, files):
+            yield from renumber(slides)
+
+def iter_sources(sources, workers: int = None):
+    """Slides of several files and/or directories, ids unique across all."""
+    last_id = 0
+    for source in sources:
+        slides = iter_directory(source, workers, last_id + 1) if os.path.isdir(source) else iter_slides(source, last_id + 1)
+        for slide in slides:
+            last_id = slide.slide_id
+            yield slide
+
+# ---------------------------
+# CLI
+# ---------------------------
+
+def write_request(slides, output_path: str, title: str, author: str) -> int:
+    """
+    Stream slides into a /generate-video request body (VideoRequest
+    shape); metadata is written last, once the total duration is known.
+    Returns the number of slides written.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    count = total = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write('{\n  "slides": [')
+        for slide in slides:
+            f.write(",\n    " if count else "\n    ")
+            f.write(json.dumps(slide.model_dump(exclude_none=True), ensure_ascii=False))
+            total += parse_duration(slide.duration)
+            count += 1
+        metadata = {
+            "title": title,
+            "author": author,
+            "date": datetime.date.today().isoformat(),
+            "total_duration": f"{total} sec",
         }
-        continue
-
-    # Slide title
-    if line.startswith("## ") and current_slide:
-        current_slide["title"] = line.replace("## ", "")
-        continue
-
-    # Duration
-    duration_match = re.search(r"\*\*Duration:\*\* ([\d\.]+) min", line)
-    if duration_match and current_slide:
-        current_slide["duration_min"] = float(duration_match.group(1))
-        continue
-
-    # Images
-    image_match = re.search(r"!\[.*?\]\((.*?)\)", line)
-    if image_match and current_slide:
-        current_slide["images"].append(image_match.group(1))
-        continue
-
-    # Math (LaTeX block or inline)
-    if "\\" in line and current_slide:
-        current_slide["math"].append(line)
-        continue
-
-    # Bullet points or text
-    if current_slide and line and not line.startswith("---"):
-        current_slide["content"].append(line)
-
-# Append last slide
-if current_slide:
-    slides.append(current_slide)
-
-# Save JSON
-with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-    json.dump(slides, f, indent=4, ensure_ascii=False)
-
-print("Markdown successfully converted to slides.json")
+        f.write("\n  ],\n  \"project_metadata\": ")
+        f.write(json.dumps(metadata, ensure_ascii=False))
+        f.write("\n}\n")
+    return count
+
+def run():
+    parser = argparse.ArgumentParser(description="Convert markdown slides into a /generate-video request.")
+    parser.add_argument("sources", nargs="*", default=[INPUT_MD], help="markdown files or directories")
+    parser.add_argument("-o", "--output", default=OUTPUT_JSON)
+    parser.add_argument("--title", default=None, help="default: name of the first source")
+    parser.add_argument("--author", default="Unknown")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    title = args.title or os.path.splitext(os.path.basename(os.path.normpath(args.sources[0])))[0]
+    count = write_request(iter_sources(args.sources, args.workers), args.output, title, args.author)
+    print(f"Markdown successfully converted to {args.output} ({count} slides)")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Each process (API, job workers, CLI tools) drops its counters here so
+# the API's /metrics can report work done in other processes.
+METRICS_DIR = os.path.join("output", "metrics")
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+HELP = {
+    "video_stage_duration_seconds": ("histogram", "Duration of one pipeline stage call."),
+    "video_stage_total": ("counter", "Pipeline stage calls by outcome."),
+    "video_stage_bytes_total": ("counter", "Bytes produced by pipeline stages."),
+    "video_stage_retries_total": ("counter", "Retries inside pipeline stages."),
+    "video_stage_cache_total": ("counter", "Cache lookups inside pipeline stages."),
+    "video_jobs_total": ("counter", "Finished video jobs by status."),
+    "video_job_duration_seconds": ("histogram", "End-to-end duration of video jobs."),
+}
+
+_PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# ---------------------------
+# REGISTRY
+# ---------------------------
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Registry:
+    """Thread-safe counters and histograms for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> {"buckets": [...], "sum", "count"}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self.histograms.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "histograms": [
+                    [name, dict(labels), {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}]
+                    for (name, labels), h in self.histograms.items()
+                ],
+            }
+
+    def merge(self, snapshot: dict):
+        for name, labels, value in snapshot.get("counters", []):
+            self.inc(name, value, **labels)
+        for name, labels, hist in snapshot.get("histograms", []):
+            key = _key(name, labels)
+            with self._lock:
+                mine = self.histograms.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+                mine["buckets"] = [a + b for a, b in zip(mine["buckets"], hist["buckets"])]
+                mine["sum"] += hist["sum"]
+                mine["count"] += hist["count"]
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        def fmt(labels, **extra):
+            pairs = list(labels) + list(extra.items())
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self.counters} | {name for name, _ in self.histograms})
+            for name in names:
+                is_counter = any(n == name for n, _ in self.counters)
+                kind, text = HELP.get(name, ("counter" if is_counter else "histogram", name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{fmt(labels)} {value:g}")
+                for (n, labels), hist in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(BUCKETS, hist["buckets"]):
+                        lines.append(f"{name}_bucket{fmt(labels, le=f'{bound:g}')} {count}")
+                    lines.append(f"{name}_bucket{fmt(labels, le='+Inf')} {hist['count']}")
+                    lines.append(f"{name}_sum{fmt(labels)} {hist['sum']:.6f}")
+                    lines.append(f"{name}_count{fmt(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# ---------------------------
+# SPANS
+# ---------------------------
+
+class Span:
+    """
+    One timed stage call. Attributes can be added while it runs:
+    bytes, retries, cache_hits, cache_misses feed the metrics, anything
+    else (slide, language, ...) only goes into the job report.
+    """
+
+    def __init__(self, stage: str, **attrs):
+        self.stage = stage
+        self.attrs = attrs
+        self.status = "ok"
+        self.started_at = time.time()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "status": self.status,
+            "started_at": round(self.started_at, 3),
+            "duration_sec": round(self.duration or 0.0, 4),
+            **self.attrs,
+        }
+
+def record_span(span: Span):
+    stage = span.stage
+    REGISTRY.observe("video_stage_duration_seconds", span.duration, stage=stage)
+    REGISTRY.inc("video_stage_total", stage=stage, status=span.status)
+    if span.attrs.get("bytes"):
+        REGISTRY.inc("video_stage_bytes_total", span.attrs["bytes"], stage=stage)
+    if span.attrs.get("retries"):
+        REGISTRY.inc("video_stage_retries_total", span.attrs["retries"], stage=stage)
+    if span.attrs.get("cache_hits"):
+        REGISTRY.inc("video_stage_cache_total", span.attrs["cache_hits"], stage=stage, result="hit")
+    if span.attrs.get("cache_misses"):
+        REGISTRY.inc("video_stage_cache_total", span.attrs["cache_misses"], stage=stage, result="miss")
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time a block as one call of `stage` and record it in REGISTRY."""
+    current = Span(stage, **attrs)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        record_span(current)
+
+# ---------------------------
+# CROSS-PROCESS SNAPSHOTS
+# ---------------------------
+
+def save_process_snapshot(metrics_dir: str = METRICS_DIR):
+    """Write this process's counters for the API process to merge."""
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f"{_PROCESS_ID}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(REGISTRY.snapshot(), f)
+    os.replace(tmp, path)
+
+def reset_snapshots(metrics_dir: str = METRICS_DIR):
+    """Forget snapshots of earlier server runs (counters restart from zero)."""
+    if not os.path.isdir(metrics_dir):
+        return
+    for name in os.listdir(metrics_dir):
+        if name.endswith(".json") and not name.startswith(_PROCESS_ID):
+            try:
+                os.remove(os.path.join(metrics_dir, name))
+            except FileNotFoundError:
+                pass
+
+def collect(metrics_dir: str = METRICS_DIR) -> str:
+    """This process's metrics merged with every other process's snapshot."""
+    merged = Registry()
+    merged.merge(REGISTRY.snapshot())
+    if os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if not name.endswith(".json") or name.startswith(_PROCESS_ID):
+                continue
+            try:
+                with open(os.path.join(metrics_dir, name), "r", encoding="utf-8") as f:
+                    merged.merge(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return merged.render()
@@ -0,0 +1,76 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional, Union
+import re
+
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hour|min|m|sec|s)?", re.IGNORECASE)
+# Slides without a readable duration get this many seconds
+DEFAULT_DURATION = 30
+
+def parse_duration(value) -> int:
+    """Seconds in a slide duration: 90, "90 sec", "1.5 min" or "4 min"."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = DURATION_RE.search(str(value or ""))
+    if not match:
+        return DEFAULT_DURATION
+    unit = (match.group(2) or "s").lower()
+    scale = 3600 if unit.startswith("h") else 60 if unit.startswith("m") else 1
+    return round(float(match.group(1)) * scale)
+
+# ---------------------------
+# DATA MODELS
+# ---------------------------
+
+class ProjectMetadata(BaseModel):
+    title: str
+    author: str
+    date: str
+    total_duration: str
+
+class Slide(BaseModel):
+    slide_id: int
+    title: str
+    duration: str  # e.g., "1 min"
+    subtitle: Optional[str] = None
+    image: Optional[str] = None
+    description: Optional[Union[str, List[str]]] = None
+    code_block: Optional[str] = None
+    math: Optional[List[str]] = None
+    bullets: Optional[List[str]] = None
+    steps: Optional[List[str]] = None
+    concepts: Optional[List[str]] = None
+
+class Rendition(BaseModel):
+    # e.g. "720p", "480p-hi"; used as-is in file names, HLS paths and playlists
+    name: str = Field(pattern=r"^[A-Za-z0-9_-]{1,32}$")
+    height: int = Field(720, ge=144, le=2160, multiple_of=2)  # 16:9, width follows
+    # e.g. "1500k" or "2M", caps the video bitrate (video_compiler.bitrate_params)
+    max_bitrate: Optional[str] = Field(None, pattern=r"^\s*\d+(\.\d+)?[kKmM]?\s*$")
+    subtitles: Literal["burn", "soft", "none"] = "burn"
+    language: Optional[str] = None  # translate the subtitles, e.g. "hi"
+
+    @field_validator("language")
+    @classmethod
+    def known_language(cls, language):
+        # Imported here: translate_Subtitles pulls in the rendering stack
+        from translate_Subtitles import languages
+        if language is None or language == "en" or language in languages:
+            return language
+        raise ValueError(f"unsupported subtitle language {language!r}; use \"en\" or one of {', '.join(languages)}")
+
+class VideoRequest(BaseModel):
+    project_metadata: ProjectMetadata
+    slides: List[Slide]
+    project_id: Optional[str] = None  # groups incremental builds, defaults to the title
+    # Several outputs from one pass of TTS and rendering; None = one 720p video
+    renditions: Optional[List[Rendition]] = None
+    hls: bool = False  # also publish an HLS presentation under /hls/<job_id>/
+    progressive: bool = False  # publish slides to /hls/<job_id>/live/ while the job runs
+
+    @field_validator("renditions")
+    @classmethod
+    def unique_rendition_names(cls, renditions):
+        names = [r.name for r in renditions or []]
+        if len(set(names)) != len(names):
+            raise ValueError("rendition names must be unique")
+        return renditions
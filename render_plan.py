@@ -0,0 +1,141 @@
+import json
+import os
+from typing import NamedTuple, Optional
+from audio_generator import clean_text
+from content_cache import content_key, file_digest
+from models import Slide, parse_duration
+import image_generator
+
+NARRATION_PATH = "narration.json"
+BACKGROUND_VIDEO = "assets/backgrounds/blue_gradient.mp4"
+
+# ---------------------------
+# SLIDE TASKS
+# ---------------------------
+
+class SlideTask(NamedTuple):
+    """
+    One slide of a compiled render plan. Immutable and without a
+    per-instance dict (NamedTuple: __slots__ = ()); everything the TTS,
+    render, subtitle, segment and manifest stages need is resolved once.
+    """
+    index: int               # position in the deck (intro = 0)
+    key: str                 # "intro" / "slide_<id>": manifest and report key
+    narration: str           # cleaned text for TTS
+    target_duration: Optional[int]  # seconds, None = natural pace
+    audio_file: str
+    render: tuple            # create_styled_slide kwargs as (name, value) pairs
+    render_key: str          # image_generator.render_key of render
+    height: int              # frame height the slide is rendered at
+    background: Optional[str]
+    fingerprint: str         # hash of everything that affects audio, image and segment
+    # Artifacts kept from the previous build (incremental builds)
+    tts: object = None       # audio_generator.TTSResult
+    image_path: Optional[str] = None
+    segment: Optional[str] = None
+    reuse_segment: bool = False
+
+    @property
+    def render_spec(self) -> dict:
+        return dict(self.render)
+
+    def slot(self, speech: float) -> float:
+        """Seconds the slide lasts: its speech, then silence up to target_duration."""
+        return max(speech, self.target_duration or 0)
+
+# ---------------------------
+# NARRATION AND TEXT
+# ---------------------------
+
+def load_narration(path: str = NARRATION_PATH) -> dict:
+    """{slide_id: voice text} from narration.json ({"slide_<id>": {"voice_text"}}); {} without one."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    narration = {}
+    for key, value in data.items():
+        try:
+            text = value.get("voice_text", "").strip()
+            slide_id = int(key.replace("slide_", ""))
+        except (AttributeError, ValueError):
+            continue
+        if text:
+            narration[slide_id] = text
+    return narration
+
+def narration_text(slide: Slide) -> str:
+    """Spoken text of a slide without a narration.json entry."""
+    parts = [slide.title]
+    if slide.subtitle:
+        parts.append(slide.subtitle)
+    source = slide.description or slide.bullets or slide.steps or ""
+    parts.extend(source if isinstance(source, list) else [source])
+    return ". ".join(parts).replace("**", "")
+
+def display_body(slide: Slide):
+    """Body shown on the slide: bullets, steps, concepts or description."""
+    return slide.bullets or slide.steps or slide.concepts or slide.description or ""
+
+# ---------------------------
+# PLAN
+# ---------------------------
+
+def _fingerprint(fields: dict, narration: str, theme: str, image_digest: str) -> str:
+    # Same inputs (raw narration, slide fields) as earlier builds, so
+    # existing project manifests stay valid
+    return content_key(json.dumps(fields, sort_keys=True, default=str), narration, theme, image_digest)
+
+def _task(index, key, narration, target, audio_file, render, height, background, fingerprint):
+    if height != image_generator.HEIGHT:
+        render["height"] = height
+    return SlideTask(
+        index=index, key=key, narration=clean_text(narration), target_duration=target,
+        audio_file=audio_file, render=tuple(render.items()), render_key=image_generator.render_key(render),
+        height=height, background=background, fingerprint=fingerprint,
+    )
+
+def iter_plan(request, job_id: str, narration=None, slides=None, height: int = image_generator.HEIGHT, digest=None):
+    """
+    Yield the SlideTasks of a request: the intro, then every slide.
+    slides (any iterable, e.g. markdown.iter_slides) replaces
+    request.slides and is consumed lazily. narration: {slide_id: text}
+    (default: load_narration()). height: frame height to render at.
+    digest(path) hashes embedded images (BuildManifest.file_digest
+    reuses digests of unchanged files).
+    """
+    narration = load_narration() if narration is None else narration
+    digest = digest or file_digest
+    meta = request.project_metadata
+    background = BACKGROUND_VIDEO if os.path.exists(BACKGROUND_VIDEO) else None
+
+    intro = f"Welcome to this presentation on {meta.title}. Presented by {meta.author}."
+    yield _task(
+        0, "intro", intro, None, f"temp/{job_id}_intro.mp3",
+        dict(body_text=f"By {meta.author}", title_text=meta.title, output_name=f"temp/{job_id}_intro.png", theme="intro"),
+        height, None, _fingerprint({"title": meta.title, "author": meta.author}, intro, "intro", digest(None)),
+    )
+
+    for index, slide in enumerate(request.slides if slides is None else slides, 1):
+        # narration.json first, then the slide's own text
+        spoken = (narration.get(slide.slide_id) or narration_text(slide)).strip() or " "
+        image = slide.image if slide.image and os.path.exists(slide.image) else None
+        render = dict(
+            body_text=display_body(slide),
+            title_text=slide.title,
+            code_block=slide.code_block,
+            math=slide.math or [],
+            images=[image] if image else [],
+            output_name=f"temp/{job_id}_slide_{slide.slide_id}.png",
+            theme="content",
+        )
+        yield _task(
+            index, f"slide_{slide.slide_id}", spoken, parse_duration(slide.duration),
+            f"temp/{job_id}_slide_{slide.slide_id}.mp3", render, height, background,
+            _fingerprint(slide.model_dump(), spoken, "content", digest(image)),
+        )
+
+def build_plan(request, job_id: str, **kwargs) -> tuple:
+    """The whole plan at once (see iter_plan)."""
+    return tuple(iter_plan(request, job_id, **kwargs))
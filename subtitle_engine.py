@@ -0,0 +1,408 @@
+from PIL import Image, ImageDraw, ImageFont, features
+from bisect import bisect_right
+from collections import Counter
+from moviepy.config import get_setting
+import numpy as np
+import image_generator
+import subprocess
+import unicodedata
+import re
+import os
+
+# Same look as the old ImageMagick captions: white 36px text with a
+# 1px black outline, wrapped to 1100px and placed 600px from the top.
+STYLE = {
+    "font_size": 36,
+    "box_width": 1100,
+    "top": 600,
+    "line_spacing": 6,
+    "fill": (255, 255, 255, 255),
+    "stroke": (0, 0, 0, 255),
+    "stroke_width": 1,
+}
+
+def scaled_style(scale: float) -> dict:
+    """STYLE for a frame height other than 720 (sizes and positions scaled)."""
+    if scale == 1:
+        return dict(STYLE)
+    sized = ("font_size", "box_width", "top", "line_spacing", "stroke_width")
+    return {key: max(1, round(value * scale)) if key in sized else value for key, value in STYLE.items()}
+
+# ---------------------------
+# SRT PARSING
+# ---------------------------
+
+_TIME_RE = re.compile(r"(\d+):(\d+):(\d+)[,.](\d+)")
+
+def _srt_seconds(ts: str) -> float:
+    h, m, s, ms = _TIME_RE.match(ts.strip()).groups()
+    return int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
+
+def parse_srt(path: str):
+    """
+    Parse an .srt file once into [((start, end), text)], sorted by start.
+    Same shape as moviepy's file_to_subtitles, but UTF-8 safe.
+    """
+    with open(path, "r", encoding="utf-8-sig") as f:
+        blocks = re.split(r"\n\s*\n", f.read().replace("\r\n", "\n"))
+
+    cues = []
+    for block in blocks:
+        lines = [line for line in block.strip().split("\n") if line.strip()]
+        for i, line in enumerate(lines):
+            if "-->" in line:
+                start, end = line.split("-->")
+                text = "\n".join(lines[i + 1:]).strip()
+                if text:
+                    cues.append(((_srt_seconds(start), _srt_seconds(end)), text))
+                break
+    cues.sort(key=lambda cue: cue[0][0])
+    return cues
+
+# ---------------------------
+# CUE BUILDING
+# ---------------------------
+
+# Readable cues: at most two lines of ~42 characters on screen for up to 7s
+MAX_LINE_CHARS = 42
+MAX_CUE_CHARS = 2 * MAX_LINE_CHARS
+MAX_CUE_SECONDS = 7.0
+
+def srt_timestamp(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02}:{ms // 60000 % 60:02}:{ms // 1000 % 60:02},{ms % 1000:03}"
+
+def two_lines(text: str) -> str:
+    """Break a cue into two balanced lines when it is too long for one."""
+    if len(text) <= MAX_LINE_CHARS:
+        return text
+    middle = len(text) // 2
+    left, right = text.rfind(" ", 0, middle + 1), text.find(" ", middle)
+    candidates = [i for i in (left, right) if i > 0]
+    if not candidates:
+        return text
+    split = min(candidates, key=lambda i: abs(i - middle))
+    return text[:split].rstrip() + "\n" + text[split:].lstrip()
+
+def _align_words(text: str, words):
+    """Character span of each word boundary inside text, or None if they don't line up."""
+    spans = []
+    pos = 0
+    for start, end, word in words:
+        idx = text.find(word, pos)
+        if idx < 0:
+            return None
+        spans.append((start, end, idx, idx + len(word)))
+        pos = idx + len(word)
+    return spans
+
+def _chunks(text: str):
+    """Split text at sentence ends, then at word gaps, into cue-sized pieces."""
+    pieces = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        current = ""
+        for word in sentence.split():
+            trial = f"{current} {word}".strip()
+            if current and len(trial) > MAX_CUE_CHARS:
+                pieces.append(current)
+                current = word
+            else:
+                current = trial
+        if current:
+            pieces.append(current)
+    return pieces
+
+def split_cues(text: str, duration: float, words=None):
+    """
+    Split one slide's narration into readable cues [(start, end, text)]
+    relative to the start of the slide. Word boundaries from the TTS
+    give exact timing; without them time is shared out by length.
+    """
+    text = " ".join(text.split())
+    if not text or duration <= 0:
+        return []
+
+    spans = _align_words(text, words) if words else None
+    if spans:
+        cues = []
+        first = 0
+        for i in range(1, len(spans) + 1):
+            last = i == len(spans)
+            if not last:
+                cue_chars = spans[i][3] - spans[first][2]
+                cue_secs = spans[i][1] - spans[first][0]
+                # The previous word and the gap after it: TTS words often carry
+                # their punctuation ("1."), and it may sit inside closing quotes
+                before = text[spans[i - 1][2]:spans[i][2]].strip().rstrip("\"')]\u201d\u2019")
+                sentence_end = before[-1:] in (".", "!", "?")
+                if cue_chars <= MAX_CUE_CHARS and cue_secs <= MAX_CUE_SECONDS and not sentence_end:
+                    continue
+            char_end = len(text) if last else spans[i][2]
+            start = 0.0 if not cues else spans[first][0]
+            end = duration if last else spans[i][0]
+            cues.append((start, end, text[spans[first][2]:char_end].strip()))
+            first = i
+        return cues
+
+    pieces = _chunks(text)
+    total = sum(len(p) for p in pieces)
+    cues = []
+    t = 0.0
+    for piece in pieces:
+        span = duration * len(piece) / total
+        cues.append((t, min(t + span, duration), piece))
+        t += span
+    return cues
+
+class SrtWriter:
+    """
+    Writes an .srt incrementally while audio is still being produced.
+
+    add() may be called in any order (slides finish out of order when
+    TTS runs concurrently); cues are flushed to disk as soon as every
+    earlier slide has arrived, so the file is complete the moment the
+    last slide's audio is.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        self._pending = {}
+        self._next = 0
+        self._offset = 0.0
+        self._counter = 1
+        self.offsets = []  # start time of each slide, in slide order
+        self.bytes_written = 0
+
+    def add(self, index: int, text: str, duration: float, words=None, slot=None):
+        """
+        Cues of one slide, timed over its duration of speech; the next
+        slide starts slot seconds later (default: duration).
+        """
+        self._pending[index] = (text, duration, words, slot or duration)
+        while self._next in self._pending:
+            text, duration, words, slot = self._pending.pop(self._next)
+            self.offsets.append(self._offset)
+            for start, end, cue in split_cues(text, duration, words):
+                block = (
+                    f"{self._counter}\n"
+                    f"{srt_timestamp(self._offset + start)} --> {srt_timestamp(self._offset + end)}\n"
+                    f"{two_lines(cue)}\n\n"
+                )
+                self._file.write(block)
+                self.bytes_written += len(block.encode("utf-8"))
+                self._counter += 1
+            self._offset += slot
+            self._next += 1
+        self._file.flush()
+
+    @property
+    def slides_written(self) -> int:
+        return self._next
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ---------------------------
+# RASTERIZED OVERLAYS
+# ---------------------------
+
+def _wrap(text: str, font, max_width: int):
+    lines = []
+    for paragraph in text.split("\n"):
+        current = ""
+        for word in paragraph.split():
+            trial = f"{current} {word}".strip()
+            if current and font.getlength(trial) > max_width:
+                lines.append(current)
+                current = word
+            else:
+                current = trial
+        if current:
+            lines.append(current)
+    return lines
+
+# ---------------------------
+# SUBTITLE FONTS
+# ---------------------------
+
+# Unicode script (first word of a letter's name) -> image_generator.FONT_NAMES
+# kind; scripts not listed (Latin, Greek, Cyrillic) use the regular font.
+SCRIPT_FONTS = {
+    "DEVANAGARI": "devanagari", "BENGALI": "bengali", "GURMUKHI": "gurmukhi", "GUJARATI": "gujarati",
+    "TAMIL": "tamil", "TELUGU": "telugu", "KANNADA": "kannada", "MALAYALAM": "malayalam",
+    "ARABIC": "arabic", "HEBREW": "hebrew", "THAI": "thai",
+    "CJK": "cjk", "HIRAGANA": "cjk", "KATAKANA": "cjk", "HANGUL": "cjk",
+}
+# Scripts whose glyphs change shape with their neighbours (conjuncts,
+# vowel signs, joining) and only render correctly with libraqm.
+SHAPED_SCRIPTS = {"devanagari", "bengali", "gurmukhi", "gujarati", "tamil", "telugu", "kannada",
+                  "malayalam", "arabic", "thai"}
+
+LAYOUT_ENGINE = ImageFont.Layout.RAQM if features.check("raqm") else ImageFont.Layout.BASIC
+
+class SubtitleFontError(RuntimeError):
+    """No installed font can draw the subtitle text."""
+
+def text_script(text):
+    """SCRIPT_FONTS key most letters of text are written in, or None."""
+    scripts = Counter(
+        unicodedata.name(ch, "").split(" ")[0] for ch in text if unicodedata.category(ch).startswith("L")
+    )
+    for script, _ in scripts.most_common():
+        if script in SCRIPT_FONTS:
+            return script
+    return None
+
+def _glyph(font, ch):
+    size = font.size * 2
+    img = Image.new("L", (size, size))
+    ImageDraw.Draw(img).text((0, 0), ch, font=font, fill=255)
+    return img.tobytes()
+
+def covers(font, text):
+    """True if font has a glyph for every letter in text (missing ones draw as .notdef)."""
+    missing = _glyph(font, "\U0010FFFD")
+    letters = {ch for ch in text if unicodedata.category(ch).startswith("L")}
+    return all(_glyph(font, ch) != missing for ch in letters)
+
+def subtitle_font(text, size):
+    """
+    Font for burning text: the font for its script (SCRIPT_FONTS, e.g.
+    FONT_DEVANAGARI), then the regular one, whichever covers every
+    letter. Raises SubtitleFontError when none does.
+    """
+    script = text_script(text)
+    kinds = [SCRIPT_FONTS[script], "regular"] if script else ["regular"]
+    for kind in kinds:
+        path = image_generator.find_font(kind)
+        if not path:
+            continue
+        font = ImageFont.truetype(path, size, layout_engine=LAYOUT_ENGINE)
+        if covers(font, text):
+            if kind in SHAPED_SCRIPTS and LAYOUT_ENGINE != ImageFont.Layout.RAQM:
+                print(f"[Warning] Pillow has no libraqm; {kind} subtitles are drawn without shaping")
+            return font
+    if script is None:
+        return image_generator.load_font("regular", size)
+    kind = SCRIPT_FONTS[script]
+    raise SubtitleFontError(
+        f"No installed font covers {kind} subtitles; install one of "
+        f"{', '.join(image_generator.FONT_NAMES[kind][:2])} or set FONT_{kind.upper()}"
+    )
+
+class SubtitleOverlay:
+    """
+    Burns cues into frames with Pillow.
+
+    Each cue is rasterized once into an RGBA sprite (cached), and during
+    its time window only the rows/columns the sprite covers are blended
+    into the frame. Frames outside every cue are returned untouched.
+    The font is picked for the cues' script (see subtitle_font), so a
+    SubtitleFontError is raised here rather than burning tofu.
+    """
+
+    def __init__(self, cues, frame_size=(1280, 720), style=None):
+        self.cues = sorted(cues, key=lambda cue: cue[0][0])
+        self.frame_size = frame_size
+        self.style = dict(scaled_style(frame_size[1] / 720), **(style or {}))
+        self._starts = [start for (start, _), _ in self.cues]
+        self._font = subtitle_font(" ".join(text for _, text in self.cues), self.style["font_size"])
+        self._sprites = {}
+
+    def cue_index(self, t: float):
+        idx = bisect_right(self._starts, t) - 1
+        if idx >= 0 and t < self.cues[idx][0][1]:
+            return idx
+        return None
+
+    def sprite(self, idx: int):
+        """(x, y, rgb premultiplied float32, alpha float32) for one cue."""
+        if idx in self._sprites:
+            return self._sprites[idx]
+
+        font = self._font
+        style = self.style
+        lines = _wrap(self.cues[idx][1], font, style["box_width"])
+        ascent, descent = font.getmetrics()
+        line_h = ascent + descent + style["line_spacing"]
+        pad = style["stroke_width"] + 1
+
+        img = Image.new("RGBA", (style["box_width"] + 2 * pad, line_h * len(lines) + 2 * pad), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        for n, line in enumerate(lines):
+            x = pad + (style["box_width"] - font.getlength(line)) / 2
+            draw.text(
+                (x, pad + n * line_h), line, font=font, fill=style["fill"],
+                stroke_width=style["stroke_width"], stroke_fill=style["stroke"],
+            )
+
+        bbox = img.getbbox()
+        if bbox is None:
+            self._sprites[idx] = None
+            return None
+        img = img.crop(bbox)
+
+        frame_w, frame_h = self.frame_size
+        x = max(0, (frame_w - style["box_width"]) // 2 - pad + bbox[0])
+        y = style["top"] + bbox[1] - pad
+        # Clip to the frame
+        w = min(img.width, frame_w - x)
+        h = min(img.height, frame_h - y)
+        if w <= 0 or h <= 0:
+            self._sprites[idx] = None
+            return None
+
+        rgba = np.asarray(img, dtype=np.float32)[:h, :w] / 255.0
+        alpha = rgba[..., 3:4]
+        self._sprites[idx] = (x, y, rgba[..., :3] * alpha * 255.0, alpha)
+        return self._sprites[idx]
+
+    def apply(self, frame, t: float):
+        idx = self.cue_index(t)
+        if idx is None:
+            return frame
+        sprite = self.sprite(idx)
+        if sprite is None:
+            return frame
+
+        x, y, rgb, alpha = sprite
+        h, w = alpha.shape[:2]
+        out = frame.copy()
+        region = out[y:y + h, x:x + w].astype(np.float32)
+        out[y:y + h, x:x + w] = (rgb + region * (1.0 - alpha)).astype(np.uint8)
+        return out
+
+    def burn(self, clip):
+        """Return clip with the cues burned in."""
+        return clip.fl(lambda gf, t: self.apply(gf(t), t))
+
+# ---------------------------
+# SOFT SUBTITLES
+# ---------------------------
+
+def mux_soft_subtitles(video_path: str, srt_path: str, language: str = "eng"):
+    """
+    Add the .srt as a mov_text track to an MP4 in place.
+    Video and audio are stream-copied, nothing is re-encoded.
+    """
+    tmp_path = video_path + ".subs.mp4"
+    cmd = [
+        get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+        "-i", video_path, "-i", srt_path,
+        "-map", "0", "-map", "1",
+        "-c", "copy", "-c:s", "mov_text",
+        "-metadata:s:s:0", f"language={language}",
+        "-movflags", "+faststart",
+        tmp_path,
+    ]
+    subprocess.run(cmd, check=True)
+    os.replace(tmp_path, video_path)
+    return video_path
@@ -0,0 +1,10 @@
+import subprocess
+import pytest
+from moviepy.config import get_setting
+
+@pytest.fixture
+def ffmpeg():
+    """Run the bundled ffmpeg with args; returns nothing, raises on failure."""
+    def run(*args):
+        subprocess.run([get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", *args], check=True)
+    return run
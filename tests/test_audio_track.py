@@ -0,0 +1,49 @@
+import pytest
+import audio_track
+
+SAMPLE_RATE = 24000
+FRAME_SAMPLES = 576  # MPEG-2 Layer III
+
+@pytest.fixture
+def tone(tmp_path, ffmpeg):
+    def make(seconds, name="tone.mp3", sample_rate=SAMPLE_RATE):
+        path = str(tmp_path / name)
+        ffmpeg("-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+               "-ar", str(sample_rate), "-ac", "1", "-b:a", "48k", path)
+        return path
+    return make
+
+def info(path):
+    with open(path, "rb") as f:
+        return audio_track.mp3_info(f.read())
+
+def test_silence_pads_each_slot(tmp_path, tone):
+    clip = tone(1)
+    out = str(tmp_path / "track.mp3")
+    slots = [2.0, 1.5, 1.25]
+    timings = audio_track.assemble_track([clip] * 3, out, slots)
+
+    track = info(out)
+    # Padding lands on the frame boundary nearest each slot end
+    assert track.frames == round(sum(slots) * SAMPLE_RATE / FRAME_SAMPLES)
+    assert track.samples == track.frames * FRAME_SAMPLES
+    half_frame = FRAME_SAMPLES / 2 / SAMPLE_RATE
+    ends = [2.0, 3.5, 4.75]
+    for timing, end in zip(timings, ends):
+        assert abs(timing.end - end) <= half_frame
+        assert timing.speech == info(clip).duration
+    assert timings[1].start == timings[0].end
+
+def test_without_slots_frames_are_copied(tmp_path, tone):
+    clip = tone(1)
+    out = str(tmp_path / "track.mp3")
+    timings = audio_track.assemble_track([clip, clip], out)
+    assert info(out).frames == 2 * info(clip).frames
+    assert timings[1].start == timings[0].end == info(clip).duration
+
+def test_other_format_is_transcoded(tmp_path, tone):
+    out = str(tmp_path / "track.mp3")
+    audio_track.assemble_track([tone(1), tone(1, "other.mp3", sample_rate=16000)], out, [1.5, 1.5])
+    track = info(out)
+    assert (track.sample_rate, track.channels) == (SAMPLE_RATE, 1)
+    assert track.frames == round(3.0 * SAMPLE_RATE / FRAME_SAMPLES)
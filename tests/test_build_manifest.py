@@ -0,0 +1,60 @@
+import os
+import pytest
+import build_manifest
+from content_cache import file_digest
+
+@pytest.fixture
+def projects(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_manifest, "PROJECTS_DIR", str(tmp_path / "projects"))
+    return tmp_path
+
+def test_project_key():
+    assert build_manifest.project_key("Python Automation: Project #1") == "python-automation-project-1"
+    assert build_manifest.project_key("Title", "My ID") == "my-id"
+    assert build_manifest.project_key("!!!") == build_manifest.project_key("") == "untitled"
+    assert len(build_manifest.project_key("x" * 200)) == 80
+
+def test_save_and_load_round_trip(projects):
+    manifest = build_manifest.BuildManifest.load("deck")
+    assert manifest.slides == {} and manifest.files == {}
+    assert os.path.isdir(projects / "projects" / "deck" / "segments")
+
+    manifest.record("slide_1", "fp", audio="a.mp3", tts={"duration": 1.5})
+    manifest.save()
+    loaded = build_manifest.BuildManifest.load("deck")
+    assert loaded.slides == {"slide_1": {"fingerprint": "fp", "audio": "a.mp3", "tts": {"duration": 1.5}}}
+
+def test_unreadable_manifest_starts_empty(projects):
+    path = build_manifest.BuildManifest.load("deck").path
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert build_manifest.BuildManifest.load("deck").slides == {}
+
+def test_reusable_requires_fingerprint_and_files(tmp_path):
+    audio, image = tmp_path / "a.mp3", tmp_path / "a.png"
+    audio.write_bytes(b"mp3")
+    manifest = build_manifest.BuildManifest(str(tmp_path / "manifest.json"))
+    manifest.record("slide_1", "fp", audio=str(audio), image=str(image), segment=None, tts={"duration": 2.0})
+
+    assert manifest.reusable("slide_1", "other") == {}
+    assert manifest.reusable("slide_2", "fp") == {}
+    # Artifacts deleted since the last build are rebuilt
+    assert manifest.reusable("slide_1", "fp") == {"audio": str(audio), "tts": {"duration": 2.0}}
+    image.write_bytes(b"png")
+    assert manifest.reusable("slide_1", "fp")["image"] == str(image)
+
+def test_file_digest_reuses_hash_until_the_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "plot.png"
+    path.write_bytes(b"first")
+    manifest = build_manifest.BuildManifest(str(tmp_path / "manifest.json"))
+    assert manifest.file_digest(str(path)) == file_digest(str(path))
+    assert manifest.file_digest(None) == manifest.file_digest(str(tmp_path / "gone.png")) == "missing"
+
+    hashed = []
+    monkeypatch.setattr(build_manifest, "file_digest", lambda p: hashed.append(p) or "fresh")
+    assert manifest.file_digest(str(path)) == file_digest(str(path))
+    assert hashed == []
+
+    path.write_bytes(b"second, longer")
+    assert manifest.file_digest(str(path)) == "fresh"
+    assert hashed == [str(path)]
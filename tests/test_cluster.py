@@ -0,0 +1,77 @@
+import time
+import pytest
+import cluster
+
+@pytest.fixture
+def broker(tmp_path):
+    broker = cluster.SQLiteBroker(str(tmp_path / "broker.db"), attempts=2)
+    yield broker
+    broker.close()
+
+def status(broker, task_id):
+    return broker.states([task_id])[task_id]
+
+def test_expired_lease_is_reclaimed(broker):
+    broker.put("t", "tts", {"text": "a"})
+    first = broker.claim("w1", lease=0.05)
+    assert first.attempt == 1
+    assert broker.claim("w2") is None  # still leased
+
+    time.sleep(0.1)
+    second = broker.claim("w2")
+    assert (second.id, second.attempt) == ("t", 2)
+    # The old worker lost the task: no renewing or failing it
+    assert not broker.extend("t", "w1")
+    broker.fail("t", "w1", "late")
+    assert status(broker, "t").status == "running"
+
+    broker.complete("t", "w2", {"audio": "x.mp3"})
+    assert status(broker, "t") == cluster.TaskState("done", {"audio": "x.mp3"}, None)
+
+def test_failed_for_good_after_attempts(broker):
+    broker.put("t", "render", {})
+    for attempt in (1, 2):
+        task = broker.claim("w")
+        assert task.attempt == attempt
+        broker.fail("t", "w", f"boom {attempt}")
+    assert status(broker, "t") == cluster.TaskState("failed", None, "boom 2")
+    assert broker.claim("w") is None
+
+def test_lost_worker_on_last_attempt_fails_task(broker):
+    broker.put("t", "segment", {})
+    for _ in range(2):
+        broker.claim("w", lease=0.01)
+        time.sleep(0.05)
+    assert broker.claim("w") is None
+    assert status(broker, "t").status == "failed"
+    assert "lease expired" in status(broker, "t").error
+
+def test_put_of_done_task_is_noop(broker):
+    broker.put("t", "tts", {"text": "a"})
+    broker.claim("w")
+    broker.complete("t", "w", {"audio": "a.mp3"})
+
+    assert not broker.put("t", "tts", {"text": "a"})
+    assert status(broker, "t").result == {"audio": "a.mp3"}
+    assert broker.claim("w") is None
+
+    assert broker.put("t", "tts", {"text": "a"}, force=True)
+    assert broker.claim("w").attempt == 1
+
+def test_failed_task_can_be_queued_again(broker):
+    broker.put("t", "tts", {})
+    for _ in range(2):
+        broker.claim("w")
+        broker.fail("t", "w", "boom")
+    assert broker.put("t", "tts", {})
+    assert status(broker, "t") == cluster.TaskState("queued", None, None)
+
+def test_purge_keeps_unfinished_tasks(broker):
+    for task_id in ("done", "queued"):
+        broker.put(task_id, "tts", {})
+    broker.claim("w")
+    broker.complete("done", "w", {})
+
+    assert broker.purge(older_than=60) == 0
+    assert broker.purge(older_than=0) == 1
+    assert set(broker.states(["done", "queued"])) == {"queued"}
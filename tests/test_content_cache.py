@@ -0,0 +1,68 @@
+import os
+import pytest
+import content_cache
+
+@pytest.fixture
+def cache(tmp_path):
+    return content_cache.ContentCache("test", max_bytes=250, suffix=".bin", root=str(tmp_path))
+
+def age(cache, key, mtime):
+    os.utime(cache.path_for(key), (mtime, mtime))
+
+def test_content_key_separates_parts():
+    assert content_cache.content_key("ab", "c") != content_cache.content_key("a", "bc")
+    assert content_cache.content_key(b"x", 1) == content_cache.content_key("x", "1")
+
+def test_least_recently_used_entry_is_evicted(cache, tmp_path):
+    cache.store_bytes("a", b"a" * 100)
+    cache.store_bytes("b", b"b" * 100)
+    age(cache, "a", 1000)
+    age(cache, "b", 2000)
+    assert cache.lookup("a")  # a is now the most recently used
+
+    cache.store_bytes("c", b"c" * 100)
+    assert cache.read_bytes("b") is None
+    assert cache.read_bytes("a") == b"a" * 100 and cache.read_bytes("c") == b"c" * 100
+    assert cache.stats()["evictions"] == 1
+
+def test_fetch_links_entry_and_counts(cache, tmp_path):
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"data")
+    cache.store("k", str(src))
+    dest = tmp_path / "out" / "dest.bin"
+    assert cache.fetch("k", str(dest)) and dest.read_bytes() == b"data"
+    assert not cache.fetch("missing", str(dest))
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
+
+def test_stores_under_budget_do_not_walk_the_cache(cache, monkeypatch):
+    walks = []
+    walk = os.walk
+    monkeypatch.setattr(content_cache.os, "walk", lambda path: walks.append(path) or walk(path))
+    for n in range(5):
+        cache.store_bytes(f"k{n}", b"x" * 40)
+    assert len(walks) == 1  # the first store learns the size
+
+    cache.store_bytes("big", b"x" * 100)  # 300 bytes: over budget
+    assert len(walks) == 2
+    assert cache._size <= cache.max_bytes
+
+def test_replacing_an_entry_counts_only_the_difference(cache):
+    cache.store_bytes("k", b"x" * 200)
+    for _ in range(5):
+        cache.store_bytes("k", b"x" * 200)
+    assert cache._size == 200
+    assert cache.read_bytes("k") is not None
+
+def test_other_processes_are_noticed_after_the_scan_interval(cache, monkeypatch):
+    cache.store_bytes("k", b"x" * 10)
+    # Another process with a larger budget fills the shared directory
+    other = content_cache.ContentCache("test", max_bytes=10000, suffix=".bin", root=os.path.dirname(cache.dir))
+    for n in range(3):
+        other.store_bytes(f"o{n}", b"o" * 100)
+
+    cache.store_bytes("k2", b"x" * 10)
+    assert cache._size == 20  # not noticed yet
+    monkeypatch.setattr(content_cache, "CACHE_SCAN_INTERVAL", 0)
+    cache.store_bytes("k3", b"x" * 10)
+    assert cache._size <= cache.max_bytes
+    assert cache.stats()["evictions"] >= 1
@@ -0,0 +1,34 @@
+import pytest
+import hls
+
+def ts_packet(pts):
+    """One MPEG-TS packet starting a video PES with the given 90 kHz PTS."""
+    pts_bytes = bytes([
+        0x21 | ((pts >> 29) & 0x0E), (pts >> 22) & 0xFF, 0x01 | ((pts >> 14) & 0xFE),
+        (pts >> 7) & 0xFF, 0x01 | ((pts << 1) & 0xFE),
+    ])
+    pes = b"\x00\x00\x01\xe0\x00\x00\x80\x80\x05" + pts_bytes
+    packet = b"\x47\x41\x00\x10" + pes
+    return packet + b"\xff" * (hls.TS_PACKET - len(packet))
+
+def test_start_time_reads_first_video_pts(tmp_path):
+    path = tmp_path / "seg.ts"
+    # A packet without payload start comes first and is skipped
+    path.write_bytes(b"\x47\x01\x00\x10" + b"\xff" * 184 + ts_packet(2 ** 32 + 90000 * 3) + ts_packet(0))
+    assert hls._start_time(str(path)) == pytest.approx(2 ** 32 / 90000 + 3)
+
+def test_start_time_without_video_is_zero(tmp_path):
+    path = tmp_path / "seg.ts"
+    path.write_bytes(b"\x47\x00\x00\x10" + b"\xff" * 184)
+    assert hls._start_time(str(path)) == 0.0
+
+def test_start_time_of_encoded_segments(tmp_path, ffmpeg):
+    starts = []
+    for offset in (5, 15):
+        path = str(tmp_path / f"seg{offset}.ts")
+        ffmpeg("-f", "lavfi", "-i", "testsrc=size=64x64:rate=24:duration=1", "-c:v", "libx264",
+               "-output_ts_offset", str(offset), "-f", "mpegts", path)
+        starts.append(hls._start_time(path))
+    # The muxer delays the first frame a little past the offset
+    assert 5 < starts[0] < 7
+    assert starts[1] - starts[0] == pytest.approx(10, abs=1e-3)
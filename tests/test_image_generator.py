@@ -0,0 +1,24 @@
+import image_generator
+
+SPEC = {"title_text": "Title", "body_text": "Body", "theme": "content", "height": 144}
+
+def test_render_slides_keeps_order_and_sizes():
+    specs = [dict(SPEC, title_text=f"Slide {n}") for n in range(3)]
+    frames = image_generator.render_slides(specs, workers=2, as_buffers=True)
+    assert [frame.size for frame in frames] == [image_generator.frame_size(144)] * 3
+    assert frames == [image_generator.render_spec(spec, as_buffer=True) for spec in specs]
+
+def test_short_batch_leaves_shared_pool_running():
+    pool = image_generator.render_pool(2)
+    assert image_generator.render_pool(2) is pool
+    # A batch smaller than the pool used to replace (and shut down) it
+    image_generator.render_slides([SPEC] * 2, workers=2, as_buffers=True)
+    image_generator.render_slides([SPEC], workers=2, as_buffers=True)
+    assert image_generator.render_pool(2) is pool
+    frame = pool.submit(image_generator.render_spec, SPEC, True).result(timeout=60)
+    assert frame.size == image_generator.frame_size(144)
+
+def test_render_key_ignores_output_name():
+    key = image_generator.render_key(dict(SPEC, output_name="a.png"))
+    assert key == image_generator.render_key(dict(SPEC, output_name="b.png"))
+    assert key != image_generator.render_key(dict(SPEC, title_text="Other"))
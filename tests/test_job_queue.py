@@ -0,0 +1,70 @@
+import pytest
+import job_queue
+
+@pytest.fixture
+def store(tmp_path):
+    return job_queue.JobStore(str(tmp_path / "jobs"))
+
+def test_stages_and_updates_are_persisted(store):
+    store.create("a")
+    store.update("a", status="running", worker_pid=42)
+    store.set_stage("a", "tts", 2, 5)
+    state = job_queue.JobStore(store.root).get("a")
+    assert (state["status"], state["worker_pid"]) == ("running", 42)
+    assert state["stages"] == {"tts": {"done": 2, "total": 5}}
+
+    store.set_stage("missing", "tts", 1, 1)
+    assert store.get("missing") is None
+
+def test_recover_fails_unfinished_jobs(store):
+    for job_id, status in [("queued", "queued"), ("running", "running"), ("done", "done"), ("failed", "failed")]:
+        store.create(job_id)
+        store.update(job_id, status=status, error=None)
+    store.recover()
+
+    assert store.get("queued")["status"] == store.get("running")["status"] == "failed"
+    assert store.get("running")["error"] == "Interrupted by server restart"
+    assert store.get("running")["finished_at"] is not None
+    assert store.get("done")["status"] == "done"
+    assert store.get("failed")["error"] is None
+
+def test_fail_worker_jobs_only_touches_that_worker(store):
+    store.create("mine")
+    store.update("mine", status="running", worker_pid=1)
+    store.create("other")
+    store.update("other", status="running", worker_pid=2)
+    store.create("finished")
+    store.update("finished", status="done", worker_pid=1)
+
+    assert store.fail_worker_jobs(1, "boom") == ["mine"]
+    assert store.get("mine")["error"] == "boom"
+    assert store.get("other")["status"] == "running"
+    assert store.get("finished")["status"] == "done"
+
+def test_submit_requires_start(store):
+    with pytest.raises(RuntimeError):
+        job_queue.JobQueue(workers=1, store=store).submit("a", {})
+    assert store.get("a") is None
+
+def test_dead_worker_is_replaced_and_its_job_failed(store, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # start() resets metric snapshots under ./output
+    jobs = job_queue.JobQueue(workers=1, store=store)
+    jobs.start()
+    try:
+        dead = jobs._processes[0]
+        store.create("crashed")
+        store.update("crashed", status="running", worker_pid=dead.pid)
+        dead.kill()
+        dead.join()
+
+        assert jobs.check_workers() == 1
+        assert jobs.alive_workers() == 1
+        assert jobs._processes[0].pid != dead.pid
+        state = store.get("crashed")
+        assert state["status"] == "failed"
+        assert str(dead.pid) in state["error"]
+    finally:
+        jobs.stop()
+    assert jobs.alive_workers() == 0
+    with pytest.raises(RuntimeError):
+        jobs.submit("late", {})
@@ -0,0 +1,70 @@
+import io
+import json
+import pytest
+import markdown
+from models import VideoRequest
+
+DECK = """\
+# Linear Algebra
+# Slide 1
+## Vector spaces
+**Duration:** 1.5 min
+![plot](images/plot.png)
+A set closed under addition.
+- zero vector
+1. check closure
+$$
+a + b
+$$
+\\forall v \\in V
+```python
+x = [1, 2]
+
+y = x
+```
+### Aside
+---
+# Slide 3: Bases
+**Duration:** 40 sec
+"""
+
+def test_fields_of_a_slide():
+    first, second = markdown.iter_slides(io.StringIO(DECK))
+    assert (first.slide_id, first.title, first.subtitle) == (1, "Vector spaces", "Linear Algebra")
+    assert first.duration == "90 sec"
+    assert first.image == "images/plot.png"
+    assert first.description == ["A set closed under addition.", "Aside"]
+    assert first.bullets == ["zero vector", "check closure"]
+    assert first.math == ["a + b", "\\forall v \\in V"]
+    assert first.code_block == "x = [1, 2]\n\ny = x"
+    assert (second.slide_id, second.title, second.duration) == (3, "Bases", "40 sec")
+    assert second.description is None
+
+def test_slides_are_yielded_before_the_input_ends():
+    lines = iter(DECK.splitlines(keepends=True))
+    slides = markdown.iter_slides(lines)
+    assert next(slides).slide_id == 1
+    # The second slide's lines are still unread
+    assert next(lines).startswith("**Duration:** 40")
+
+def test_restarted_numbering_continues():
+    text = "# Slide 1\n## A\n# Part two\n# Slide 1\n## B\n# Slide 2\n"
+    slides = list(markdown.iter_slides(text.splitlines(), first_id=5))
+    assert [s.slide_id for s in slides] == [5, 6, 7]
+    assert [s.subtitle for s in slides] == [None, "Part two", "Part two"]
+    assert slides[2].title == "Slide 7"
+
+def test_directory_ids_unique_across_files(tmp_path):
+    (tmp_path / "b.md").write_text("# Slide 1\n## Second file\n", encoding="utf-8")
+    (tmp_path / "a.md").write_text("# Slide 1\n## One\n# Slide 2\n## Two\n", encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("# Slide 9\n", encoding="utf-8")
+    slides = list(markdown.iter_directory(str(tmp_path), workers=1))
+    assert [(s.slide_id, s.title) for s in slides] == [(1, "One"), (2, "Two"), (3, "Second file")]
+
+def test_write_request_is_a_valid_video_request(tmp_path):
+    output = tmp_path / "out" / "slides.json"
+    count = markdown.write_request(markdown.iter_slides(io.StringIO(DECK)), str(output), "Deck", "Ada")
+    assert count == 2
+    request = VideoRequest(**json.loads(output.read_text(encoding="utf-8")))
+    assert request.project_metadata.total_duration == "130 sec"
+    assert [s.slide_id for s in request.slides] == [1, 3]
@@ -0,0 +1,28 @@
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from models import Rendition, parse_duration
+
+@pytest.mark.parametrize("value, seconds", [(90, 90), ("90 sec", 90), ("1.5 min", 90), ("4 min", 240), ("1 h", 3600), ("soon", 30)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+@pytest.mark.parametrize("language", [None, "en", "hi", "zh-CN"])
+def test_known_rendition_languages(language):
+    assert Rendition(name="720p", language=language).language == language
+
+@pytest.mark.parametrize("language", ["xx", "HI", "", "english"])
+def test_unknown_rendition_language_is_rejected(language):
+    with pytest.raises(ValidationError, match="unsupported subtitle language"):
+        Rendition(name="720p", language=language)
+
+def test_api_rejects_unknown_language():
+    import main
+    body = {
+        "project_metadata": {"title": "T", "author": "A", "date": "2024", "total_duration": "1 min"},
+        "slides": [{"slide_id": 1, "title": "S", "duration": "5 sec"}],
+        "renditions": [{"name": "720p", "language": "xx"}],
+    }
+    response = TestClient(main.app).post("/generate-video", json=body)
+    assert response.status_code == 422
+    assert "unsupported subtitle language" in response.text
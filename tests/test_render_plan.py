@@ -0,0 +1,69 @@
+import json
+import pytest
+import image_generator
+import render_plan
+from models import VideoRequest
+
+def request(**slide):
+    return VideoRequest(
+        project_metadata={"title": "Vectors", "author": "Ada", "date": "2024", "total_duration": "2 min"},
+        slides=[
+            dict({"slide_id": 1, "title": "Basis", "duration": "1 min", "bullets": ["span", "independence"]}, **slide),
+            {"slide_id": 4, "title": "Rank", "duration": "45 sec", "description": "Dimension of the image"},
+        ],
+    )
+
+def test_plan_order_keys_and_files():
+    plan = render_plan.build_plan(request(), "job", narration={})
+    assert [task.index for task in plan] == [0, 1, 2]
+    assert [task.key for task in plan] == ["intro", "slide_1", "slide_4"]
+    assert plan[1].audio_file == "temp/job_slide_1.mp3"
+    assert plan[1].render_spec["output_name"] == "temp/job_slide_1.png"
+    assert plan[1].render_spec["body_text"] == ["span", "independence"]
+    assert [task.target_duration for task in plan] == [None, 60, 45]
+    assert "Ada" in plan[0].narration
+
+def test_tasks_are_immutable_and_hashable():
+    task = render_plan.build_plan(request(), "job", narration={})[1]
+    with pytest.raises(AttributeError):
+        task.narration = "changed"
+    assert not hasattr(task, "__dict__")
+    assert task.render_key == image_generator.render_key(task.render_spec)
+    assert task.slot(12.5) == 60 and task.slot(75.0) == 75.0
+
+def test_narration_file_overrides_slide_text(tmp_path):
+    path = tmp_path / "narration.json"
+    path.write_text(json.dumps({"slide_4": {"voice_text": " Custom words "}, "notes": "ignored"}), encoding="utf-8")
+    narration = render_plan.load_narration(str(path))
+    assert narration == {4: "Custom words"}
+    plan = render_plan.build_plan(request(), "job", narration=narration)
+    assert plan[2].narration == "Custom words"
+    assert plan[1].narration.startswith("Basis")
+    assert render_plan.load_narration(str(tmp_path / "missing.json")) == {}
+
+def test_fingerprint_follows_inputs_not_job():
+    first = render_plan.build_plan(request(), "job-a", narration={})
+    second = render_plan.build_plan(request(), "job-b", narration={})
+    assert [t.fingerprint for t in first] == [t.fingerprint for t in second]
+
+    edited = render_plan.build_plan(request(title="Bases"), "job-a", narration={})
+    assert edited[1].fingerprint != first[1].fingerprint
+    assert edited[2].fingerprint == first[2].fingerprint
+
+def test_height_is_part_of_the_render():
+    default = render_plan.build_plan(request(), "job", narration={})[1]
+    small = render_plan.build_plan(request(), "job", narration={}, height=360)[1]
+    assert "height" not in default.render_spec
+    assert small.render_spec["height"] == small.height == 360
+    assert small.render_key != default.render_key
+    assert small.fingerprint == default.fingerprint
+
+def test_iter_plan_consumes_slides_lazily():
+    consumed = []
+    def slides():
+        for slide in request().slides:
+            consumed.append(slide.slide_id)
+            yield slide
+    plan = render_plan.iter_plan(request(), "job", narration={}, slides=slides())
+    assert next(plan).key == "intro" and consumed == []
+    assert next(plan).key == "slide_1" and consumed == [1]
@@ -0,0 +1,62 @@
+import pytest
+import subtitle_engine
+
+def timed(text, strip=""):
+    return [(i * 0.3, (i + 1) * 0.3, word.strip(strip)) for i, word in enumerate(text.split())]
+
+REPRO = "Scanning step 1. Why scanning matters for slide 1. Walk through the folder and"
+SENTENCES = ["Scanning step 1.", "Why scanning matters for slide 1.", "Walk through the folder and"]
+
+@pytest.mark.parametrize("strip", ["", "."])
+def test_cues_split_at_sentence_ends(strip):
+    # Words with their punctuation (edge-tts) or without it
+    cues = subtitle_engine.split_cues(REPRO, 5.0, timed(REPRO, strip))
+    assert [text for _, _, text in cues] == SENTENCES
+    assert cues[0][0] == 0.0 and cues[-1][1] == 5.0
+    assert all(a[1] == b[0] for a, b in zip(cues, cues[1:]))
+
+def test_sentence_end_inside_closing_quote():
+    text = 'He said "stop." Then he left'
+    cues = subtitle_engine.split_cues(text, 3.0, timed(text))
+    assert [text for _, _, text in cues] == ['He said "stop."', "Then he left"]
+
+def test_cues_without_word_timings_share_time_by_length():
+    cues = subtitle_engine.split_cues(REPRO, 8.0)
+    assert [text for _, _, text in cues] == SENTENCES
+    assert cues[-1][1] == pytest.approx(8.0)
+
+def test_long_sentence_is_split_to_cue_size():
+    text = " ".join(["word"] * 60)
+    cues = subtitle_engine.split_cues(text, 30.0, timed(text))
+    assert len(cues) > 1
+    assert all(len(text) <= subtitle_engine.MAX_CUE_CHARS for _, _, text in cues)
+
+def test_text_script():
+    assert subtitle_engine.text_script("नमस्ते दुनिया, hello") == "DEVANAGARI"
+    assert subtitle_engine.text_script("வணக்கம்") == "TAMIL"
+    assert subtitle_engine.text_script("Привет, hello") is None
+
+def test_font_must_cover_the_script(monkeypatch):
+    regular = subtitle_engine.image_generator.find_font("regular")
+    if regular is None:
+        pytest.skip("no regular font installed")
+    font = subtitle_engine.subtitle_font("Hello", 24)
+    assert subtitle_engine.covers(font, "Hello world")
+    if subtitle_engine.covers(font, "नम"):
+        pytest.skip("the regular font covers Devanagari here")
+    monkeypatch.setattr(subtitle_engine.image_generator, "find_font", lambda kind: regular if kind == "regular" else None)
+    with pytest.raises(subtitle_engine.SubtitleFontError, match="FONT_DEVANAGARI"):
+        subtitle_engine.SubtitleOverlay([((0, 1), "नमस्ते")])
+
+def test_srt_cues_end_with_speech_and_slides_start_at_slots(tmp_path):
+    path = tmp_path / "subs.srt"
+    with subtitle_engine.SrtWriter(str(path)) as writer:
+        # Out of order, the second slide arrives first
+        writer.add(1, "Second slide.", 1.0, [(0.0, 1.0, "Second"), (1.0, 1.0, "slide.")], slot=2.0)
+        writer.add(0, "First slide.", 2.0, [(0.0, 1.0, "First"), (1.0, 2.0, "slide.")], slot=60.0)
+    blocks = path.read_text(encoding="utf-8").strip().split("\n\n")
+    assert [block.split("\n")[1] for block in blocks] == [
+        "00:00:00,000 --> 00:00:02,000",
+        "00:01:00,000 --> 00:01:01,000",
+    ]
+    assert writer.offsets == [0.0, 60.0]
@@ -0,0 +1,43 @@
+import translate_Subtitles as ts
+
+class Counting(ts.StubBackend):
+    name = "counting"
+
+    def __init__(self):
+        super().__init__(tag=True)
+        self.sent = []
+
+    def translate_batch(self, texts, target):
+        self.sent.extend(texts)
+        return super().translate_batch(texts, target)
+
+def test_memory_only_sends_unseen_cues(tmp_path):
+    memory = ts.TranslationMemory(str(tmp_path / "memory.db"))
+    backend = Counting()
+    assert ts.translate_texts(["Hello", "World", "Hello"], "fr", backend, memory) == ["[fr] Hello", "[fr] World", "[fr] Hello"]
+    assert backend.sent == ["Hello", "World"]
+
+    backend.sent.clear()
+    assert ts.translate_texts(["World", "Again"], "fr", backend, memory) == ["[fr] World", "[fr] Again"]
+    assert backend.sent == ["Again"]
+    # Other languages are translated separately
+    ts.translate_texts(["World"], "de", backend, memory)
+    assert backend.sent == ["Again", "World"]
+    memory.close()
+
+def test_memory_is_keyed_by_backend(tmp_path):
+    path = str(tmp_path / "memory.db")
+    memory = ts.TranslationMemory(path)
+    ts.translate_texts(["Welcome"], "hi", ts.StubBackend(), memory)
+    memory.close()
+
+    memory = ts.TranslationMemory(path)
+    backend = Counting()
+    assert ts.translate_texts(["Welcome"], "hi", backend, memory) == ["[hi] Welcome"]
+    assert backend.sent == ["Welcome"]
+    assert memory.lookup("stub", "hi", ["Welcome"]) == {"Welcome": "Welcome"}
+    memory.close()
+
+def test_batches_stay_under_the_request_limit():
+    batches = list(ts._batches(["x" * 40] * 10, max_chars=100))
+    assert [len(batch) for batch in batches] == [2, 2, 2, 2, 2]
@@ -0,0 +1,183 @@
+import asyncio
+import aiohttp
+import pytest
+import audio_track
+import tts_client
+
+# One silent MPEG-2 Layer III frame: 24 kHz mono 48 kbps, 576 samples (24 ms)
+FRAME = audio_track.silent_frame(bytes([0xFF, 0xF3, 0x64, 0xC4]))
+FRAME_SEC = 576 / 24000
+
+def mp3(frames):
+    return FRAME * frames
+
+class FakeBackend:
+    """Fails with the queued errors first, then answers with one frame per word."""
+
+    name = "fake"
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+
+    async def stream(self, text, voice, rate):
+        self.calls.append(text)
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is None:
+                return b"", []
+            raise error
+        words = text.split()
+        return mp3(len(words)), [(i * FRAME_SEC, (i + 1) * FRAME_SEC, w) for i, w in enumerate(words)]
+
+class Span:
+    def __init__(self):
+        self.attrs = {}
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Backoff calls as (attempt, retry_after), without sleeping."""
+    calls = []
+
+    def no_wait(attempt, retry_after=None):
+        calls.append((attempt, retry_after))
+        return 0
+    monkeypatch.setattr(tts_client, "backoff_delay", no_wait)
+    return calls
+
+def synthesize(client, text="hello world", span=None):
+    return asyncio.run(client.synthesize(text, "voice", "+0%", span=span))
+
+# ---------------------------
+# RETRIES
+# ---------------------------
+
+@pytest.mark.parametrize("exc", [
+    asyncio.TimeoutError(), TimeoutError(), ConnectionResetError(), BrokenPipeError(),
+    tts_client.TTSThrottled(), tts_client.TTSRetryable("dropped"),
+])
+def test_transient_errors_are_retried(exc):
+    assert tts_client.is_retryable(exc)
+
+@pytest.mark.parametrize("exc", [
+    FileNotFoundError("voice.json"), PermissionError("output"), ValueError("bad rate"), tts_client.TTSError("x"),
+])
+def test_permanent_errors_are_not_retried(exc):
+    assert not tts_client.is_retryable(exc)
+
+def test_library_errors_are_retried():
+    assert tts_client.is_retryable(aiohttp.ClientOSError())
+    assert tts_client.is_retryable(aiohttp.ServerDisconnectedError())
+
+def test_transient_failures_are_retried_with_backoff(delays):
+    backend = FakeBackend([ConnectionResetError(), None, tts_client.TTSThrottled(retry_after=2)])
+    span = Span()
+    data, words = synthesize(tts_client.TTSClient(backend, retries=4), span=span)
+    assert len(backend.calls) == 4
+    assert data == mp3(2) and [w for _, _, w in words] == ["hello", "world"]
+    # Exponential attempt numbers, and the service's Retry-After is passed on
+    assert delays == [(0, None), (1, None), (2, 2)]
+    assert span.attrs == {"retries": 3, "throttled": 1, "chunks": 1}
+
+def test_permanent_error_is_not_retried(delays):
+    backend = FakeBackend([FileNotFoundError("voice model")])
+    with pytest.raises(tts_client.TTSError, match="FileNotFoundError"):
+        synthesize(tts_client.TTSClient(backend, retries=4))
+    assert len(backend.calls) == 1 and delays == []
+
+def test_error_when_retries_run_out(delays):
+    backend = FakeBackend([ConnectionResetError()] * 5)
+    with pytest.raises(tts_client.TTSError, match="after 3 attempts"):
+        synthesize(tts_client.TTSClient(backend, retries=2))
+    assert len(backend.calls) == 3 and len(delays) == 2
+
+def test_slow_backend_times_out_and_throttles(delays):
+    class Slow(FakeBackend):
+        async def stream(self, text, voice, rate):
+            self.calls.append(text)
+            await asyncio.sleep(1)
+
+    limiter = tts_client.AIMDLimiter(initial=4)
+    with pytest.raises(tts_client.TTSError, match="TimeoutError"):
+        synthesize(tts_client.TTSClient(Slow(), limiter=limiter, timeout=0.01, retries=1))
+    assert limiter.limit == 1
+
+def test_backoff_is_jittered_capped_and_honours_retry_after():
+    for attempt in range(10):
+        assert 0 <= tts_client.backoff_delay(attempt) <= tts_client.TTS_BACKOFF_MAX
+    assert tts_client.backoff_delay(0, retry_after=3) >= 3
+
+# ---------------------------
+# AIMD LIMITER
+# ---------------------------
+
+def test_limiter_halves_once_per_epoch():
+    async def run():
+        limiter = tts_client.AIMDLimiter(initial=8, minimum=1, maximum=16)
+        tokens = [await limiter.acquire() for _ in range(3)]
+        # A burst of throttles from calls started together halves once
+        for token in tokens:
+            limiter.release(token, throttled=True)
+        assert limiter.limit == 4
+        # A call started after the decrease halves again
+        limiter.release(await limiter.acquire(), throttled=True)
+        assert limiter.limit == 2
+        for _ in range(3):
+            limiter.release(await limiter.acquire(), throttled=True)
+        assert limiter.limit == 1  # never below the minimum
+    asyncio.run(run())
+
+def test_limiter_grows_by_one_per_window():
+    async def run():
+        limiter = tts_client.AIMDLimiter(initial=4, maximum=5)
+        for _ in range(4):
+            limiter.release(await limiter.acquire())
+        assert 4.9 < limiter.limit < 5
+        for _ in range(20):
+            limiter.release(await limiter.acquire())
+        assert limiter.limit == 5
+    asyncio.run(run())
+
+def test_limiter_blocks_at_the_limit():
+    async def run():
+        limiter = tts_client.AIMDLimiter(initial=1, maximum=1)
+        token = await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        limiter.release(token)
+        await asyncio.wait_for(waiting, 1)
+        assert limiter.in_flight == 1
+    asyncio.run(run())
+
+# ---------------------------
+# CHUNKING
+# ---------------------------
+
+def test_split_sentences_keeps_chunks_under_the_limit():
+    text = "One two three. Four five six seven. Eight nine. " + "word " * 20 + "end."
+    chunks = tts_client.split_sentences(text, max_chars=30)
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+    assert chunks[0] == "One two three."
+    assert tts_client.split_sentences("Short.", max_chars=30) == ["Short."]
+
+def test_stitch_offsets_word_timings():
+    first = (mp3(10), [(0.0, 0.1, "a"), (0.1, 0.24, "b")])
+    second = (mp3(5), [(0.0, 0.05, "c")])
+    data, words = tts_client.stitch([first, second])
+    assert audio_track.mp3_info(data).frames == 15
+    assert words == [(0.0, 0.1, "a"), (0.1, 0.24, "b"), (0.24, 0.29, "c")]
+
+def test_long_text_is_synthesized_in_chunks():
+    backend = FakeBackend()
+    text = "First sentence here. Second one follows. Third and last."
+    span = Span()
+    data, words = synthesize(tts_client.TTSClient(backend, chunk_chars=25), text, span)
+    assert len(backend.calls) == 3 and span.attrs["chunks"] == 3
+    assert audio_track.mp3_info(data).frames == len(text.split())
+    assert [w for _, _, w in words] == text.split()
+    assert words[3][0] == pytest.approx(3 * FRAME_SEC)
@@ -1,5 +1,12 @@
-from deep_translator import GoogleTranslator
+import argparse
 import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from content_cache import CACHE_ROOT
+import subtitle_engine
+import metrics
 
 INPUT_SRT = "subtitles_en.srt"
 OUTPUT_DIR = "subtitles"
@@ -24,26 +31,201 @@ languages = {
     "zh-CN": "Chinese"
 }
 
+# ISO 639-2 codes for subtitle track metadata (MP4 ignores two-letter codes)
+TRACK_LANGUAGES = {
+    "en": "eng", "hi": "hin", "ta": "tam", "te": "tel", "kn": "kan", "ml": "mal",
+    "mr": "mar", "bn": "ben", "gu": "guj", "pa": "pan", "ur": "urd", "fr": "fra",
+    "es": "spa", "de": "deu", "ar": "ara", "ja": "jpn", "ko": "kor", "zh-CN": "zho",
+}
+
+# Languages translated at the same time
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+# Characters sent per request (Google rejects > 5000)
+BATCH_CHARS = 4500
+MEMORY_PATH = os.path.join(CACHE_ROOT, "translations.sqlite3")
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def translate_srt(lang_code):
-    translator = GoogleTranslator(source="en", target=lang_code)
-    output_file = f"{OUTPUT_DIR}/subtitles_{lang_code}.srt"
+# ---------------------------
+# BACKENDS
+# ---------------------------
+
+class GoogleBackend:
+    """deep-translator's Google endpoint; one request per batch of cues."""
+
+    name = "google"
+
+    def __init__(self, source="en"):
+        from deep_translator import GoogleTranslator
+        self._translator_cls = GoogleTranslator
+        self.source = source
+
+    def translate_batch(self, texts, target):
+        translator = self._translator_cls(source=self.source, target=target)
+        # Cues are single-line here, so newlines delimit them inside one request
+        joined = translator.translate("\n".join(texts)) or ""
+        parts = joined.split("\n")
+        if len(parts) == len(texts):
+            return [p.strip() for p in parts]
+        # The service merged or split lines: fall back to one call per cue
+        return [translator.translate(text) or text for text in texts]
+
+class StubBackend:
+    """Offline stand-in: returns the text unchanged, optionally tagged with the language."""
+
+    name = "stub"
+
+    def __init__(self, tag=False):
+        self.tag = tag
+
+    def translate_batch(self, texts, target):
+        return [f"[{target}] {text}" if self.tag else text for text in texts]
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "stub": StubBackend,
+}
+
+def get_backend(name=None):
+    name = name or os.getenv("TRANSLATION_BACKEND", "google")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown translation backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
 
-    with open(INPUT_SRT, "r", encoding="utf-8") as f:
-        lines = f.readlines()
+# ---------------------------
+# TRANSLATION MEMORY
+# ---------------------------
 
-    translated_lines = []
-    for line in lines:
-        if "-->" in line or line.strip().isdigit() or line.strip() == "":
-            translated_lines.append(line)
-        else:
-            translated_lines.append(translator.translate(line.strip()) + "\n")
+class TranslationMemory:
+    """
+    Persistent (backend, lang, text) -> translation store, shared by
+    every job. Keyed by backend so stub output never answers for Google.
+    """
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.writelines(translated_lines)
+    def __init__(self, path=MEMORY_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # The old backend-less "memory" table is left unused
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " backend TEXT NOT NULL, lang TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL,"
+            " PRIMARY KEY (backend, lang, source))"
+        )
+        self._db.commit()
+
+    def lookup(self, backend, lang, texts):
+        found = {}
+        texts = list(texts)
+        with self._lock:
+            for i in range(0, len(texts), 500):
+                chunk = texts[i:i + 500]
+                rows = self._db.execute(
+                    "SELECT source, target FROM translations WHERE backend = ? AND lang = ?"
+                    f" AND source IN ({','.join('?' * len(chunk))})",
+                    [backend, lang, *chunk],
+                )
+                found.update(rows.fetchall())
+        return found
+
+    def store(self, backend, lang, pairs):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO translations (backend, lang, source, target) VALUES (?, ?, ?, ?)",
+                [(backend, lang, source, target) for source, target in pairs],
+            )
+            self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+# ---------------------------
+# TRANSLATION
+# ---------------------------
+
+def _batches(texts, max_chars=BATCH_CHARS):
+    batch, size = [], 0
+    for text in texts:
+        if batch and size + len(text) + 1 > max_chars:
+            yield batch
+            batch, size = [], 0
+        batch.append(text)
+        size += len(text) + 1
+    if batch:
+        yield batch
+
+def translate_texts(texts, lang_code, backend, memory=None, span=None):
+    """
+    Translate texts into lang_code, only sending cues the memory has not seen.
+    span (metrics.Span) receives the memory hit/miss counts.
+    """
+    backend_name = getattr(backend, "name", type(backend).__name__)
+    known = memory.lookup(backend_name, lang_code, set(texts)) if memory else {}
+    missing = [t for t in dict.fromkeys(texts) if t not in known]
+    if span is not None:
+        span.set(cache_hits=len(set(texts)) - len(missing), cache_misses=len(missing))
+
+    for batch in _batches(missing):
+        translated = backend.translate_batch(batch, lang_code)
+        pairs = list(zip(batch, translated))
+        known.update(pairs)
+        if memory:
+            memory.store(backend_name, lang_code, pairs)
+
+    return [known[t] for t in texts]
+
+def output_path_for(srt_path, lang_code, output_dir=OUTPUT_DIR):
+    """subtitles/<job>.srt -> subtitles/<job>_<lang>.srt (subtitles_en.srt -> subtitles_<lang>.srt)."""
+    stem = re.sub(r"_en$", "", os.path.splitext(os.path.basename(srt_path))[0])
+    return os.path.join(output_dir, f"{stem}_{lang_code}.srt")
+
+def translate_srt(lang_code, srt_path=INPUT_SRT, backend=None, memory=None, output_dir=OUTPUT_DIR):
+    """Write a translated copy of srt_path and return its path."""
+    backend = backend or get_backend()
+    with metrics.span("translate", language=lang_code) as span:
+        cues = subtitle_engine.parse_srt(srt_path)
+        texts = [" ".join(text.split()) for _, text in cues]
+        translated = translate_texts(texts, lang_code, backend, memory, span)
+
+        output_file = output_path_for(srt_path, lang_code, output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            for n, (((start, end), _), text) in enumerate(zip(cues, translated), start=1):
+                f.write(
+                    f"{n}\n"
+                    f"{subtitle_engine.srt_timestamp(start)} --> {subtitle_engine.srt_timestamp(end)}\n"
+                    f"{subtitle_engine.two_lines(text)}\n\n"
+                )
+        span.set(bytes=os.path.getsize(output_file), cues=len(cues))
 
     print(f" Created {output_file}")
+    return output_file
+
+def translate_all(srt_path=INPUT_SRT, lang_codes=None, backend=None, concurrency=TRANSLATION_CONCURRENCY, output_dir=OUTPUT_DIR):
+    """
+    Translate one SRT into many languages, concurrency languages at a time.
+    Returns {lang_code: output_path}.
+    """
+    lang_codes = list(lang_codes or languages)
+    backend = backend or get_backend()
+    memory = TranslationMemory()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            paths = pool.map(
+                lambda code: translate_srt(code, srt_path, backend, memory, output_dir),
+                lang_codes,
+            )
+            return dict(zip(lang_codes, paths))
+    finally:
+        memory.close()
+        metrics.save_process_snapshot()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translate an English .srt into other languages.")
+    parser.add_argument("srt", nargs="?", default=INPUT_SRT)
+    parser.add_argument("--langs", nargs="*", default=list(languages))
+    parser.add_argument("--backend", default=None, choices=sorted(BACKENDS))
+    parser.add_argument("--concurrency", type=int, default=TRANSLATION_CONCURRENCY)
+    args = parser.parse_args()
 
-for code in languages:
-    translate_srt(code)
+    translate_all(args.srt, args.langs, get_backend(args.backend), args.concurrency)
@@ -0,0 +1,219 @@
+import asyncio
+import os
+import random
+import re
+
+from audio_track import mp3_info
+
+# Per-attempt timeout (seconds) of one TTS request
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "60"))
+# Extra attempts after a transient failure (timeouts, throttling, dropped connections)
+TTS_RETRIES = int(os.getenv("TTS_RETRIES", "4"))
+# Backoff: full jitter over base * 2^attempt, capped
+TTS_BACKOFF_BASE = float(os.getenv("TTS_BACKOFF_BASE", "0.5"))
+TTS_BACKOFF_MAX = float(os.getenv("TTS_BACKOFF_MAX", "20"))
+# Adaptive concurrency bounds of the whole process (all jobs, all chunks)
+TTS_MIN_CONCURRENCY = int(os.getenv("TTS_MIN_CONCURRENCY", "1"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "16"))
+# Longer texts are split at sentence boundaries and synthesized in parallel
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "1000"))
+
+# ---------------------------
+# ERRORS
+# ---------------------------
+
+class TTSError(RuntimeError):
+    """TTS failed for good: a permanent error or out of retries."""
+
+class TTSRetryable(Exception):
+    """Transient backend failure; the request is retried."""
+
+class TTSThrottled(TTSRetryable):
+    """The service asked us to slow down (HTTP 429/503, quota errors)."""
+
+    def __init__(self, message="throttled", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def is_throttle(exc) -> bool:
+    return isinstance(exc, TTSThrottled) or getattr(exc, "status", None) in (429, 503)
+
+def is_retryable(exc) -> bool:
+    """Throttling, timeouts and connection problems are; bad input is not."""
+    if is_throttle(exc) or isinstance(exc, (TTSRetryable, asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status", None)
+    if isinstance(status, int):
+        return status >= 500
+    # aiohttp client errors and edge-tts protocol errors (no audio,
+    # unexpected response, websocket error) are all transient; other
+    # OSErrors (missing file, permissions) are not
+    return type(exc).__module__.split(".")[0] in ("aiohttp", "edge_tts")
+
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    delay = random.uniform(0, min(TTS_BACKOFF_MAX, TTS_BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+# ---------------------------
+# AIMD LIMITER
+# ---------------------------
+
+class AIMDLimiter:
+    """
+    Concurrency limit that grows by one per window of successful calls
+    and halves when the service throttles or times out (like TCP
+    congestion control). Throttles from calls started before the last
+    decrease are ignored, so one burst of 429s halves the limit once.
+    Meant for one event loop at a time.
+    """
+
+    def __init__(self, initial=None, minimum=TTS_MIN_CONCURRENCY, maximum=TTS_MAX_CONCURRENCY):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(self.maximum, max(self.minimum, initial or self.minimum)))
+        self.in_flight = 0
+        self._epoch = 0
+        self._waiters = []
+
+    async def acquire(self) -> int:
+        """Wait for a slot; returns a token for release()."""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._wake()
+                raise
+        self.in_flight += 1
+        return self._epoch
+
+    def release(self, token: int, throttled: bool = False):
+        self.in_flight -= 1
+        if throttled:
+            if token == self._epoch:
+                self._epoch += 1
+                self.limit = max(self.minimum, self.limit / 2)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+# ---------------------------
+# CHUNKING
+# ---------------------------
+
+def split_sentences(text: str, max_chars: int = TTS_CHUNK_CHARS):
+    """
+    Split text into chunks of at most max_chars, breaking between
+    sentences (or between words for a single overlong sentence).
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars + 1)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            pieces.append(sentence)
+
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] += " " + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+def stitch(parts):
+    """
+    Join [(mp3 bytes, words)] of consecutive chunks into one MP3.
+    Word timings of later chunks are shifted by the exact length of the
+    audio before them.
+    """
+    audio = bytearray()
+    words = []
+    offset = 0.0
+    for data, chunk_words in parts:
+        info = mp3_info(data)
+        audio += data[info.audio_start:info.audio_end]
+        words += [(round(start + offset, 3), round(end + offset, 3), word) for start, end, word in chunk_words]
+        offset += info.samples / info.sample_rate
+    return bytes(audio), words
+
+# ---------------------------
+# CLIENT
+# ---------------------------
+
+class TTSClient:
+    """
+    Wraps a TTS backend (anything with `name` and
+    `async stream(text, voice, rate) -> (mp3 bytes, words)`) with
+    per-call timeouts, jittered retries, an AIMD concurrency limit and
+    sentence chunking.
+    """
+
+    def __init__(self, backend, limiter=None, timeout=TTS_TIMEOUT, retries=TTS_RETRIES, chunk_chars=TTS_CHUNK_CHARS):
+        self.backend = backend
+        self.limiter = limiter or AIMDLimiter(initial=int(os.getenv("TTS_CONCURRENCY", "4")))
+        self.timeout = timeout
+        self.retries = retries
+        self.chunk_chars = chunk_chars
+
+    async def _call(self, text, voice, rate, stats):
+        for attempt in range(self.retries + 1):
+            token = await self.limiter.acquire()
+            throttled = False
+            try:
+                data, words = await asyncio.wait_for(self.backend.stream(text, voice, rate), self.timeout)
+                if not data or mp3_info(data).frames == 0:
+                    raise TTSRetryable(f"{self.backend.name} TTS returned no audio")
+                return data, words
+            except Exception as e:
+                throttled = is_throttle(e) or isinstance(e, asyncio.TimeoutError)
+                if not is_retryable(e):
+                    raise TTSError(f"{self.backend.name} TTS failed: {type(e).__name__}: {e}") from e
+                if attempt == self.retries:
+                    raise TTSError(f"{self.backend.name} TTS failed after {attempt + 1} attempts: {type(e).__name__}: {e}") from e
+                stats["retries"] += 1
+                stats["throttled"] += int(throttled)
+                delay = backoff_delay(attempt, getattr(e, "retry_after", None))
+                print(f"[Warning] {self.backend.name} TTS attempt {attempt + 1} failed ({e!r}), "
+                      f"retrying in {delay:.1f}s (limit {int(self.limiter.limit)})")
+            finally:
+                self.limiter.release(token, throttled=throttled)
+            await asyncio.sleep(delay)
+
+    async def synthesize(self, text: str, voice: str, rate: str, span=None):
+        """
+        Returns (mp3 bytes, [(start_sec, end_sec, word)]) for the whole text.
+        span (a metrics.Span) receives retries, throttled and chunks.
+        """
+        stats = {"retries": 0, "throttled": 0}
+        chunks = split_sentences(text, self.chunk_chars)
+        try:
+            parts = await asyncio.gather(*(self._call(chunk, voice, rate, stats) for chunk in chunks))
+        finally:
+            if span is not None:
+                # Accumulates over several takes of the same slide
+                span.set(**{name: span.attrs.get(name, 0) + value
+                            for name, value in dict(stats, chunks=len(chunks)).items()})
+        return parts[0] if len(parts) == 1 else stitch(parts)
+
+    async def aclose(self):
+        close = getattr(self.backend, "aclose", None)
+        if close is not None:
+            await close()
@@ -1,101 +1,671 @@
-from moviepy.config import change_settings
-# Ensure this path matches your actual ImageMagick installation folder!
-change_settings({"IMAGEMAGICK_BINARY": r"C:\Program Files\ImageMagick-7.1.2-Q16-HDRI\magick.exe"})
-
 from moviepy.editor import (
     ImageClip,
-    AudioFileClip,
     concatenate_videoclips,
-    TextClip,
-    CompositeVideoClip
 )
-from moviepy.video.tools.subtitles import SubtitlesClip
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+from PIL import Image
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from content_cache import ContentCache, content_key, link_or_copy
+import hashlib
+import subtitle_engine
+import audio_track
+import subprocess
+import math
 import os
+import re
 
 OUTPUT_DIR = "output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def build_video(slides, subtitles_path=None, final_name="presentation.mp4"):
-    clips = []
-    audio_clips = []  # 🔥 IMPORTANT
-    # 1. Build individual slide clips
-    for idx, slide in enumerate(slides):
+# Shared by the single-pass and per-slide encoders so segments can be
+# concatenated with stream copy. Video is written without audio: the TTS
+# track is assembled separately and muxed in afterwards.
+ENCODE_PARAMS = dict(
+    fps=24,
+    codec="libx264",
+    threads=4,
+    audio=False,
+)
+FPS = ENCODE_PARAMS["fps"]
+
+# "copy" keeps the TTS MP3 frames as they are (no decode, no resample);
+# "aac" re-encodes the assembled track once while muxing.
+AUDIO_CODEC = os.getenv("AUDIO_CODEC", "copy")
+
+# Keyframes at every slide start and every KEYFRAME_INTERVAL seconds
+# inside a slide, so stream-copy packagers (HLS) can cut the video
+# there. Longest HLS segment is about this long.
+KEYFRAME_INTERVAL = float(os.getenv("KEYFRAME_INTERVAL", "6"))
+
+# Per-slide segments: same codecs, x264 tuned for still images and one
+# thread per segment since whole segments run in parallel processes.
+SEGMENT_ENCODE_PARAMS = dict(
+    ENCODE_PARAMS,
+    threads=1,
+    ffmpeg_params=["-tune", "stillimage", "-force_key_frames", f"expr:gte(t,n_forced*{KEYFRAME_INTERVAL:g})"],
+)
+# Segments encoded with different settings must never be mixed in one
+# stream-copy concat, so segment file names carry this tag.
+SEGMENT_PROFILE = content_key(
+    sorted(SEGMENT_ENCODE_PARAMS.items()), sorted(subtitle_engine.STYLE.items())
+)[:8]
+
+# Encoded segments shared across jobs: key = segment_key(...)
+SEGMENT_CACHE = ContentCache(
+    "segments",
+    max_bytes=int(os.getenv("SEGMENT_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+    suffix=".mp4",
+)
+
+# "burn": Pillow overlays drawn into the frames
+# "soft": mov_text track muxed into the MP4, no re-encode cost
+# "none": no subtitles
+SUBTITLE_MODE = os.getenv("SUBTITLE_MODE", "burn")
+
+# build_video mode when none is given: "stream", "slideshow", "single"
+# or "segments"
+COMPILE_MODE = os.getenv("COMPILE_MODE", "stream")
+
+# Slideshow profile: a frame is only emitted when the picture changes
+# (slide or cue boundary), repeated at most every SLIDESHOW_MAX_FRAME
+# seconds so players can still seek inside long slides.
+SLIDESHOW_MAX_FRAME = float(os.getenv("SLIDESHOW_MAX_FRAME", "2.0"))
+SLIDESHOW_PARAMS = ["-tune", "stillimage", "-crf", "23", "-preset", "medium"]
+
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", str(os.cpu_count() or 1)))
+
+FRAME_SIZE = (1280, 720)
+
+# Renditions of one job encoded at the same time (each is mostly an
+# ffmpeg process fed with ready frames)
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+def has_visual(slide):
+    """True when the slide carries an in-memory frame or an existing image file."""
+    if slide.get("frame") is not None:
+        return True
+    return bool(slide.get("image")) and os.path.exists(slide["image"])
+
+def slide_frame(slide, size=None):
+    """
+    RGB ndarray of size (default FRAME_SIZE) for a slide. An in-memory
+    "frame" (ndarray or RawFrame from image_generator) is used directly,
+    otherwise "image" is loaded from disk. Resizing only happens when the
+    size differs.
+    """
+    size = tuple(size or FRAME_SIZE)
+    source = slide.get("frame")
+    if source is None:
+        with Image.open(slide["image"]) as img:
+            if img.size != size:
+                img = img.resize(size, Image.LANCZOS)
+            return np.asarray(img.convert("RGB"))
+    if hasattr(source, "to_array"):
+        source = source.to_array()
+    if source.shape[1::-1] != size:
+        source = np.asarray(Image.fromarray(source).resize(size, Image.LANCZOS))
+    return source
+
+def slide_clip(slide, duration, size=None):
+    """ImageClip of a slide's frame (see slide_frame)."""
+    return ImageClip(slide_frame(slide, size)).set_duration(duration)
+
+# ---------------------------
+# AUDIO
+# ---------------------------
+
+def usable_slides(slides):
+    """Slides that have both audio and a visual; the rest are skipped with a warning."""
+    usable = []
+    for slide in slides:
         if not os.path.exists(slide["audio"]):
             print(f"[Warning] Missing audio: {slide['audio']}")
-            continue
+        elif not (slide.get("reuse_segment") and os.path.exists(slide.get("segment") or "")) and not has_visual(slide):
+            print(f"[Warning] Missing image: {slide.get('image')}")
+        else:
+            usable.append(slide)
+    return usable
 
-        if not os.path.exists(slide["image"]):
-            print(f"[Warning] Missing image: {slide['image']}")
-            continue
+def slide_slots(slides):
+    """
+    Per-slide durations rounded up to whole video frames. These are the
+    timing map shared by the audio track, the video and the SRT.
+    """
+    slots = []
+    for slide in slides:
+        duration = slide.get("duration")
+        if not duration:
+            with open(slide["audio"], "rb") as f:
+                duration = audio_track.mp3_duration(f.read())
+        slots.append(audio_track.slot_duration(duration, FPS))
+    return slots
 
-        audio = AudioFileClip(slide["audio"])
-        audio_clips.append(audio)  # 🔥 KEEP REFERENCE
-        duration = audio.duration
+def slide_keyframes(offset, slot):
+    """Keyframe times of one slide: its start, then every KEYFRAME_INTERVAL."""
+    count = max(1, math.ceil(slot / KEYFRAME_INTERVAL - 1e-6))
+    return [offset + n * KEYFRAME_INTERVAL for n in range(count)]
 
-        if duration is None or duration <= 0:
-            print(f"[Warning] Invalid duration for audio: {slide['audio']}")
-            continue
+def keyframe_times(slots):
+    """Keyframe (and HLS cut) times of a deck with these slide slots."""
+    times = []
+    offset = 0.0
+    for slot in slots:
+        times += slide_keyframes(offset, slot)
+        offset += slot
+    return times
+
+def keyframe_params(slots):
+    # Frame times are whole milliseconds in the VFR slideshow, so round down
+    return ["-force_key_frames", ",".join(f"{math.floor(t * 1000) / 1000:.3f}" for t in keyframe_times(slots))]
+
+def mux_streams(video_path, audio_path, output_path, subtitles_path=None, audio_codec=None, subtitle_language="eng"):
+    """
+    Combine a video-only MP4, the assembled audio track and optionally a
+    soft subtitle track in one ffmpeg pass. Video is always stream-copied.
+    """
+    audio_codec = audio_codec or AUDIO_CODEC
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", "-i", video_path, "-i", audio_path]
+    if subtitles_path:
+        cmd += ["-i", subtitles_path]
+    cmd += ["-map", "0:v", "-map", "1:a", "-c:v", "copy"]
+    cmd += ["-c:a", "copy"] if audio_codec == "copy" else ["-c:a", audio_codec, "-b:a", "128k"]
+    if subtitles_path:
+        cmd += ["-map", "2:s", "-c:s", "mov_text", "-metadata:s:s:0", f"language={subtitle_language}"]
+    cmd += ["-movflags", "+faststart", output_path]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+def _work_paths(final_name):
+    stem = os.path.splitext(final_name)[0]
+    work_dir = os.path.join(OUTPUT_DIR, "temp")
+    os.makedirs(work_dir, exist_ok=True)
+    return os.path.join(work_dir, f"{stem}_audio.mp3"), os.path.join(work_dir, f"{stem}_video.mp4")
+
+def _finish(video_tmp, track_path, output_path, subtitles_path, subtitle_mode, subtitle_language="eng", keep_track=False):
+    soft = subtitles_path if subtitle_mode == "soft" else None
+    mux_streams(video_tmp, track_path, output_path, subtitles_path=soft, subtitle_language=subtitle_language)
+    for path in (video_tmp,) if keep_track else (video_tmp, track_path):
+        if os.path.exists(path):
+            os.remove(path)
+    return output_path
+
+# ---------------------------
+# STREAMING
+# ---------------------------
+
+def iter_slide_frames(slides, slots, overlay=None, size=None):
+    """
+    Yield every video frame of the deck in order, one slide at a time.
+    Only the current slide's image is held; it is dropped before the next
+    slide is loaded. With an overlay, a frame is only recomposed when the
+    visible cue changes.
+    """
+    offset = 0.0
+    for slide, slot in zip(slides, slots):
+        base = slide_frame(slide, size)
+        frames = round(slot * FPS)
+        shown = cue = None
+        for n in range(frames):
+            t = offset + n / FPS
+            idx = overlay.cue_index(t) if overlay else None
+            if shown is None or idx != cue:
+                shown = overlay.apply(base, t) if overlay else base
+                cue = idx
+            yield shown
+        offset += frames / FPS
+        del base, shown
+
+def stream_video(slides, slots, out_path, overlay=None, size=None, ffmpeg_params=()):
+    """
+    Encode the deck straight into ffmpeg's stdin without building a clip
+    graph. Memory stays at about one frame no matter how many slides.
+    Returns the number of frames written.
+    """
+    writer = FFMPEG_VideoWriter(
+        out_path, tuple(size or FRAME_SIZE), FPS,
+        codec=ENCODE_PARAMS["codec"],
+        threads=ENCODE_PARAMS["threads"],
+        ffmpeg_params=["-tune", "stillimage", *keyframe_params(slots), *ffmpeg_params],
+    )
+    written = 0
+    try:
+        for frame in iter_slide_frames(slides, slots, overlay, size):
+            writer.write_frame(frame)
+            written += 1
+    finally:
+        writer.close()
+    return written
+
+# ---------------------------
+# SLIDESHOW (VFR)
+# ---------------------------
+
+def slideshow_intervals(slides, slots, overlay=None):
+    """
+    Yield (slide, start, end, cue index) for every span in which the
+    picture does not change: each slide is split at the cue boundaries
+    that fall inside it.
+    """
+    offset = 0.0
+    for slide, slot in zip(slides, slots):
+        end = offset + slot
+        # Keyframe times get a frame of their own
+        cuts = {offset, end, *slide_keyframes(offset, slot)}
+        if overlay:
+            # Snap cue times (millisecond SRT values) to the frame grid so
+            # they never leave sliver spans next to slide boundaries
+            for (t1, t2), _ in overlay.cues:
+                for t in (t1, t2):
+                    t = offset + round((t - offset) * FPS) / FPS
+                    if offset < t < end:
+                        cuts.add(t)
+        cuts = sorted(cuts)
+        for t1, t2 in zip(cuts, cuts[1:]):
+            yield slide, t1, t2, (overlay.cue_index(t1) if overlay else None)
+        offset = end
+
+def encode_slideshow(slides, slots, out_path, overlay=None, size=None, ffmpeg_params=()):
+    """
+    Encode the deck as variable frame rate video: one frame per unchanged
+    span (capped at SLIDESHOW_MAX_FRAME seconds) instead of FPS frames per
+    second, with keyframes at keyframe_times(slots). Distinct pictures are
+    written as PNGs next to out_path and fed through ffmpeg's concat
+    demuxer with their durations; only one slide is in memory at a time.
+    Returns the number of frames in the output.
+    """
+    work_dir = out_path + ".frames"
+    os.makedirs(work_dir, exist_ok=True)
+    list_path = os.path.join(work_dir, "frames.txt")
+    starts = []
+    entries = []  # (picture, seconds), written one entry behind
+    base = base_slide = picture = None
+    shown = (None, None)
+
+    def write(listing, picture, seconds=None):
+        # Millisecond time base for the images, otherwise durations snap to 1/25 s
+        listing.write(f"file '{os.path.abspath(picture)}'\noption framerate 1000\n")
+        if seconds is not None:
+            listing.write(f"duration {seconds:.6f}\n")
+
+    try:
+        with open(list_path, "w", encoding="utf-8") as listing:
+            for slide, start, end, cue in slideshow_intervals(slides, slots, overlay):
+                if slide is not base_slide:
+                    base, base_slide = slide_frame(slide, size), slide
+                    starts.append(start)
+                if shown != (id(slide), cue):
+                    shown = (id(slide), cue)
+                    picture = os.path.join(work_dir, f"{len(starts):05d}_{len(entries):06d}.png")
+                    image = overlay.apply(base, start) if cue is not None else base
+                    Image.fromarray(image).save(picture, compress_level=1)
+
+                span = end - start
+                parts = max(1, int(-(-span // SLIDESHOW_MAX_FRAME)))
+                for _ in range(parts):
+                    if entries:
+                        write(listing, *entries[-1])
+                    entries.append((picture, span / parts))
+
+            # The last frame's duration is lost in the MP4, so the deck ends
+            # with a one-frame repeat; the concat demuxer also needs the last
+            # file listed twice to honour its duration.
+            picture, seconds = entries[-1]
+            if seconds > 1.5 / FPS:
+                write(listing, picture, seconds - 1 / FPS)
+                entries.append((picture, 1 / FPS))
+            write(listing, picture, entries[-1][1])
+            write(listing, picture)
+
+        cmd = [
+            get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-fps_mode", "vfr", "-pix_fmt", "yuv420p",
+            "-c:v", ENCODE_PARAMS["codec"], *SLIDESHOW_PARAMS, *ffmpeg_params, *keyframe_params(slots),
+            "-t", f"{sum(slots):.6f}",
+            out_path,
+        ]
+        subprocess.run(cmd, check=True)
+    finally:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+    return len(entries)
+
+# ---------------------------
+# BUILD
+# ---------------------------
+
+def encode_video(slides, slots, video_tmp, mode, overlay=None, size=None, ffmpeg_params=()):
+    """
+    Encode the video-only stream with the "stream", "slideshow" or
+    "single" encoder. Returns the path written (slideshow switches the
+    extension to .mkv).
+    """
+    if mode == "stream":
+        stream_video(slides, slots, video_tmp, overlay, size, ffmpeg_params)
+    elif mode == "slideshow":
+        # Matroska keeps the last frame's duration through the stream-copy
+        # mux; an MP4 intermediate would have it guessed from the mean rate
+        video_tmp = os.path.splitext(video_tmp)[0] + ".mkv"
+        encode_slideshow(slides, slots, video_tmp, overlay, size, ffmpeg_params)
+    else:
+        clips = [slide_clip(slide, slot, size) for slide, slot in zip(slides, slots)]
+        final_video = concatenate_videoclips(clips, method="compose")
+        if overlay:
+            final_video = overlay.burn(final_video)
+        final_video.write_videofile(video_tmp, ffmpeg_params=[*keyframe_params(slots), *ffmpeg_params], **ENCODE_PARAMS)
+        final_video.close()
+    return video_tmp
 
-        # MoviePy 2.0+ uses .with_duration and .with_audio
-        # .resize is often now .resized
-        clip = (
-            ImageClip(slide["image"])
-            .set_duration(duration) 
-            .resize(width=1280, height=720)
-            .set_audio(audio)
+def build_video(
+    slides,
+    subtitles_path=None,
+    final_name="presentation.mp4",
+    mode=None,
+    workers=None,
+    subtitle_mode=None,
+    encode=None,
+):
+    """
+    mode="stream":   slides are loaded and encoded one at a time, flat
+                     memory for any deck length (default COMPILE_MODE).
+    mode="slideshow": like "stream" but variable frame rate, one frame
+                     per slide/cue change; far smaller and faster.
+    mode="single":   one MoviePy graph, one write_videofile call.
+    mode="segments": every slide is encoded as its own segment in a
+                     process pool, then joined with stream copy.
+    subtitle_mode:   "burn", "soft" or "none" (default SUBTITLE_MODE).
+    encode:          segment encoder of mode="segments" (see
+                     build_video_from_segments).
+    """
+    subtitle_mode = subtitle_mode or SUBTITLE_MODE
+    mode = mode or COMPILE_MODE
+    if mode == "segments":
+        segments_dir = os.path.join(OUTPUT_DIR, "temp", os.path.splitext(final_name)[0] + "_segments")
+        slides = [
+            dict(slide, segment=os.path.join(segments_dir, f"{idx:04d}.mp4"))
+            for idx, slide in enumerate(slides)
+        ]
+        return build_video_from_segments(
+            slides, subtitles_path, final_name, workers=workers, subtitle_mode=subtitle_mode, encode=encode
         )
-        clips.append(clip)
 
-    if not clips:
+    slides = usable_slides(slides)
+    if not slides:
         raise RuntimeError("No valid clips to compile into a video.")
 
-    # 2. Concatenate all slides
-    final_video = concatenate_videoclips(clips, method="compose")
+    # 1. One audio track from the TTS MP3 frames (no decode)
+    slots = slide_slots(slides)
+    track_path, video_tmp = _work_paths(final_name)
+    audio_track.assemble_track([s["audio"] for s in slides], track_path, slots)
 
-    # 3. Add subtitles overlay (Simplified Logic)
-    if subtitles_path and os.path.exists(subtitles_path):
+    # 2. Subtitles burned with pre-rasterized overlays
+    has_subtitles = bool(subtitles_path and os.path.exists(subtitles_path))
+    overlay = None
+    if has_subtitles and subtitle_mode == "burn":
         print(f"Applying subtitles from: {subtitles_path}")
-        
-        def subtitle_generator(txt):
-            return TextClip(
-                txt, 
-                font="Arial", 
-                fontsize=36, 
-                color="white", 
-                stroke_color="black", 
-                stroke_width=1,
-                method='caption', # Helps with long text wrapping
-                size=(1100, None)
-            )
-
-        subs = SubtitlesClip(subtitles_path, subtitle_generator)
-        
-        # Position subtitles at the bottom
-        # Use CompositeVideoClip to layer subtitles over the video
-        final_video = CompositeVideoClip([
-            final_video, 
-            subs.set_position(('center', 600)) 
-        ])
-
-    # 4. Write Final File
+        overlay = burn_overlay(subtitles_path)
+        if overlay is None:
+            subtitle_mode = "soft"
+
+    # 3. Video only: streamed slide by slide, VFR slideshow, or one MoviePy graph
+    video_tmp = encode_video(slides, slots, video_tmp, mode, overlay)
+
+    # 4. Mux the audio track in
+
     output_path = os.path.join(OUTPUT_DIR, final_name)
-    
-    final_video.write_videofile(
+    return _finish(video_tmp, track_path, output_path, subtitles_path if has_subtitles else None, subtitle_mode)
+
+def burn_overlay(subtitles_path, size=FRAME_SIZE):
+    """SubtitleOverlay for an SRT file, or None (soft subtitles instead) when no font covers its script."""
+    try:
+        return subtitle_engine.SubtitleOverlay(subtitle_engine.parse_srt(subtitles_path), frame_size=size)
+    except subtitle_engine.SubtitleFontError as e:
+        print(f"[Warning] {e}; muxing {os.path.basename(subtitles_path)} as soft subtitles instead")
+        return None
+
+# ---------------------------
+# RENDITIONS
+# ---------------------------
+
+def bitrate_params(max_bitrate):
+    """x264 rate cap ("800k", "2M") on top of the usual quality setting."""
+    if not max_bitrate:
+        return []
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", str(max_bitrate).strip())
+    if not match:
+        raise ValueError(f"Invalid bitrate '{max_bitrate}', expected e.g. 800k or 2M")
+    bits = int(float(match.group(1)) * {"": 1, "k": 1000, "m": 1000000}[match.group(2).lower()])
+    return ["-maxrate", str(bits), "-bufsize", str(2 * bits)]
+
+def rendition_name(final_name, name):
+    """presentation_x.mp4 + "480p" -> presentation_x_480p.mp4"""
+    stem, ext = os.path.splitext(final_name)
+    return f"{stem}_{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}{ext}"
+
+def build_renditions(slides, renditions, final_name="presentation.mp4", mode=None, workers=None):
+    """
+    Build several outputs of one deck that share the slides' audio,
+    frames and timing.
+    renditions: [{"name", "size" (w, h), "max_bitrate", "subtitles_path",
+    "subtitle_mode", "subtitle_language"}], missing keys use the
+    module defaults. The audio track is assembled once; slide frames
+    (rendered once, at the largest size) are downscaled per rendition.
+    Encodes run in parallel threads (RENDITION_WORKERS), each mostly an
+    ffmpeg process. mode "segments" is encoded as "stream" here.
+    Returns {name: output path}.
+    """
+    mode = mode or COMPILE_MODE
+    if mode == "segments":
+        mode = "stream"
+    params = {r["name"]: bitrate_params(r.get("max_bitrate")) for r in renditions}
+
+    slides = usable_slides(slides)
+    if not slides:
+        raise RuntimeError("No valid clips to compile into a video.")
+
+    slots = slide_slots(slides)
+    track_path, _ = _work_paths(final_name)
+    audio_track.assemble_track([s["audio"] for s in slides], track_path, slots)
+
+    def build(rendition):
+        output_name = rendition_name(final_name, rendition["name"])
+        _, video_tmp = _work_paths(output_name)
+        size = tuple(rendition.get("size") or FRAME_SIZE)
+        subtitle_mode = rendition.get("subtitle_mode") or SUBTITLE_MODE
+        subtitles_path = rendition.get("subtitles_path")
+        if not (subtitles_path and os.path.exists(subtitles_path)) or subtitle_mode == "none":
+            subtitles_path = None
+
+        overlay = None
+        if subtitles_path and subtitle_mode == "burn":
+            overlay = burn_overlay(subtitles_path, size)
+            if overlay is None:
+                subtitle_mode = "soft"
+
+        print(f"Encoding rendition {rendition['name']} ({size[0]}x{size[1]}, subtitles {subtitle_mode})...")
+        video_tmp = encode_video(slides, slots, video_tmp, mode, overlay, size, params[rendition["name"]])
+        return _finish(
+            video_tmp, track_path, os.path.join(OUTPUT_DIR, output_name), subtitles_path, subtitle_mode,
+            subtitle_language=rendition.get("subtitle_language") or "eng", keep_track=True,
+        )
+
+    workers = max(1, min(workers or RENDITION_WORKERS, len(renditions)))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            paths = list(pool.map(build, renditions))
+    finally:
+        if os.path.exists(track_path):
+            os.remove(track_path)
+    return {rendition["name"]: path for rendition, path in zip(renditions, paths)}
+
+# ---------------------------
+# PER-SLIDE SEGMENTS
+# ---------------------------
+
+def encode_segment(slide, out_path, cues=None):
+    """
+    Encode one slide into its own video-only MP4 segment.
+    slide["duration"] must be a whole number of frames (see slide_slots).
+    cues: [((start, end), text)] relative to the start of this slide.
+    Returns the number of frames written.
+    """
+    frames = round(slide["duration"] * FPS)
+    # MoviePy samples np.arange(0, duration, 1/fps); stopping half a frame
+    # early makes that exactly `frames` timestamps despite float rounding.
+    clip = slide_clip(slide, (frames - 0.5) / FPS)
+    if cues:
+        clip = subtitle_engine.SubtitleOverlay(cues).burn(clip)
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp_path = out_path + ".part.mp4"
+    clip.write_videofile(tmp_path, logger=None, **SEGMENT_ENCODE_PARAMS)
+    os.replace(tmp_path, out_path)
+    clip.close()
+    return frames
+
+def concat_segments(segment_paths, output_path):
+    """Join MP4 segments with identical codec settings without re-encoding."""
+    list_path = output_path + ".txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    cmd = [
+        get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-c", "copy", "-movflags", "+faststart",
         output_path,
-        fps=24,
-        codec="libx264",
-        audio_codec="aac",
-        audio_fps=44100,   # 🔥 ADD THIS
-        threads=4
+    ]
+    try:
+        subprocess.run(cmd, check=True)
+    finally:
+        os.remove(list_path)
+    return output_path
+
+def slice_cues(cues, start, end):
+    """Cues overlapping [start, end), shifted to be relative to start."""
+    sliced = []
+    for (t1, t2), text in cues:
+        if t2 <= start or t1 >= end:
+            continue
+        sliced.append(((max(t1, start) - start, min(t2, end) - start), text))
+    return sliced
+
+def segment_name(fingerprint, subtitle_mode=None):
+    """File name of a reusable segment for a slide fingerprint."""
+    burned = "b" if (subtitle_mode or SUBTITLE_MODE) == "burn" else "n"
+    return f"{fingerprint}-{SEGMENT_PROFILE}{burned}.mp4"
+
+def segment_key(slide, duration, cues=None):
+    """
+    Content hash of a video-only segment: frame pixels, length in frames,
+    burned cues and encoder profile. Equal keys mean identical segments,
+    whatever slide or job they came from.
+    """
+    source = slide.get("frame")
+    pixels = source.data if hasattr(source, "to_array") else slide_frame(slide).tobytes()
+    # Cue times are compared in frames: the same cue on a later slide can
+    # differ by a millisecond of SRT rounding, and slivers of the
+    # neighbouring slides' cues that cover no frame do not count
+    spans = [(round(t1 * FPS), round(t2 * FPS), text) for (t1, t2), text in cues or []]
+    return content_key(
+        SEGMENT_PROFILE, round(duration * FPS), hashlib.sha256(pixels).hexdigest(),
+        repr([span for span in spans if span[1] > span[0]]),
     )
 
-    # 🔥 CLEANUP
-    final_video.close()
-    for a in audio_clips:
-        a.close()
-    return output_path
+def encode_segments(tasks, workers=None):
+    """
+    Encode [(slide, out_path, cues)] across worker processes.
+    Returns frame counts in task order.
+    """
+    workers = max(1, min(workers or SEGMENT_WORKERS, len(tasks)))
+    if workers == 1:
+        return [encode_segment(*task) for task in tasks]
 
-# Alias
-compile_video = build_video
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(encode_segment, *task) for task in tasks]
+        return [f.result() for f in futures]
+
+def build_video_from_segments(
+    slides,
+    subtitles_path=None,
+    final_name="presentation.mp4",
+    workers=None,
+    subtitle_mode=None,
+    encode=None,
+):
+    """
+    Build the final video from per-slide segments.
+
+    Each slide dict needs "audio", "image" or "frame", and "segment"
+    (target path); "duration" avoids re-reading the MP3.
+    Slides with "reuse_segment": True keep their existing segment file,
+    the rest are taken from SEGMENT_CACHE when an identical segment was
+    encoded before (this deck or another job) or encoded in parallel:
+    encode(tasks) when given (e.g. cluster.segment_encoder), otherwise
+    encode_segments across local processes. The video-only segments are
+    stream-copy concatenated and muxed with the assembled audio track.
+    Returns the output path.
+    """
+    subtitle_mode = subtitle_mode or SUBTITLE_MODE
+    has_subtitles = bool(subtitles_path and os.path.exists(subtitles_path))
+    cues = []
+    if has_subtitles and subtitle_mode == "burn":
+        if burn_overlay(subtitles_path) is None:
+            subtitle_mode = "soft"
+        else:
+            cues = subtitle_engine.parse_srt(subtitles_path)
 
+    slides = usable_slides(slides)
+    if not slides:
+        raise RuntimeError("No valid clips to compile into a video.")
+
+    slots = slide_slots(slides)
+    track_path, video_tmp = _work_paths(final_name)
+    audio_track.assemble_track([s["audio"] for s in slides], track_path, slots)
+
+    tasks = []
+    keys = []
+    copies = []  # (source segment, duplicate path) for repeats within this deck
+    encoding = {}  # segment key -> path being encoded
+    cached = 0
+    offset = 0.0
+    for slide, slot in zip(slides, slots):
+        slide_cues = slice_cues(cues, offset, offset + slot)
+        offset += slot
+        if slide.get("reuse_segment") and os.path.exists(slide["segment"]):
+            print(f"Reusing segment: {slide['segment']}")
+            continue
+
+        key = segment_key(slide, slot, slide_cues)
+        if key in encoding:
+            copies.append((encoding[key], slide["segment"]))
+        elif SEGMENT_CACHE.fetch(key, slide["segment"]):
+            cached += 1
+        else:
+            encoding[key] = slide["segment"]
+            keys.append(key)
+            tasks.append((dict(slide, duration=slot), slide["segment"], slide_cues))
 
+    if tasks:
+        reused = len(slides) - len(tasks) - cached - len(copies)
+        print(f"Encoding {len(tasks)} segments ({reused} reused, {cached} from cache, {len(copies)} duplicates)...")
+        if encode is not None:
+            encode(tasks)
+        else:
+            encode_segments(tasks, workers=workers)
+        for key, (_, path, _) in zip(keys, tasks):
+            SEGMENT_CACHE.store(key, path)
+    for source, path in copies:
+        link_or_copy(source, path)
+
+    concat_segments([s["segment"] for s in slides], video_tmp)
+    output_path = os.path.join(OUTPUT_DIR, final_name)
+    return _finish(video_tmp, track_path, output_path, subtitles_path if has_subtitles else None, subtitle_mode)
+
+# Alias
+compile_video = build_video